@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, users, groups, movies, voting
+from app.api.v1.endpoints import auth, users, groups, movies, voting, admin
 
 api_router = APIRouter()
 
@@ -7,4 +7,5 @@ api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(groups.router, prefix="/groups", tags=["groups"])
 api_router.include_router(movies.router, prefix="/movies", tags=["movies"])
-api_router.include_router(voting.router, prefix="/voting", tags=["voting"]) 
\ No newline at end of file
+api_router.include_router(voting.router, prefix="/voting", tags=["voting"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"]) 
\ No newline at end of file
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import get_db
+from app.db.models import MovieList as MovieListModel, RatingModelEnum
+from app.services import elo, hot_scores, projections, replay, vote_log
+from typing import List, Optional
+import time
+
+router = APIRouter()
+
+@router.post("/lists/{movie_list_id}/replay-scores")
+async def replay_list_scores(movie_list_id: int, k_factor: float = elo.K_FACTOR, db: AsyncSession = Depends(get_db)):
+    """Rebuild every user's Elo scores for a list from its vote history"""
+    movie_list = await db.get(MovieListModel, movie_list_id)
+    if not movie_list:
+        raise HTTPException(status_code=404, detail="Movie list not found")
+    if movie_list.rating_model == RatingModelEnum.glicko2:
+        raise HTTPException(status_code=400, detail="Score replay only supports Elo; this list uses glicko2")
+    
+    start = time.perf_counter()
+    if hot_scores.enabled_for(movie_list):
+        # Redis must pick up the replayed scores, or the next flush would overwrite them
+        summary = await db.run_sync(hot_scores.reload_list, movie_list_id, replay_votes=True, k=k_factor)
+    else:
+        summary = await db.run_sync(replay.rebuild_list_scores, movie_list_id, k=k_factor)
+        await db.commit()
+    
+    return {**summary, "k_factor": k_factor, "seconds": round(time.perf_counter() - start, 3)}
+
+@router.post("/lists/{movie_list_id}/reload-hot-scores")
+async def reload_hot_scores(movie_list_id: int, replay_votes: bool = False, db: AsyncSession = Depends(get_db)):
+    """Rebuild a list's Redis scores from Postgres, e.g. after Redis lost its data.
+    
+    With ``replay_votes=true`` the scores are first recomputed from the vote history,
+    which also recovers votes whose updates were never flushed.
+    """
+    movie_list = await db.get(MovieListModel, movie_list_id)
+    if not movie_list:
+        raise HTTPException(status_code=404, detail="Movie list not found")
+    if not hot_scores.enabled_for(movie_list):
+        raise HTTPException(status_code=400, detail="Hot scores are not enabled for this list")
+    
+    start = time.perf_counter()
+    summary = await db.run_sync(hot_scores.reload_list, movie_list_id, replay_votes=replay_votes)
+    return {**summary, "seconds": round(time.perf_counter() - start, 3)}
+
+
+@router.post("/lists/{movie_list_id}/rebuild-projections")
+async def rebuild_projections(movie_list_id: int, names: Optional[List[str]] = Query(None), db: AsyncSession = Depends(get_db)):
+    """Rebuild a list's scores, progress counters and head-to-head counts from the vote log.
+    
+    Pass ``names`` to rebuild only some of them. Scores can only be rebuilt on Elo lists.
+    """
+    movie_list = await db.get(MovieListModel, movie_list_id)
+    if not movie_list:
+        raise HTTPException(status_code=404, detail="Movie list not found")
+    glicko = movie_list.rating_model == RatingModelEnum.glicko2
+    if names is None:
+        names = [name for name in vote_log.PROJECTIONS if not (glicko and name == "scores")]
+    unknown = set(names) - set(vote_log.PROJECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown projections: {', '.join(sorted(unknown))}")
+    if glicko and "scores" in names:
+        raise HTTPException(status_code=400, detail="Score replay only supports Elo; this list uses glicko2")
+    
+    start = time.perf_counter()
+    summaries = await db.run_sync(projections.rebuild_list, movie_list_id, names)
+    return {**summaries, "seconds": round(time.perf_counter() - start, 3)}
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import get_db
 from app.db.models import User as UserModel
 from app.db.schemas import UserRead, UserCreate
@@ -53,40 +55,34 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials"
+    )
     token = credentials.credentials
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
-            )
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
-        )
+        # A missing or non-numeric subject is as invalid as a bad signature
+        user_id = int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
+        raise credentials_exception
     
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.get(UserModel, user_id)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
-        )
+        raise credentials_exception
     return user
 
 @router.post("/register", response_model=UserRead)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     # Check if email already exists
-    existing_user = db.query(UserModel).filter(UserModel.email == user_data.email).first()
+    existing_user = await db.scalar(select(UserModel).where(UserModel.email == user_data.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Hash the password
-    password_hash = get_password_hash(user_data.password)
+    # Hash the password (bcrypt is deliberately slow; keep it off the event loop)
+    password_hash = await run_in_threadpool(get_password_hash, user_data.password)
     
     # Create new user
     db_user = UserModel(
@@ -96,21 +92,21 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
         profile_image_url=None
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 @router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login user and return access token"""
     # Find user by email
-    user = db.query(UserModel).filter(UserModel.email == user_credentials.email).first()
+    user = await db.scalar(select(UserModel).where(UserModel.email == user_credentials.email))
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not verify_password(user_credentials.password, user.password_hash):
+    if not await run_in_threadpool(verify_password, user_credentials.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create JWT token
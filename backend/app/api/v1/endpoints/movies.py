@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from app.core.config import settings
 from app.db.base import get_db
-from app.db.models import MovieList as MovieListModel, MovieListItem as MovieListItemModel
-from app.db.schemas import MovieListRead, MovieListCreate, MovieListItemRead, MovieListItemCreate
+from app.db.models import CatalogMovie, MovieList as MovieListModel, MovieListItem as MovieListItemModel
+from app.db.schemas import MovieListRead, MovieListCreate, MovieListUpdate, MovieListItemRead, MovieListItemCreate
+from app.services import catalog, list_items, media, search_index, tmdb
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -35,86 +38,59 @@ class MovieListItem(BaseModel):
     title: str
     metadata: Optional[dict] = None
 
-# Dummy movie data for search (we'll keep this for now since we don't have TMDB integration yet)
-DUMMY_MOVIES = [
-    {
-        "id": 1,
-        "title": "The Shawshank Redemption",
-        "overview": "Two imprisoned men bond over a number of years...",
-        "poster_path": "/q6y0Go1tsGEsmtFryDOJo3dEmqu.jpg",
-        "release_date": "1994-09-23",
-        "genre_ids": [18, 80],
-        "external_id": "278"
-    },
-    {
-        "id": 2,
-        "title": "The Godfather",
-        "overview": "Spanning the years 1945 to 1955...",
-        "poster_path": "/3bhkrj58Vtu7enYsRolD1fZdja1.jpg",
-        "release_date": "1972-03-14",
-        "genre_ids": [18, 80],
-        "external_id": "238"
-    },
-    {
-        "id": 3,
-        "title": "Pulp Fiction",
-        "overview": "A burger-loving hit man...",
-        "poster_path": "/d5iIlFn5s0ImszYzBPb8JPIfbXD.jpg",
-        "release_date": "1994-09-10",
-        "genre_ids": [53, 80],
-        "external_id": "680"
-    },
-    {
-        "id": 4,
-        "title": "The Dark Knight",
-        "overview": "When the menace known as the Joker...",
-        "poster_path": "/qJ2tW6WMUDux911r6m7haRef0WH.jpg",
-        "release_date": "2008-07-18",
-        "genre_ids": [28, 80, 18],
-        "external_id": "155"
-    },
-    {
-        "id": 5,
-        "title": "Fight Club",
-        "overview": "A ticking-time-bomb insomniac...",
-        "poster_path": "/pB8BM7pdSp6B6Ih7QZ4DrQ3PmJK.jpg",
-        "release_date": "1999-10-15",
-        "genre_ids": [18],
-        "external_id": "550"
-    }
-]
+# How many movies /popular returns
+POPULAR_COUNT = 20
 
 @router.get("/search", response_model=List[Movie])
-async def search_movies(query: str = ""):
-    """Search movies (dummy data for now)"""
-    if not query:
-        return DUMMY_MOVIES
-    
-    # Simple search by title
-    results = [movie for movie in DUMMY_MOVIES if query.lower() in movie["title"].lower()]
-    return results
+async def search_movies(query: str = "", limit: int = 10, db: AsyncSession = Depends(get_db)):
+    """Search movies by title as it's typed: the last word may be partial or misspelled"""
+    if not 1 <= limit <= search_index.TOP_K:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {search_index.TOP_K}")
+    index = catalog.get_index()
+    if not len(index) and settings.TMDB_ENABLED:
+        # No catalog loaded yet
+        try:
+            movies = await (tmdb.get_client().search_movies(query) if query else tmdb.get_client().popular_movies())
+        except tmdb.TMDBError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        return movies[:limit]
+    return await db.run_sync(catalog.get_movies, index.search(query, limit))
 
 @router.get("/popular", response_model=List[Movie])
-async def get_popular_movies():
-    """Get popular movies (dummy data for now)"""
-    return DUMMY_MOVIES
+async def get_popular_movies(db: AsyncSession = Depends(get_db)):
+    """Get popular movies"""
+    index = catalog.get_index()
+    if not len(index) and settings.TMDB_ENABLED:
+        try:
+            return await tmdb.get_client().popular_movies()
+        except tmdb.TMDBError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return await db.run_sync(catalog.get_movies, index.search("", POPULAR_COUNT))
 
 @router.get("/{movie_id}", response_model=Movie)
-async def get_movie(movie_id: int):
-    """Get movie by ID (dummy data for now)"""
-    movie = next((m for m in DUMMY_MOVIES if m["id"] == movie_id), None)
-    if not movie:
+async def get_movie(movie_id: int, db: AsyncSession = Depends(get_db)):
+    """Get movie by TMDB ID"""
+    movie = await db.get(CatalogMovie, movie_id)
+    if movie is not None and (movie.details is not None or not settings.TMDB_ENABLED):
+        return catalog.movie_json(movie)
+    if not settings.TMDB_ENABLED:
         raise HTTPException(status_code=404, detail="Movie not found")
-    return movie
+    # The export only has titles; the rest comes from TMDB
+    try:
+        return await tmdb.get_client().get_movie(movie_id)
+    except tmdb.TMDBError as e:
+        if movie is not None:
+            return catalog.movie_json(movie)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @router.get("/lists/", response_model=List[MovieListRead])
-async def get_movie_lists(db: Session = Depends(get_db)):
+async def get_movie_lists(db: AsyncSession = Depends(get_db)):
     """Get all movie lists"""
-    lists = db.query(MovieListModel).all()
+    lists = (await db.scalars(select(MovieListModel))).all()
     return lists
 
 @router.post("/lists/", response_model=MovieListRead)
-async def create_movie_list(list_data: MovieListCreate, db: Session = Depends(get_db)):
+async def create_movie_list(list_data: MovieListCreate, db: AsyncSession = Depends(get_db)):
     """Create a new movie list"""
     db_list = MovieListModel(
         name=list_data.name,
@@ -122,37 +98,71 @@ async def create_movie_list(list_data: MovieListCreate, db: Session = Depends(ge
         created_by_user_id=list_data.created_by_user_id,
         type=list_data.type,
         media_type=list_data.media_type,
-        status=list_data.status
+        status=list_data.status,
+        voting_mode=list_data.voting_mode,
+        rating_model=list_data.rating_model,
+        consensus_method=list_data.consensus_method
     )
     db.add(db_list)
-    db.commit()
-    db.refresh(db_list)
+    await db.commit()
+    await db.refresh(db_list)
     return db_list
 
+@router.patch("/lists/{list_id}", response_model=MovieListRead)
+async def update_movie_list(list_id: int, list_data: MovieListUpdate, db: AsyncSession = Depends(get_db)):
+    """Update a movie list's name, status, voting mode, rating model or consensus method"""
+    movie_list = await db.get(MovieListModel, list_id)
+    if not movie_list:
+        raise HTTPException(status_code=404, detail="Movie list not found")
+    
+    for field, value in list_data.model_dump(exclude_unset=True).items():
+        setattr(movie_list, field, value)
+    await db.commit()
+    await db.refresh(movie_list)
+    return movie_list
+
 @router.get("/lists/{list_id}/items", response_model=List[MovieListItemRead])
-async def get_movie_list_items(list_id: int, db: Session = Depends(get_db)):
-    """Get items in a movie list"""
+async def get_movie_list_items(list_id: int, hydrate: bool = False, db: AsyncSession = Depends(get_db)):
+    """Get items in a movie list; with hydrate=true, items without metadata get it from the list's media source"""
     # Check if list exists
-    movie_list = db.query(MovieListModel).filter(MovieListModel.id == list_id).first()
+    movie_list = await db.get(MovieListModel, list_id)
     if not movie_list:
         raise HTTPException(status_code=404, detail="Movie list not found")
     
-    items = db.query(MovieListItemModel).filter(MovieListItemModel.movie_list_id == list_id).all()
-    return items
+    items = (await db.scalars(select(MovieListItemModel).where(MovieListItemModel.movie_list_id == list_id))).all()
+    if not hydrate:
+        return items
+    try:
+        found = await media.get_adapter(movie_list.media_type).lookup(
+            item.external_id for item in items if not item.item_metadata
+        )
+    except media.MediaLookupError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return [
+        MovieListItemRead(
+            id=item.id,
+            movie_list_id=item.movie_list_id,
+            external_id=item.external_id,
+            title=item.title,
+            item_metadata=item.item_metadata or found.get(item.external_id)
+        )
+        for item in items
+    ]
 
 @router.post("/lists/{list_id}/items", response_model=MovieListItemRead)
-async def add_movie_to_list(list_id: int, movie_data: MovieListItemCreate, db: Session = Depends(get_db)):
+async def add_movie_to_list(list_id: int, movie_data: MovieListItemCreate, background_tasks: BackgroundTasks,
+                            db: AsyncSession = Depends(get_db)):
     """Add movie to list"""
     # Check if list exists
-    movie_list = db.query(MovieListModel).filter(MovieListModel.id == list_id).first()
+    movie_list = await db.get(MovieListModel, list_id)
     if not movie_list:
         raise HTTPException(status_code=404, detail="Movie list not found")
     
     # Check if movie is already in the list
-    existing_item = db.query(MovieListItemModel).filter(
+    existing_item = await db.scalar(select(MovieListItemModel).where(
         MovieListItemModel.movie_list_id == list_id,
         MovieListItemModel.external_id == movie_data.external_id
-    ).first()
+    ))
     
     if existing_item:
         raise HTTPException(status_code=400, detail="Movie is already in this list")
@@ -165,6 +175,9 @@ async def add_movie_to_list(list_id: int, movie_data: MovieListItemCreate, db: S
         item_metadata=movie_data.item_metadata
     )
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
+    
+    # Pair the new item up for everyone already voting, after the response is sent
+    background_tasks.add_task(list_items.add_item_in_background, list_id, db_item.id)
     return db_item 
\ No newline at end of file
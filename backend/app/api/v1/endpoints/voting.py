@@ -1,178 +1,315 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from app.db.base import get_db
-from app.db.models import Matchup as MatchupModel, EloScore as EloScoreModel, MovieListItem as MovieListItemModel
-from app.db.schemas import MatchupRead, MatchupCreate, EloScoreRead, EloScoreCreate
-import random
-from datetime import datetime
+from app.db.models import Matchup as MatchupModel, EloScore as EloScoreModel, MovieListItem as MovieListItemModel, MovieList as MovieListModel, VotingModeEnum
+from app.db.schemas import RankedItemRead, RankingRead, ConsensusItemRead, ConsensusMethodEnum, ConsensusResultRead, PairwiseMatrixRead, PairwiseRecordRead, MatchupRead, ItemScoreRead, MatchupWithItemsRead, MovieListItemRead, RatingModelEnum, VoteBatchCreate, VoteBatchRead, VoteResult
+from app.services import bradley_terry, consensus, glicko2, hot_scores, matchmaking, pairwise, rankings, tournament, votes, voting_sessions, matchups as matchups_service, progress as progress_service
 
 router = APIRouter()
 
+# Most matchups a client can prefetch in one request
+MAX_PREFETCH = 50
+MAX_RANKING_PAGE = 500
+
+async def get_movie_list_or_404(movie_list_id: int, db: AsyncSession) -> MovieListModel:
+    movie_list = await db.get(MovieListModel, movie_list_id)
+    if not movie_list:
+        raise HTTPException(status_code=404, detail="Movie list not found")
+    return movie_list
+
 @router.get("/matchups/{movie_list_id}", response_model=List[MatchupRead])
-async def get_matchups(movie_list_id: int, user_id: int = 1, db: Session = Depends(get_db)):
+async def get_matchups(movie_list_id: int, user_id: int = 1, db: AsyncSession = Depends(get_db)):
     """Get matchups for a movie list and user"""
-    matchups = db.query(MatchupModel).filter(
+    matchups = (await db.scalars(select(MatchupModel).where(
         MatchupModel.movie_list_id == movie_list_id,
         MatchupModel.user_id == user_id
-    ).all()
+    ))).all()
     return matchups
 
 @router.post("/matchups/{movie_list_id}/generate")
-async def generate_matchups(movie_list_id: int, user_id: int = 1, db: Session = Depends(get_db)):
+async def generate_matchups(movie_list_id: int, user_id: int = 1, page_size: int = 50, db: AsyncSession = Depends(get_db)):
     """Generate new matchups for voting"""
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    
     # Get all items in the movie list
-    items = db.query(MovieListItemModel).filter(MovieListItemModel.movie_list_id == movie_list_id).all()
+    item_ids = await db.run_sync(matchups_service.list_item_ids, movie_list_id)
     
-    if len(items) < 2:
+    if len(item_ids) < 2:
         raise HTTPException(status_code=400, detail="Need at least 2 items to generate matchups")
     
-    # Generate all possible pairs
-    new_matchups = []
-    for i in range(len(items) - 1):
-        for j in range(i + 1, len(items)):
-            # Check if matchup already exists
-            existing_matchup = db.query(MatchupModel).filter(
-                MatchupModel.movie_list_id == movie_list_id,
-                MatchupModel.user_id == user_id,
-                MatchupModel.item_a_id == items[i].id,
-                MatchupModel.item_b_id == items[j].id
-            ).first()
-            
-            if not existing_matchup:
-                matchup = MatchupModel(
-                    movie_list_id=movie_list_id,
-                    user_id=user_id,
-                    item_a_id=items[i].id,
-                    item_b_id=items[j].id,
-                    winner_id=None,
-                    created_at=datetime.utcnow()
-                )
-                db.add(matchup)
-                new_matchups.append(matchup)
-    
-    db.commit()
-    
-    return {"message": f"Generated {len(new_matchups)} new matchups", "matchups": new_matchups}
+    if movie_list.voting_mode != VotingModeEnum.exhaustive:
+        # Adaptive, tournament and round-robin lists only ever hold the matchup the user is about to see
+        pending = await db.run_sync(matchmaking.pending_matchup, movie_list_id, user_id)
+        matchup = await db.run_sync(matchmaking.next_matchup, movie_list, user_id)
+        await db.commit()
+        created = 1 if matchup and (pending is None or matchup.id != pending.id) else 0
+        return {
+            "message": f"Generated {created} new matchups",
+            "voting_mode": movie_list.voting_mode,
+            "created": created,
+            "matchup_ids": [matchup.id] if matchup else []
+        }
+    
+    # Diff all possible pairs against the ones the user already has, holding the
+    # session lock so a concurrent generate or item addition can't insert the same pairs
+    await db.run_sync(voting_sessions.get_or_create_voting_session, movie_list_id, user_id, for_update=True)
+    existing = await db.run_sync(matchups_service.existing_pairs, movie_list_id, user_id)
+    new_pairs = matchups_service.missing_pairs(item_ids, existing)
+    created = await db.run_sync(matchups_service.bulk_insert_matchups, movie_list_id, user_id, new_pairs)
+    await db.commit()
+    
+    total_pairs = len(item_ids) * (len(item_ids) - 1) // 2
+    return {
+        "message": f"Generated {created} new matchups",
+        "voting_mode": movie_list.voting_mode,
+        "created": created,
+        "existing": len(existing),
+        "total_pairs": total_pairs,
+        "matchup_ids": await db.run_sync(matchups_service.pending_matchup_ids, movie_list_id, user_id, page_size)
+    }
 
 @router.post("/matchups/{matchup_id}/vote")
-async def vote_on_matchup(matchup_id: int, winner_id: int, db: Session = Depends(get_db)):
+async def vote_on_matchup(matchup_id: int, winner_id: int, db: AsyncSession = Depends(get_db)):
     """Vote on a matchup"""
-    matchup = db.query(MatchupModel).filter(MatchupModel.id == matchup_id).first()
-    if not matchup:
-        raise HTTPException(status_code=404, detail="Matchup not found")
-    
-    if matchup.winner_id is not None:
-        raise HTTPException(status_code=400, detail="Matchup has already been voted on")
-    
-    # Validate winner_id is one of the items in the matchup
-    if winner_id not in [matchup.item_a_id, matchup.item_b_id]:
-        raise HTTPException(status_code=400, detail="Winner must be one of the items in the matchup")
+    # Record the winner and update Elo scores in one transaction
+    try:
+        await db.run_sync(votes.cast_vote, matchup_id, winner_id)
+    except votes.VoteError as e:
+        await db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await db.commit()
+    await hot_scores.apply_queued_in_thread(db)
     
-    # Update matchup with winner
-    matchup.winner_id = winner_id
-    db.commit()
+    return {"message": "Vote recorded successfully"}
+
+@router.post("/votes:batch", response_model=VoteBatchRead)
+async def vote_batch(batch: VoteBatchCreate, db: AsyncSession = Depends(get_db)):
+    """Record several votes at once, applied in order and committed together.
     
-    # Update Elo scores (simplified for now)
-    await update_elo_scores(matchup, winner_id, db)
+    Votes that can't be recorded are reported per entry and don't stop the rest.
+    """
+    errors = await db.run_sync(votes.cast_votes, [(vote.matchup_id, vote.winner_id) for vote in batch.votes])
+    await db.commit()
+    await hot_scores.apply_queued_in_thread(db)
     
-    return {"message": "Vote recorded successfully"}
+    results = [
+        VoteResult(matchup_id=vote.matchup_id, status="error", detail=error.detail) if error
+        else VoteResult(matchup_id=vote.matchup_id, status="recorded")
+        for vote, error in zip(batch.votes, errors)
+    ]
+    recorded = sum(1 for error in errors if error is None)
+    return VoteBatchRead(recorded=recorded, failed=len(errors) - recorded, results=results)
 
-async def update_elo_scores(matchup: MatchupModel, winner_id: int, db: Session):
-    """Update Elo scores after a vote (simplified implementation)"""
-    # Get or create Elo scores for both items
-    score_a = db.query(EloScoreModel).filter(
-        EloScoreModel.movie_list_id == matchup.movie_list_id,
-        EloScoreModel.user_id == matchup.user_id,
-        EloScoreModel.movie_list_item_id == matchup.item_a_id
-    ).first()
-    
-    score_b = db.query(EloScoreModel).filter(
-        EloScoreModel.movie_list_id == matchup.movie_list_id,
-        EloScoreModel.user_id == matchup.user_id,
-        EloScoreModel.movie_list_item_id == matchup.item_b_id
-    ).first()
-    
-    # Create scores if they don't exist
-    if not score_a:
-        score_a = EloScoreModel(
-            movie_list_id=matchup.movie_list_id,
-            user_id=matchup.user_id,
-            movie_list_item_id=matchup.item_a_id,
-            score=1200.0
-        )
-        db.add(score_a)
-    
-    if not score_b:
-        score_b = EloScoreModel(
-            movie_list_id=matchup.movie_list_id,
-            user_id=matchup.user_id,
-            movie_list_item_id=matchup.item_b_id,
-            score=1200.0
-        )
-        db.add(score_b)
+@router.get("/scores/{movie_list_id}", response_model=List[ItemScoreRead])
+async def get_elo_scores(movie_list_id: int, user_id: int = 1, model: Optional[RatingModelEnum] = None,
+                         group: bool = False, db: AsyncSession = Depends(get_db)):
+    """Get scores for a movie list and user, from the list's rating model unless ``model`` is given.
     
-    # Simple Elo update (K=32)
-    K = 32
-    expected_a = 1 / (1 + 10**((score_b.score - score_a.score) / 400))
-    expected_b = 1 - expected_a
+    With ``group=true`` the Bradley-Terry model is fitted to every member's votes together.
+    """
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    model = model or movie_list.rating_model
     
-    if winner_id == matchup.item_a_id:
-        actual_a = 1
-        actual_b = 0
-    else:
-        actual_a = 0
-        actual_b = 1
+    if model == RatingModelEnum.bradley_terry:
+        scope_user_id = None if group else user_id
+        scores = await bradley_terry.load_list_scores(db, movie_list_id, scope_user_id)
+        return [
+            ItemScoreRead(movie_list_id=movie_list_id, user_id=scope_user_id, movie_list_item_id=item_id, score=score, model=model)
+            for item_id, score in scores.items()
+        ]
     
-    score_a.score += K * (actual_a - expected_a)
-    score_b.score += K * (actual_b - expected_b)
+    if group:
+        raise HTTPException(status_code=400, detail="Group scores need the bradley_terry model")
     
-    db.commit()
-
-@router.get("/scores/{movie_list_id}", response_model=List[EloScoreRead])
-async def get_elo_scores(movie_list_id: int, user_id: int = 1, db: Session = Depends(get_db)):
-    """Get Elo scores for a movie list and user"""
-    scores = db.query(EloScoreModel).filter(
+    # Stored scores come from Glicko-2 on glicko2 lists and from online Elo on every other list
+    stored_model = RatingModelEnum.glicko2 if movie_list.rating_model == RatingModelEnum.glicko2 else RatingModelEnum.elo
+    if model != stored_model:
+        raise HTTPException(status_code=400, detail=f"Stored scores for this list use the {stored_model.value} model")
+    
+    scores = (await db.scalars(select(EloScoreModel).where(
         EloScoreModel.movie_list_id == movie_list_id,
         EloScoreModel.user_id == user_id
-    ).all()
-    return scores
+    ))).all()
+    results = {
+        score.movie_list_item_id: ItemScoreRead(
+            id=score.id,
+            movie_list_id=score.movie_list_id,
+            user_id=score.user_id,
+            movie_list_item_id=score.movie_list_item_id,
+            score=score.score,
+            deviation=score.deviation if model == RatingModelEnum.glicko2 else None,
+            model=model
+        )
+        for score in scores
+    }
+    if hot_scores.enabled_for(movie_list):
+        # Redis has the latest scores; elo_scores catches up at the next flush
+        hot = await run_in_threadpool(hot_scores.user_scores, movie_list_id, user_id)
+        for item_id, score in (hot or {}).items():
+            if item_id in results:
+                results[item_id].score = score
+            else:
+                results[item_id] = ItemScoreRead(movie_list_id=movie_list_id, user_id=user_id,
+                                                 movie_list_item_id=item_id, score=score, model=model)
+    return list(results.values())
+
+@router.get("/rankings/{movie_list_id}", response_model=RankingRead)
+async def get_ranking(movie_list_id: int, user_id: int = 1, limit: int = 50, cursor: Optional[str] = None,
+                      db: AsyncSession = Depends(get_db)):
+    """Get a user's ranked items with scores, percentiles and item details, a page at a time"""
+    if not 1 <= limit <= MAX_RANKING_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_RANKING_PAGE}")
+    try:
+        after = rankings.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    
+    total, page, next_cursor = await db.run_sync(rankings.ranking_page, movie_list_id, user_id, limit, after)
+    glicko = movie_list.rating_model == RatingModelEnum.glicko2
+    return RankingRead(
+        movie_list_id=movie_list_id,
+        user_id=user_id,
+        model=RatingModelEnum.glicko2 if glicko else RatingModelEnum.elo,
+        total=total,
+        items=[
+            RankedItemRead(**{**item._asdict(), "deviation": item.deviation if glicko else None})
+            for item in page
+        ],
+        next_cursor=rankings.encode_cursor(next_cursor) if next_cursor else None
+    )
 
 @router.get("/progress/{movie_list_id}")
-async def get_voting_progress(movie_list_id: int, user_id: int = 1, db: Session = Depends(get_db)):
+async def get_voting_progress(movie_list_id: int, user_id: int = 1, db: AsyncSession = Depends(get_db)):
     """Get voting progress for a user"""
-    matchups = db.query(MatchupModel).filter(
-        MatchupModel.movie_list_id == movie_list_id,
-        MatchupModel.user_id == user_id
-    ).all()
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    session = await db.run_sync(voting_sessions.get_voting_session, movie_list_id, user_id)
+    total_matchups, completed_matchups = await db.run_sync(voting_sessions.matchup_counts, movie_list_id, user_id, session)
+    item_count = await db.run_sync(matchups_service.count_items, movie_list_id)
     
-    total_matchups = len(matchups)
-    completed_matchups = len([m for m in matchups if m.winner_id is not None])
+    # Adaptive voting can also end early, once every candidate pair has been compared
+    finished = (
+        movie_list.voting_mode == VotingModeEnum.adaptive
+        and total_matchups == completed_matchups
+        and await db.run_sync(matchmaking.select_next_adaptive_pair, movie_list_id, user_id) is None
+    )
+    progress = progress_service.summarize(movie_list, item_count, total_matchups, completed_matchups, session, finished)
     
-    return {
-        "total_matchups": total_matchups,
-        "completed_matchups": completed_matchups,
-        "progress_percentage": (completed_matchups / total_matchups * 100) if total_matchups > 0 else 0
-    }
+    if movie_list.rating_model == RatingModelEnum.glicko2:
+        # Progress is how settled the user's top picks are, not how many pairs are left
+        confidence = 1.0 if progress["voting_complete"] else await db.run_sync(glicko2.user_confidence, movie_list_id, user_id)
+        progress.update({
+            "confidence": confidence,
+            "top_k": glicko2.TOP_K,
+            "progress_percentage": confidence * 100
+        })
+    
+    return progress
+
+@router.get("/progress/{movie_list_id}/members")
+async def get_member_progress(movie_list_id: int, db: AsyncSession = Depends(get_db)):
+    """Get voting progress for every member of the list's group"""
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    item_count = await db.run_sync(matchups_service.count_items, movie_list_id)
+    return await db.run_sync(progress_service.member_progress, movie_list, item_count)
+
+@router.get("/results/{movie_list_id}", response_model=ConsensusResultRead)
+async def get_results(movie_list_id: int, method: Optional[ConsensusMethodEnum] = None, db: AsyncSession = Depends(get_db)):
+    """Get the group consensus over every voter's ranking, by the list's consensus method unless ``method`` is given"""
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    method = method or movie_list.consensus_method
+    voters, ranked = await consensus.results(db, movie_list_id, method)
+    titles = dict((await db.execute(select(MovieListItemModel.id, MovieListItemModel.title).where(
+        MovieListItemModel.movie_list_id == movie_list_id
+    ))).all())
+    return ConsensusResultRead(
+        movie_list_id=movie_list_id,
+        method=method,
+        voters=voters,
+        items=[
+            ConsensusItemRead(movie_list_item_id=item_id, title=titles[item_id], points=points, rank=rank)
+            for item_id, points, rank in ranked
+        ]
+    )
+
+@router.get("/pairwise/{movie_list_id}", response_model=PairwiseMatrixRead)
+async def get_pairwise_matrix(movie_list_id: int, db: AsyncSession = Depends(get_db)):
+    """Get how often each item beat each other item, across every voter"""
+    await get_movie_list_or_404(movie_list_id, db)
+    item_ids, wins = await db.run_sync(pairwise.win_matrix, movie_list_id)
+    return PairwiseMatrixRead(movie_list_id=movie_list_id, item_ids=item_ids.tolist(), wins=wins.tolist())
+
+@router.get("/pairwise/{movie_list_id}/items/{item_id}", response_model=PairwiseRecordRead)
+async def get_pairwise_record(movie_list_id: int, item_id: int, db: AsyncSession = Depends(get_db)):
+    """Get one item's wins and losses against each opponent, across every voter"""
+    await get_movie_list_or_404(movie_list_id, db)
+    item = await db.scalar(select(MovieListItemModel).where(
+        MovieListItemModel.id == item_id,
+        MovieListItemModel.movie_list_id == movie_list_id
+    ))
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found in this list")
+    return PairwiseRecordRead(
+        movie_list_id=movie_list_id,
+        item_id=item_id,
+        opponents=await db.run_sync(pairwise.item_record, movie_list_id, item_id)
+    )
 
 @router.get("/next-matchup/{movie_list_id}")
-async def get_next_matchup(movie_list_id: int, user_id: int = 1, db: Session = Depends(get_db)):
+async def get_next_matchup(movie_list_id: int, user_id: int = 1, db: AsyncSession = Depends(get_db)):
     """Get the next unvoted matchup"""
-    matchup = db.query(MatchupModel).filter(
-        MatchupModel.movie_list_id == movie_list_id,
-        MatchupModel.user_id == user_id,
-        MatchupModel.winner_id == None
-    ).first()
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    matchup = await db.run_sync(matchmaking.next_matchup, movie_list, user_id)
+    await db.commit()
     
     if not matchup:
         return {"message": "No more matchups available"}
     
     # Get the items for this matchup
-    item_a = db.query(MovieListItemModel).filter(MovieListItemModel.id == matchup.item_a_id).first()
-    item_b = db.query(MovieListItemModel).filter(MovieListItemModel.id == matchup.item_b_id).first()
+    item_a = await db.get(MovieListItemModel, matchup.item_a_id)
+    item_b = await db.get(MovieListItemModel, matchup.item_b_id)
     
     return {
         "matchup": matchup,
         "item_a": item_a,
         "item_b": item_b
-    } 
\ No newline at end of file
+    }
+
+@router.get("/next-matchups/{movie_list_id}", response_model=List[MatchupWithItemsRead])
+async def get_next_matchups(movie_list_id: int, user_id: int = 1, count: int = 10, db: AsyncSession = Depends(get_db)):
+    """Get the next ``count`` unvoted matchups with both items, for prefetching"""
+    if not 1 <= count <= MAX_PREFETCH:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MAX_PREFETCH}")
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    rows = await db.run_sync(matchmaking.next_matchups, movie_list, user_id, count)
+    response = [
+        MatchupWithItemsRead(
+            matchup=MatchupRead.model_validate(matchup, from_attributes=True),
+            item_a=MovieListItemRead.model_validate(item_a, from_attributes=True),
+            item_b=MovieListItemRead.model_validate(item_b, from_attributes=True)
+        )
+        for matchup, item_a, item_b in rows
+    ]
+    await db.commit()
+    return response
+
+@router.get("/tournament/{movie_list_id}")
+async def get_tournament_ranking(movie_list_id: int, user_id: int = 1, db: AsyncSession = Depends(get_db)):
+    """Get a user's tournament sort status and, once finished, their full ranking"""
+    movie_list = await get_movie_list_or_404(movie_list_id, db)
+    if movie_list.voting_mode != VotingModeEnum.tournament:
+        raise HTTPException(status_code=400, detail="Movie list is not in tournament mode")
+    
+    session = await db.run_sync(voting_sessions.get_voting_session, movie_list_id, user_id)
+    state = tournament.sort_state(session)
+    if state is None:
+        return {"complete": False, "comparisons": 0, "ranking": None}
+    
+    return {
+        "complete": tournament.is_complete(state),
+        "comparisons": state["comparisons"],
+        "ranking": tournament.ranking(state)
+    }
@@ -0,0 +1,89 @@
+"""
+Process metrics in the Prometheus text format, served at /metrics.
+
+Only what the app needs (counters, fixed-bucket histograms and gauges read
+at scrape time) rather than a client library. Values are per worker
+process; Prometheus adds up the workers it scrapes.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+def register(collector: Callable[[], Iterable[str]]) -> None:
+    """Add a callable returning exposition lines to every scrape"""
+    _collectors.append(collector)
+
+def render() -> str:
+    return "".join(f"{line}\n" for collector in _collectors for line in collector())
+
+def _labels(labels: LabelSet, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelSet, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        register(self.collect)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(labels)} {value:g}"
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        # Per label set: count per bucket (the last one is +Inf), then the sum
+        self._values: Dict[LabelSet, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+        register(self.collect)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            values = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield f"{self.name}_bucket{_labels(labels, le=le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(labels)} {total:g}"
+            yield f"{self.name}_count{_labels(labels)} {cumulative}"
+
+def gauge_lines(name: str, documentation: str, values: Iterable[Tuple[Dict[str, str], float]]) -> Iterable[str]:
+    """Exposition lines for a gauge whose values are read at scrape time"""
+    yield f"# HELP {name} {documentation}"
+    yield f"# TYPE {name} gauge"
+    for labels, value in values:
+        yield f"{name}{_labels(tuple(sorted(labels.items())))} {value:g}"
@@ -1,24 +1,41 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import settings
+from app.db import pool
 from app.db.models import Base
 
 # Create SQLAlchemy engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    echo=settings.DEBUG
-)
+engine = create_engine(settings.DATABASE_URL, **pool.engine_options(settings.DATABASE_URL, "workers"))
+pool.track("workers", engine)
 
-# Create SessionLocal class
+# Create SessionLocal class, for scripts and the background workers
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async driver for each backend DATABASE_URL may name
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(database_url: str) -> URL:
+    """``database_url`` with its driver swapped for the backend's async one"""
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+# The API's engine. Requests use AsyncSession; the services take a plain
+# Session and are called through AsyncSession.run_sync, which runs them
+# against the same async connection, so their queries don't block the event
+# loop either.
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    **pool.engine_options(settings.DATABASE_URL, "api", is_async=True)
+)
+pool.track("api", async_engine.sync_engine)
+
+# Loaded rows stay usable after commit; refreshing them would need another await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close() 
\ No newline at end of file
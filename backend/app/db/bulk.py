@@ -0,0 +1,64 @@
+from typing import Iterable, List, Optional
+from sqlalchemy import Select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+def _dialect_insert(db: Session, model):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+def insert_ignore(db: Session, model, rows: List[dict], index_elements: Iterable[str]) -> None:
+    """INSERT rows, skipping any that conflict on the unique ``index_elements``"""
+    if not rows:
+        return
+    stmt = _dialect_insert(db, model)
+    db.execute(stmt.on_conflict_do_nothing(index_elements=list(index_elements)), rows)
+
+def upsert(db: Session, model, rows: List[dict], index_elements: Iterable[str],
+           update_columns: Optional[Iterable[str]] = None) -> None:
+    """INSERT rows, overwriting ``update_columns`` of rows that conflict on ``index_elements``"""
+    if not rows:
+        return
+    index_elements = list(index_elements)
+    if update_columns is None:
+        update_columns = [key for key in rows[0] if key not in index_elements]
+    stmt = _dialect_insert(db, model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in update_columns}
+    )
+    db.execute(stmt, rows)
+
+def upsert_increment(db: Session, model, rows: List[dict], index_elements: Iterable[str],
+                     increment_columns: Iterable[str], update_columns: Iterable[str] = ()) -> None:
+    """INSERT rows; for rows that conflict on ``index_elements``, add their
+    ``increment_columns`` to the stored values and overwrite ``update_columns``.
+
+    The addition happens in the database, so concurrent increments don't get lost.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    stmt = _dialect_insert(db, model)
+    set_ = {column: table.c[column] + stmt.excluded[column] for column in increment_columns}
+    set_.update({column: stmt.excluded[column] for column in update_columns})
+    stmt = stmt.on_conflict_do_update(index_elements=list(index_elements), set_=set_)
+    db.execute(stmt, rows)
+
+def upsert_select(db: Session, model, columns: Iterable[str], rows: Select, index_elements: Iterable[str],
+                  update_columns: Iterable[str], update_values: Optional[dict] = None) -> int:
+    """INSERT the rows ``rows`` selects into ``columns``; rows that conflict on ``index_elements``
+    get their ``update_columns`` overwritten and ``update_values`` set. Returns the number of
+    rows inserted or updated.
+
+    On SQLite, ``rows`` needs a WHERE clause, or the upsert's ON CONFLICT reads as a join's ON.
+    """
+    stmt = _dialect_insert(db, model).from_select(list(columns), rows)
+    set_ = {column: stmt.excluded[column] for column in update_columns}
+    set_.update(update_values or {})
+    stmt = stmt.on_conflict_do_update(index_elements=list(index_elements), set_=set_)
+    return db.execute(stmt).rowcount
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, JSON, Float, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Enum, JSON, Float, Boolean, DateTime, UniqueConstraint, Index
 from sqlalchemy.orm import relationship, declarative_base
 import enum
 from datetime import datetime
@@ -19,6 +19,23 @@ class ListStatusEnum(str, enum.Enum):
     voting = 'voting'
     closed = 'closed'
 
+class VotingModeEnum(str, enum.Enum):
+    exhaustive = 'exhaustive'
+    adaptive = 'adaptive'
+    tournament = 'tournament'
+    round_robin = 'round_robin'
+
+class RatingModelEnum(str, enum.Enum):
+    elo = 'elo'
+    bradley_terry = 'bradley_terry'
+    glicko2 = 'glicko2'
+
+class ConsensusMethodEnum(str, enum.Enum):
+    borda = 'borda'
+    copeland = 'copeland'
+    schulze = 'schulze'
+    kemeny = 'kemeny'
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True, index=True)
@@ -53,6 +70,9 @@ class MovieList(Base):
     type = Column(Enum(ListTypeEnum), nullable=False)
     media_type = Column(Enum(MediaTypeEnum), nullable=False)
     status = Column(Enum(ListStatusEnum), nullable=False, default=ListStatusEnum.open)
+    voting_mode = Column(Enum(VotingModeEnum), nullable=False, default=VotingModeEnum.exhaustive)
+    rating_model = Column(Enum(RatingModelEnum), nullable=False, default=RatingModelEnum.elo)
+    consensus_method = Column(Enum(ConsensusMethodEnum), nullable=False, default=ConsensusMethodEnum.borda)
     group = relationship('Group', back_populates='lists')
     items = relationship('MovieListItem', back_populates='movie_list')
 
@@ -63,22 +83,119 @@ class MovieListItem(Base):
     external_id = Column(String, nullable=False)  # TMDB/ISBN/etc.
     title = Column(String, nullable=False)
     item_metadata = Column(JSON, nullable=True)
+    # When the hydrator last looked the item's metadata up, found or not (see services/hydration.py)
+    metadata_refreshed_at = Column(DateTime, nullable=True)
     movie_list = relationship('MovieList', back_populates='items')
 
+# Finds the items due for hydration: never looked up, or too long ago
+Index('ix_movie_list_items_metadata_refreshed_at', MovieListItem.metadata_refreshed_at)
+
 class EloScore(Base):
     __tablename__ = 'elo_scores'
+    __table_args__ = (UniqueConstraint('movie_list_id', 'user_id', 'movie_list_item_id', name='uq_elo_scores_list_user_item'),)
     id = Column(Integer, primary_key=True, index=True)
     movie_list_id = Column(Integer, ForeignKey('movie_lists.id'))
     user_id = Column(Integer, ForeignKey('users.id'))
     movie_list_item_id = Column(Integer, ForeignKey('movie_list_items.id'))
     score = Column(Float, nullable=False, default=1200.0)
+    deviation = Column(Float, nullable=False, default=350.0)  # Glicko-2 rating deviation
+    volatility = Column(Float, nullable=False, default=0.06)  # Glicko-2 volatility
+
+# Serves a user's ranking in order, with the item id as a tiebreak for keyset pagination
+Index('ix_elo_scores_list_user_score', EloScore.movie_list_id, EloScore.user_id, EloScore.score.desc(), EloScore.movie_list_item_id)
+
+class PairwiseWin(Base):
+    """Head-to-head vote counts for a pair of items across every voter, item_a_id < item_b_id"""
+    __tablename__ = 'pairwise_wins'
+    __table_args__ = (UniqueConstraint('movie_list_id', 'item_a_id', 'item_b_id', name='uq_pairwise_wins_list_pair'),)
+    id = Column(Integer, primary_key=True, index=True)
+    movie_list_id = Column(Integer, ForeignKey('movie_lists.id'), nullable=False)
+    item_a_id = Column(Integer, ForeignKey('movie_list_items.id'), nullable=False)
+    item_b_id = Column(Integer, ForeignKey('movie_list_items.id'), nullable=False)
+    a_wins = Column(Integer, nullable=False, default=0)
+    b_wins = Column(Integer, nullable=False, default=0)
+
+class VoteEvent(Base):
+    """One recorded vote, appended in the vote's transaction and never changed (see services/vote_log.py)"""
+    __tablename__ = 'vote_events'
+    __table_args__ = (Index('ix_vote_events_list_id', 'movie_list_id', 'id'),)
+    # SQLite only autoincrements INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    movie_list_id = Column(Integer, ForeignKey('movie_lists.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    matchup_id = Column(Integer, nullable=False)
+    item_a_id = Column(Integer, nullable=False)
+    item_b_id = Column(Integer, nullable=False)
+    winner_id = Column(Integer, nullable=False)
+    inline_projections = Column(Integer, nullable=False, default=0)  # Bits of the projections applied with the vote
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class ProjectionCheckpoint(Base):
+    """The last vote event a background projection has applied"""
+    __tablename__ = 'projection_checkpoints'
+    name = Column(String, primary_key=True)
+    last_event_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 class Matchup(Base):
     __tablename__ = 'matchups'
+    __table_args__ = (Index('ix_matchups_list_user_winner', 'movie_list_id', 'user_id', 'winner_id', 'id'),)
     id = Column(Integer, primary_key=True, index=True)
     movie_list_id = Column(Integer, ForeignKey('movie_lists.id'))
     user_id = Column(Integer, ForeignKey('users.id'))
     item_a_id = Column(Integer, ForeignKey('movie_list_items.id'))
     item_b_id = Column(Integer, ForeignKey('movie_list_items.id'))
     winner_id = Column(Integer, ForeignKey('movie_list_items.id'), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow) 
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+    voted_at = Column(DateTime, nullable=True)  # Set when the vote is applied, in the order scores were updated
+
+class VotingSession(Base):
+    __tablename__ = 'voting_sessions'
+    __table_args__ = (UniqueConstraint('movie_list_id', 'user_id', name='uq_voting_sessions_list_user'),)
+    id = Column(Integer, primary_key=True, index=True)
+    movie_list_id = Column(Integer, ForeignKey('movie_lists.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    state = Column(JSON, nullable=True)  # Mode-specific voting state, e.g. the tournament sort
+    completed_at = Column(DateTime, nullable=True)  # Set once the user's ranking is settled
+    total_matchups = Column(Integer, nullable=False, default=0)  # Kept in step with the user's matchups
+    completed_matchups = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ExternalApiCache(Base):
+    """Responses from external APIs such as TMDB, keyed by request (see services/tmdb.py)"""
+    __tablename__ = 'external_api_cache'
+    key = Column(String, primary_key=True)  # Path and sorted query parameters, without credentials
+    payload = Column(JSON, nullable=False)
+    fetched_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    fresh_until = Column(DateTime, nullable=False)  # Served as is until then
+    stale_until = Column(DateTime, nullable=False)  # Then served while a refresh runs, until this
+
+Index('ix_external_api_cache_stale_until', ExternalApiCache.stale_until)
+
+class CatalogSnapshot(Base):
+    """One run of the catalog ingest (see services/catalog_ingest.py), committed with the rows it changed"""
+    __tablename__ = 'catalog_snapshots'
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False)  # The export's file name
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    rows_read = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)  # Lines that weren't valid JSON or lacked an id or title
+    inserted = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    removed = Column(Integer, nullable=False, default=0)
+
+class CatalogMovie(Base):
+    """A movie from the TMDB export, which search and the movie endpoints serve from"""
+    __tablename__ = 'catalog_movies'
+    id = Column(Integer, primary_key=True, autoincrement=False)  # The TMDB ID
+    title = Column(String, nullable=False)
+    popularity = Column(Float, nullable=False, default=0.0)
+    adult = Column(Boolean, nullable=False, default=False)
+    details = Column(JSON, nullable=True)  # Overview, poster, release date and genres, once known
+    snapshot_id = Column(Integer, ForeignKey('catalog_snapshots.id'), nullable=False)  # The last snapshot that changed the row
+    removed_at = Column(DateTime, nullable=True)  # Set when a snapshot no longer has the movie
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+Index('ix_catalog_movies_snapshot_id', CatalogMovie.snapshot_id)
@@ -0,0 +1,132 @@
+"""
+Connection pool settings and instrumentation for the database engines.
+
+Both engines, the API's async one and the sync one behind scripts and
+background workers, are configured from the DB_* settings, and each worker
+process has its own pools. Every checkout from a queue pool is timed, and
+/metrics reports the wait times, timeouts and how many of each pool's
+connections are in use. Long waits with the pool at capacity mean the
+workers need more connections (or the database needs fewer workers).
+
+DB_PGBOUNCER is for PgBouncer in transaction pooling mode, where each
+transaction may run on a different server connection. asyncpg's prepared
+statements get unique names and aren't cached, since a statement prepared
+on one server connection doesn't exist on the next, and the statement
+timeout is set with SET LOCAL in each transaction, because PgBouncer
+doesn't pass startup options on. (Setting statement_timeout on the
+database role instead saves that round trip.) DB_POOL_SIZE=0 leaves the
+pooling to PgBouncer altogether.
+"""
+
+import time
+from typing import Dict
+from uuid import uuid4
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from app.core import metrics
+from app.core.config import settings
+
+CHECKOUT_SECONDS = metrics.Histogram(
+    "rnkd_db_pool_checkout_seconds",
+    "Time spent getting a connection from the pool, including opening new ones",
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+)
+CHECKOUT_TIMEOUTS = metrics.Counter(
+    "rnkd_db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT"
+)
+
+# Pools reported at /metrics, by name
+_engines: Dict[str, Engine] = {}
+
+class _TimedCheckout:
+    """Mixin for queue pools recording checkout wait times under ``metrics_name``"""
+    metrics_name = "default"
+
+    # QueuePool's hook for taking a connection off the queue (or opening one)
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            CHECKOUT_TIMEOUTS.inc(pool=self.metrics_name)
+            raise
+        CHECKOUT_SECONDS.observe(time.perf_counter() - start, pool=self.metrics_name)
+        return connection
+
+def _timed_pool_class(base, name: str):
+    # A class per engine, since pools are recreated from their class on dispose()
+    return type(f"Timed{base.__name__}", (_TimedCheckout, base), {"metrics_name": name})
+
+def engine_options(database_url: str, name: str, is_async: bool = False) -> dict:
+    """Keyword arguments for create_engine / create_async_engine from the DB_* settings"""
+    url = make_url(database_url)
+    options = {"echo": settings.DB_ECHO, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if url.get_backend_name() != "postgresql":
+        # SQLite picks its own pool class and has no statement timeout
+        return options
+
+    if settings.DB_POOL_SIZE == 0:
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=_timed_pool_class(AsyncAdaptedQueuePool if is_async else QueuePool, name),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE
+        )
+
+    connect_args = {}
+    if settings.DB_PGBOUNCER:
+        if is_async:
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__"
+            )
+    elif settings.DB_STATEMENT_TIMEOUT_MS:
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+def track(name: str, engine: Engine) -> None:
+    """Report ``engine``'s pool at /metrics (pass an async engine's sync_engine)"""
+    _engines[name] = engine
+
+def _set_transaction_timeout(session: Session, transaction, connection) -> None:
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}")
+
+def _pool_gauges():
+    pools = [(name, engine.pool) for name, engine in _engines.items() if isinstance(engine.pool, QueuePool)]
+    # A negative DB_MAX_OVERFLOW means no limit
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW if settings.DB_MAX_OVERFLOW >= 0 else None
+    yield from metrics.gauge_lines(
+        "rnkd_db_pool_connections",
+        "Pooled connections by state",
+        [({"pool": name, "state": "in_use"}, pool.checkedout()) for name, pool in pools]
+        + [({"pool": name, "state": "idle"}, pool.checkedin()) for name, pool in pools]
+    )
+    yield from metrics.gauge_lines(
+        "rnkd_db_pool_capacity",
+        "Most connections the pool will open (DB_POOL_SIZE + DB_MAX_OVERFLOW)",
+        [({"pool": name}, capacity) for name, _ in pools if capacity]
+    )
+    yield from metrics.gauge_lines(
+        "rnkd_db_pool_saturation",
+        "Share of the pool's capacity in use",
+        [({"pool": name}, pool.checkedout() / capacity) for name, pool in pools if capacity]
+    )
+
+metrics.register(_pool_gauges)
+
+if settings.DB_PGBOUNCER and settings.DB_STATEMENT_TIMEOUT_MS:
+    event.listen(Session, "after_begin", _set_transaction_timeout)
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Any
 from enum import Enum
+from datetime import datetime
 
 class ListTypeEnum(str, Enum):
     group = 'group'
@@ -16,6 +17,23 @@ class ListStatusEnum(str, Enum):
     voting = 'voting'
     closed = 'closed'
 
+class VotingModeEnum(str, Enum):
+    exhaustive = 'exhaustive'
+    adaptive = 'adaptive'
+    tournament = 'tournament'
+    round_robin = 'round_robin'
+
+class RatingModelEnum(str, Enum):
+    elo = 'elo'
+    bradley_terry = 'bradley_terry'
+    glicko2 = 'glicko2'
+
+class ConsensusMethodEnum(str, Enum):
+    borda = 'borda'
+    copeland = 'copeland'
+    schulze = 'schulze'
+    kemeny = 'kemeny'
+
 # User Schemas
 class UserBase(BaseModel):
     name: str
@@ -62,11 +80,21 @@ class MovieListBase(BaseModel):
     type: ListTypeEnum
     media_type: MediaTypeEnum
     status: ListStatusEnum = ListStatusEnum.open
+    voting_mode: VotingModeEnum = VotingModeEnum.exhaustive
+    rating_model: RatingModelEnum = RatingModelEnum.elo
+    consensus_method: ConsensusMethodEnum = ConsensusMethodEnum.borda
     group_id: Optional[int] = None
 
 class MovieListCreate(MovieListBase):
     created_by_user_id: int
 
+class MovieListUpdate(BaseModel):
+    name: Optional[str] = None
+    status: Optional[ListStatusEnum] = None
+    voting_mode: Optional[VotingModeEnum] = None
+    rating_model: Optional[RatingModelEnum] = None
+    consensus_method: Optional[ConsensusMethodEnum] = None
+
 class MovieListRead(MovieListBase):
     id: int
     class Config:
@@ -102,6 +130,69 @@ class EloScoreRead(EloScoreBase):
     class Config:
         orm_mode = True
 
+class ItemScoreRead(BaseModel):
+    """A score from any rating model; fitted scores have no row id, group fits no user"""
+    id: Optional[int] = None
+    movie_list_id: int
+    user_id: Optional[int] = None
+    movie_list_item_id: int
+    score: float
+    deviation: Optional[float] = None
+    model: RatingModelEnum = RatingModelEnum.elo
+    class Config:
+        orm_mode = True
+
+class ConsensusItemRead(BaseModel):
+    """An item's place in the group result; ``points`` is the method's score (Borda points,
+    Copeland score, Schulze wins, or places from the bottom for Kemeny)"""
+    movie_list_item_id: int
+    title: str
+    points: float
+    rank: int
+
+class ConsensusResultRead(BaseModel):
+    """Group consensus for a list, aggregated from every voter's ranking"""
+    movie_list_id: int
+    method: ConsensusMethodEnum = ConsensusMethodEnum.borda
+    voters: int
+    items: List[ConsensusItemRead]
+
+class RankedItemRead(BaseModel):
+    rank: int
+    percentile: float
+    movie_list_item_id: int
+    title: str
+    external_id: str
+    item_metadata: Optional[Any] = None
+    score: float
+    deviation: Optional[float] = None
+
+class RankingRead(BaseModel):
+    """One page of a user's ranking, best first; pass ``next_cursor`` back as ``cursor`` for the next page"""
+    movie_list_id: int
+    user_id: int
+    model: RatingModelEnum
+    total: int
+    items: List[RankedItemRead]
+    next_cursor: Optional[str] = None
+
+class PairwiseMatrixRead(BaseModel):
+    """Head-to-head wins across every voter: wins[i][j] is how often item_ids[i] beat item_ids[j]"""
+    movie_list_id: int
+    item_ids: List[int]
+    wins: List[List[int]]
+
+class HeadToHeadRead(BaseModel):
+    opponent_id: int
+    wins: int
+    losses: int
+
+class PairwiseRecordRead(BaseModel):
+    """One item's head-to-head record against every opponent it has met"""
+    movie_list_id: int
+    item_id: int
+    opponents: List[HeadToHeadRead]
+
 # Matchup Schemas
 class MatchupBase(BaseModel):
     movie_list_id: int
@@ -115,6 +206,30 @@ class MatchupCreate(MatchupBase):
 
 class MatchupRead(MatchupBase):
     id: int
-    created_at: Optional[str]
+    created_at: Optional[datetime] = None
+    voted_at: Optional[datetime] = None
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True
+
+class MatchupWithItemsRead(BaseModel):
+    matchup: MatchupRead
+    item_a: MovieListItemRead
+    item_b: MovieListItemRead
+
+# Vote Schemas
+class VoteCreate(BaseModel):
+    matchup_id: int
+    winner_id: int
+
+class VoteBatchCreate(BaseModel):
+    votes: List[VoteCreate] = Field(..., min_length=1, max_length=500)
+
+class VoteResult(BaseModel):
+    matchup_id: int
+    status: str  # "recorded" or "error"
+    detail: Optional[str] = None
+
+class VoteBatchRead(BaseModel):
+    recorded: int
+    failed: int
+    results: List[VoteResult]
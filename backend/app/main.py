@@ -1,7 +1,11 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from app.core import metrics
 from app.core.config import settings
 from app.api.v1.api import api_router
+from app.services import catalog, consensus, hot_scores, hydration, media, projections, tmdb
+import asyncio
 
 app = FastAPI(
     title="Rnkd API",
@@ -22,6 +26,76 @@ app.add_middleware(
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.on_event("startup")
+async def start_hot_score_flusher():
+    if settings.HOT_SCORES_ENABLED:
+        app.state.hot_score_flusher = asyncio.create_task(hot_scores.run_flusher(settings.HOT_SCORES_FLUSH_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_hot_score_flusher():
+    flusher = getattr(app.state, "hot_score_flusher", None)
+    if flusher is not None:
+        flusher.cancel()
+        # Write back whatever the last interval left behind
+        await asyncio.get_running_loop().run_in_executor(None, hot_scores.flush_in_new_session)
+
+@app.on_event("startup")
+async def start_projector():
+    if settings.ASYNC_PROJECTIONS:
+        app.state.projector = asyncio.create_task(projections.run_projector(settings.PROJECTION_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_projector():
+    projector = getattr(app.state, "projector", None)
+    if projector is not None:
+        projector.cancel()
+        await asyncio.get_running_loop().run_in_executor(None, projections.run_in_new_session)
+
+@app.on_event("startup")
+async def start_catalog_refresher():
+    app.state.catalog_refresher = asyncio.create_task(catalog.run_refresher(settings.CATALOG_REFRESH_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_catalog_refresher():
+    refresher = getattr(app.state, "catalog_refresher", None)
+    if refresher is not None:
+        refresher.cancel()
+
+@app.on_event("startup")
+async def start_tmdb_cache_purger():
+    if settings.TMDB_ENABLED:
+        app.state.tmdb_cache_purger = asyncio.create_task(tmdb.run_purger(settings.TMDB_CACHE_PURGE_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_tmdb_cache_purger():
+    purger = getattr(app.state, "tmdb_cache_purger", None)
+    if purger is not None:
+        purger.cancel()
+
+@app.on_event("startup")
+async def start_hydrator():
+    if settings.HYDRATION_ENABLED:
+        app.state.hydrator = asyncio.create_task(hydration.run_hydrator(settings.HYDRATION_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_hydrator():
+    hydrator = getattr(app.state, "hydrator", None)
+    if hydrator is not None:
+        # Chunks claimed but not written back are retried by the next pass
+        hydrator.cancel()
+
+@app.on_event("shutdown")
+def shutdown_consensus_pool():
+    consensus.shutdown_pool()
+
+@app.on_event("shutdown")
+async def close_tmdb_client():
+    await tmdb.close()
+
+@app.on_event("shutdown")
+async def close_media_adapters():
+    await media.close()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Rnkd API"}
@@ -30,6 +104,11 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "rnkd-api"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    # This worker's connection pools and checkout waits, in the Prometheus text format
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1 @@
+# Domain logic shared by API endpoints and scripts
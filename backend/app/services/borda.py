@@ -0,0 +1,187 @@
+"""
+Group consensus by Borda count over every voter's individual ranking.
+
+Each voter ranks the list's items by their stored scores (Elo, or Glicko-2
+on glicko2 lists). An item gets one point for every item that voter ranks
+below it, and half a point for every item tied with it, so with n items the
+points per voter run from 0 to n - 1. The group result is the sum over
+voters. Voters are users with at least one vote on the list; items a voter
+has no score for sit at the default score.
+
+Points are computed for all voters at once over a users x items score matrix
+and cached per list together with each voter's row. A voter's row is keyed
+by their voting session's updated_at, which every vote bumps, so a request
+only reloads and re-ranks the voters who voted since the last one and
+adjusts the totals by the difference. Adding or removing items changes
+everyone's points, so that rebuilds the whole list.
+
+The API reads the scores through its session and ranks them in a worker
+thread (see load_standings), so a large list doesn't block the event loop;
+merging the ranks into the cache is cheap and stays on the loop. Another
+request may merge in between, so every row is stored with the stamp it was
+computed at: at worst a row is a little behind, and the next request
+refreshes it.
+"""
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import chain
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.db.models import EloScore, MovieListItem, VotingSession
+from app.services import elo
+
+# How many lists' standings to keep in memory
+CACHE_SIZE = 256
+
+# Voters whose score rows are loaded per query
+LOAD_CHUNK_SIZE = 1000
+
+@dataclass
+class Standings:
+    item_ids: np.ndarray          # column labels, in id order
+    rows: Dict[int, int]          # user id -> row of ``points``
+    stamps: Dict[int, datetime]   # user id -> session updated_at the row was computed at
+    points: np.ndarray            # users x items Borda points
+    totals: np.ndarray            # per item, summed over users
+    version: tuple = ()           # changes whenever the items or any voter's row change
+
+@dataclass
+class ScoreUpdate:
+    """Scores read for a list's standings, to be ranked and merged into the cache (see apply_update)"""
+    item_ids: np.ndarray          # the list's items, in id order
+    stamps: Dict[int, datetime]   # every voter's session updated_at, as read
+    user_ids: List[int]           # voters whose scores were loaded
+    scores: np.ndarray            # their users x items scores
+    rebuild: bool                 # whether they are every voter, replacing the cached standings
+    base: Optional[Standings]     # the cached standings they update otherwise
+
+_cache: "OrderedDict[int, Standings]" = OrderedDict()
+
+def borda_points(scores: np.ndarray) -> np.ndarray:
+    """Borda points for each row of a users x items score matrix, higher scores ranking first.
+
+    An item scores the number of items below it plus half the number tied
+    with it. Ranks for all rows are computed in one sort: scores are mapped
+    to exact integer codes and offset by row, so every row sorts on its own.
+    """
+    users, items = scores.shape
+    if scores.size == 0:
+        return np.zeros((users, items))
+    _, codes = np.unique(scores, return_inverse=True)
+    codes = codes.reshape(users, items).astype(np.int64)
+    keys = codes + np.arange(users, dtype=np.int64)[:, None] * (codes.max() + 1)
+    flat = keys.ravel()
+    ordered = np.sort(flat)
+    below = np.searchsorted(ordered, flat, side="left")
+    ties = np.searchsorted(ordered, flat, side="right") - below - 1
+    row_starts = np.repeat(np.arange(users, dtype=np.int64) * items, items)
+    return ((below - row_starts) + ties / 2).reshape(users, items)
+
+def voter_stamps(db: Session, movie_list_id: int) -> Dict[int, datetime]:
+    """When each voter's session last changed, for users with at least one vote on the list"""
+    return dict(db.execute(
+        select(VotingSession.user_id, VotingSession.updated_at).where(
+            VotingSession.movie_list_id == movie_list_id,
+            VotingSession.completed_matchups > 0
+        )
+    ).all())
+
+def load_scores(db: Session, movie_list_id: int, user_ids: List[int], item_ids: np.ndarray) -> np.ndarray:
+    """The users x items score matrix for the given users, defaulting missing rows"""
+    scores = np.full((len(user_ids), len(item_ids)), elo.DEFAULT_SCORE, dtype=np.float64)
+    if scores.size == 0:
+        return scores
+    row_of = {user_id: row for row, user_id in enumerate(user_ids)}
+    for start in range(0, len(user_ids), LOAD_CHUNK_SIZE):
+        rows = db.execute(
+            select(EloScore.user_id, EloScore.movie_list_item_id, EloScore.score).where(
+                EloScore.movie_list_id == movie_list_id,
+                EloScore.user_id.in_(user_ids[start:start + LOAD_CHUNK_SIZE])
+            )
+        ).all()
+        if not rows:
+            continue
+        # Ids are far below 2**53, so they survive the trip through float64
+        values = np.fromiter(chain.from_iterable(rows), dtype=np.float64).reshape(-1, 3)
+        users = np.array([row_of[user_id] for user_id in values[:, 0].astype(np.int64).tolist()], dtype=np.int64)
+        columns = np.searchsorted(item_ids, values[:, 1].astype(np.int64))
+        # Score rows for items that have since left the list are ignored
+        known = (columns < len(item_ids)) & (item_ids[np.minimum(columns, len(item_ids) - 1)] == values[:, 1])
+        scores[users[known], columns[known]] = values[known, 2]
+    return scores
+
+def read_update(db: Session, movie_list_id: int) -> ScoreUpdate:
+    """Load the scores of the voters the cached standings are missing or have out of date"""
+    item_ids = np.array(db.scalars(
+        select(MovieListItem.id).where(MovieListItem.movie_list_id == movie_list_id).order_by(MovieListItem.id)
+    ).all(), dtype=np.int64)
+    stamps = voter_stamps(db, movie_list_id)
+    standings = _cache.get(movie_list_id)
+    rebuild = (standings is None or not np.array_equal(standings.item_ids, item_ids)
+               or not set(standings.stamps) <= set(stamps))
+    if rebuild:
+        user_ids = sorted(stamps)
+    else:
+        user_ids = sorted(user_id for user_id, stamp in stamps.items() if standings.stamps.get(user_id) != stamp)
+    scores = load_scores(db, movie_list_id, user_ids, item_ids)
+    return ScoreUpdate(item_ids, stamps, user_ids, scores, rebuild, None if rebuild else standings)
+
+def _merge(standings: Standings, user_ids: List[int], stamps: Dict[int, datetime], points: np.ndarray) -> None:
+    """Replace the rows of voters whose stamp changed and add new voters, adjusting the totals in place"""
+    changed = [i for i, user_id in enumerate(user_ids) if standings.stamps.get(user_id) != stamps[user_id]]
+    known = [i for i in changed if user_ids[i] in standings.rows]
+    if known:
+        rows = [standings.rows[user_ids[i]] for i in known]
+        new_points = points[known]
+        standings.totals += new_points.sum(axis=0) - standings.points[rows].sum(axis=0)
+        standings.points[rows] = new_points
+    added = [i for i in changed if user_ids[i] not in standings.rows]
+    if added:
+        new_points = points[added]
+        first_row = len(standings.points)
+        standings.points = np.vstack([standings.points, new_points])
+        standings.totals += new_points.sum(axis=0)
+        standings.rows.update({user_ids[i]: first_row + row for row, i in enumerate(added)})
+    standings.stamps.update({user_ids[i]: stamps[user_ids[i]] for i in changed})
+
+def apply_update(movie_list_id: int, update: ScoreUpdate, points: np.ndarray) -> Standings:
+    """Merge the update's Borda ``points`` into the list's cached standings, which it returns"""
+    if update.rebuild:
+        standings = Standings(
+            item_ids=update.item_ids,
+            rows={user_id: row for row, user_id in enumerate(update.user_ids)},
+            stamps={user_id: update.stamps[user_id] for user_id in update.user_ids},
+            points=points,
+            totals=points.sum(axis=0)
+        )
+    else:
+        # The standings may have been replaced or evicted since the scores were read
+        standings = _cache.get(movie_list_id, update.base)
+        # If they were rebuilt for changed items meanwhile, they are newer than the update
+        if np.array_equal(standings.item_ids, update.item_ids):
+            _merge(standings, update.user_ids, update.stamps, points)
+    standings.version = (standings.item_ids.tobytes(), tuple(sorted(standings.stamps.items())))
+    _cache[movie_list_id] = standings
+    _cache.move_to_end(movie_list_id)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return standings
+
+def list_standings(db: Session, movie_list_id: int) -> Standings:
+    """Every voter's Borda points for a list and their totals, from the cache where still valid"""
+    update = read_update(db, movie_list_id)
+    return apply_update(movie_list_id, update, borda_points(update.scores))
+
+async def load_standings(db: AsyncSession, movie_list_id: int) -> Standings:
+    """list_standings for the API: the scores are read through ``db`` and ranked in a worker thread"""
+    update = await db.run_sync(read_update, movie_list_id)
+    if not update.user_ids:
+        return apply_update(movie_list_id, update, borda_points(update.scores))
+    points = await asyncio.get_running_loop().run_in_executor(None, borda_points, update.scores)
+    return apply_update(movie_list_id, update, points)
@@ -0,0 +1,204 @@
+"""
+Bradley-Terry ratings fitted from a list's votes.
+
+Unlike online Elo, a Bradley-Terry fit uses all votes at once, so the
+result doesn't depend on vote order and settles with fewer votes. Strengths
+are fitted with the fixed-point iteration of Newman (2023), which converges
+much faster than the classic MM algorithm, vectorized over the sparse list
+of compared item pairs (w_ij = times i beat j):
+
+    p_i <- sum_j w_ij p_j / (p_i + p_j)  /  sum_j w_ji / (p_i + p_j)
+
+Every item also gets PRIOR_GAMES virtual games (half won) against an
+average opponent, which keeps items that never won or never lost finite.
+Strengths are reported on the Elo scale (1200 + 400 log10 p) so they can be
+served alongside Elo scores.
+
+Group fits read the list's head-to-head counts (see pairwise) rather than
+every vote. Fits are cached per (list, user) or (list, group) and keyed by a
+cheap data version; when new votes arrive the fit is re-run warm-started
+from the previous strengths, which converges in a few iterations. The API
+reads the votes through its session and runs the fit in a worker thread
+(see load_list_scores), so a large list doesn't block the event loop.
+"""
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Optional, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.db.models import Matchup, MovieListItem
+from app.services import elo, pairwise
+
+# Virtual games against an average opponent per item (half of them won)
+PRIOR_GAMES = 1.0
+
+MAX_ITERATIONS = 500
+TOLERANCE = 1e-6  # max change in log strength (~0.0002 Elo points)
+
+# How many fits to keep in memory
+CACHE_SIZE = 256
+
+@dataclass
+class Fit:
+    item_ids: np.ndarray
+    strengths: np.ndarray
+    iterations: int
+
+@dataclass
+class FitData:
+    """The votes read for a fit (see read_fit_data), as positions into ``item_ids``"""
+    version: tuple
+    item_ids: np.ndarray
+    pairs: Optional[Tuple[np.ndarray, ...]]             # group fits: (edge_i, edge_j, wins_i, wins_j)
+    votes: Optional[Tuple[np.ndarray, np.ndarray]]      # one user's fits: (winners, losers)
+    previous: Optional[Fit]                             # the stale cached fit, to warm-start from
+
+def fit_strengths(winners: np.ndarray, losers: np.ndarray, n_items: int, init: Optional[np.ndarray] = None,
+                  prior_games: float = PRIOR_GAMES, tol: float = TOLERANCE,
+                  max_iterations: int = MAX_ITERATIONS) -> Tuple[np.ndarray, int]:
+    """Fit Bradley-Terry strengths from (winner, loser) item indices.
+
+    Returns the strengths (geometric mean 1) and the number of iterations.
+    """
+    # Collapse repeated comparisons into one edge per unordered pair with win counts for each side
+    lo = np.minimum(winners, losers).astype(np.int64)
+    hi = np.maximum(winners, losers).astype(np.int64)
+    pair_keys, inverse = np.unique(lo * n_items + hi, return_inverse=True)
+    edge_i = pair_keys // n_items
+    edge_j = pair_keys % n_items
+    wins_i = np.bincount(inverse, weights=(winners == lo), minlength=len(pair_keys))
+    wins_j = np.bincount(inverse, weights=(winners == hi), minlength=len(pair_keys))
+    return fit_edge_strengths(edge_i, edge_j, wins_i, wins_j, n_items, init, prior_games, tol, max_iterations)
+
+def fit_edge_strengths(edge_i: np.ndarray, edge_j: np.ndarray, wins_i: np.ndarray, wins_j: np.ndarray,
+                       n_items: int, init: Optional[np.ndarray] = None, prior_games: float = PRIOR_GAMES,
+                       tol: float = TOLERANCE, max_iterations: int = MAX_ITERATIONS) -> Tuple[np.ndarray, int]:
+    """Fit strengths from one edge per compared pair of item indices, with each side's win count"""
+    wins_i = np.asarray(wins_i, dtype=np.float64)
+    wins_j = np.asarray(wins_j, dtype=np.float64)
+    half_prior = prior_games / 2
+
+    p = np.ones(n_items) if init is None else np.asarray(init, dtype=np.float64).copy()
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        inv_sum = 1 / (p[edge_i] + p[edge_j])
+        prior_term = half_prior / (p + 1)
+        numerator = (
+            np.bincount(edge_i, weights=wins_i * p[edge_j] * inv_sum, minlength=n_items)
+            + np.bincount(edge_j, weights=wins_j * p[edge_i] * inv_sum, minlength=n_items)
+            + prior_term
+        )
+        denominator = (
+            np.bincount(edge_i, weights=wins_j * inv_sum, minlength=n_items)
+            + np.bincount(edge_j, weights=wins_i * inv_sum, minlength=n_items)
+            + prior_term
+        )
+        new_p = numerator / denominator
+        new_p /= np.exp(np.mean(np.log(new_p)))
+        change = np.max(np.abs(np.log(new_p) - np.log(p)))
+        p = new_p
+        if change < tol:
+            break
+    return p, iterations
+
+def to_elo_scale(strengths: np.ndarray) -> np.ndarray:
+    return elo.DEFAULT_SCORE + 400 * np.log10(strengths)
+
+_cache: "OrderedDict[tuple, Tuple[tuple, Fit]]" = OrderedDict()
+
+def _votes_filter(movie_list_id: int, user_id: Optional[int]):
+    conditions = [Matchup.movie_list_id == movie_list_id, Matchup.winner_id != None]
+    if user_id is not None:
+        conditions.append(Matchup.user_id == user_id)
+    return conditions
+
+def data_version(db: Session, movie_list_id: int, user_id: Optional[int] = None) -> tuple:
+    """A cheap fingerprint that changes whenever votes are added"""
+    item_count = db.scalar(select(func.count()).where(MovieListItem.movie_list_id == movie_list_id))
+    if user_id is None:
+        # Votes are never removed, so the group's vote count only changes when votes arrive
+        return (pairwise.total_votes(db, movie_list_id), item_count)
+    count, last_vote, last_id = db.execute(
+        select(func.count(), func.max(Matchup.voted_at), func.max(Matchup.id)).where(*_votes_filter(movie_list_id, user_id))
+    ).one()
+    return (count, last_vote, last_id, item_count)
+
+def load_votes(db: Session, movie_list_id: int, user_id: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Winner and loser item ids of every vote on the list (optionally one user's)"""
+    rows = db.execute(
+        select(Matchup.item_a_id, Matchup.item_b_id, Matchup.winner_id).where(*_votes_filter(movie_list_id, user_id))
+    ).all()
+    a, b, winner = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 3).T
+    return winner, np.where(winner == a, b, a)
+
+def read_fit_data(db: Session, movie_list_id: int,
+                  user_id: Optional[int] = None) -> Tuple[Optional[Fit], Optional[FitData]]:
+    """The cached fit for one user, or the whole group when user_id is None, if it's current;
+    otherwise the data to fit
+    """
+    key = (movie_list_id, user_id)
+    version = data_version(db, movie_list_id, user_id)
+    cached = _cache.get(key)
+    if cached and cached[0] == version:
+        _cache.move_to_end(key)
+        return cached[1], None
+
+    item_ids = np.array(db.scalars(
+        select(MovieListItem.id).where(MovieListItem.movie_list_id == movie_list_id).order_by(MovieListItem.id)
+    ).all(), dtype=np.int64)
+    if user_id is None:
+        # The group fit reads the head-to-head counts instead of every vote
+        item_a_ids, item_b_ids, a_wins, b_wins = pairwise.pair_counts(db, movie_list_id)
+        item_ids = np.union1d(item_ids, np.concatenate([item_a_ids, item_b_ids]))
+        pairs = (np.searchsorted(item_ids, item_a_ids), np.searchsorted(item_ids, item_b_ids), a_wins, b_wins)
+        return None, FitData(version, item_ids, pairs, None, cached[1] if cached else None)
+    winner_ids, loser_ids = load_votes(db, movie_list_id, user_id)
+    item_ids = np.union1d(item_ids, np.concatenate([winner_ids, loser_ids]))
+    votes = (np.searchsorted(item_ids, winner_ids), np.searchsorted(item_ids, loser_ids))
+    return None, FitData(version, item_ids, None, votes, cached[1] if cached else None)
+
+def compute_fit(data: FitData) -> Fit:
+    """Fit strengths to the data read, warm-started from the previous fit when there is one"""
+    item_ids = data.item_ids
+    init = np.ones(len(item_ids))
+    if data.previous is not None:
+        known = np.isin(item_ids, data.previous.item_ids)
+        init[known] = data.previous.strengths[np.searchsorted(data.previous.item_ids, item_ids[known])]
+    if data.pairs is not None:
+        strengths, iterations = fit_edge_strengths(*data.pairs, len(item_ids), init=init)
+    else:
+        strengths, iterations = fit_strengths(*data.votes, len(item_ids), init=init)
+    return Fit(item_ids=item_ids, strengths=strengths, iterations=iterations)
+
+def store_fit(movie_list_id: int, user_id: Optional[int], version: tuple, fit: Fit) -> Fit:
+    key = (movie_list_id, user_id)
+    _cache[key] = (version, fit)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return fit
+
+def fit_list(db: Session, movie_list_id: int, user_id: Optional[int] = None) -> Fit:
+    """Fit (or fetch from cache) strengths for one user, or the whole group when user_id is None"""
+    fit, data = read_fit_data(db, movie_list_id, user_id)
+    if fit is None:
+        fit = store_fit(movie_list_id, user_id, data.version, compute_fit(data))
+    return fit
+
+def list_scores(db: Session, movie_list_id: int, user_id: Optional[int] = None) -> Dict[int, float]:
+    """Bradley-Terry scores on the Elo scale, keyed by item id"""
+    fit = fit_list(db, movie_list_id, user_id)
+    return dict(zip(fit.item_ids.tolist(), to_elo_scale(fit.strengths).tolist()))
+
+async def load_list_scores(db: AsyncSession, movie_list_id: int, user_id: Optional[int] = None) -> Dict[int, float]:
+    """list_scores for the API: the votes are read through ``db`` and fitted in a worker thread"""
+    fit, data = await db.run_sync(read_fit_data, movie_list_id, user_id)
+    if fit is None:
+        fit = await asyncio.get_running_loop().run_in_executor(None, compute_fit, data)
+        store_fit(movie_list_id, user_id, data.version, fit)
+    return dict(zip(fit.item_ids.tolist(), to_elo_scale(fit.strengths).tolist()))
@@ -0,0 +1,124 @@
+"""
+The movie catalog behind search and the movie endpoints.
+
+catalog_movies is filled from TMDB's daily export (see
+services/catalog_ingest.py). Each worker keeps a SearchIndex of the live,
+non-adult movies in memory for autocomplete and keeps it current by
+checking catalog_snapshots every CATALOG_REFRESH_INTERVAL seconds: the rows
+a new snapshot changed carry its id, so only those are read and applied.
+When a snapshot changed more than REBUILD_SHARE of the index (or at
+startup, when there's no index yet), a new index is built in a thread and
+swapped in instead, which is faster than that many updates and doesn't hold
+up requests on the event loop.
+"""
+
+import asyncio
+import logging
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.db.base import SessionLocal
+from app.db.models import CatalogMovie, CatalogSnapshot
+from app.services.search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Share of the index a snapshot can change before it's rebuilt rather than updated
+REBUILD_SHARE = 0.05
+
+# Index updates applied between giving other requests a turn
+APPLY_CHUNK = 1000
+
+# Rows read at a time while building the index
+BUILD_BATCH = 10000
+
+_index = SearchIndex()
+_snapshot_id = 0  # The last snapshot applied to _index
+
+def get_index() -> SearchIndex:
+    return _index
+
+def movie_json(movie: CatalogMovie) -> dict:
+    """A catalog movie in the shape of the movies API"""
+    details = movie.details or {}
+    return {
+        "id": movie.id,
+        "title": movie.title,
+        "overview": details.get("overview") or "",
+        "poster_path": details.get("poster_path"),
+        "release_date": details.get("release_date") or "",
+        "genre_ids": details.get("genre_ids") or [],
+        "external_id": str(movie.id)
+    }
+
+def get_movies(db: Session, movie_ids: List[int]) -> List[dict]:
+    """The live movies with ``movie_ids``, in that order"""
+    movies = {movie.id: movie for movie in db.scalars(
+        select(CatalogMovie).where(CatalogMovie.id.in_(movie_ids), CatalogMovie.removed_at.is_(None))
+    )}
+    return [movie_json(movies[movie_id]) for movie_id in movie_ids if movie_id in movies]
+
+def latest_snapshot_id(db: Session) -> int:
+    return db.scalar(select(func.max(CatalogSnapshot.id))) or 0
+
+def _searchable(query):
+    return query.where(CatalogMovie.removed_at.is_(None), CatalogMovie.adult.is_(False))
+
+def build_index(db: Session) -> Tuple[SearchIndex, int]:
+    """A new index of the catalog, and the snapshot it has everything up to"""
+    # Read first: rows from a snapshot committed meanwhile are applied again next time, which is harmless
+    snapshot_id = latest_snapshot_id(db)
+    rows = db.execute(
+        _searchable(select(CatalogMovie.id, CatalogMovie.title, CatalogMovie.popularity))
+        .execution_options(yield_per=BUILD_BATCH)
+    )
+    return SearchIndex.build(tuple(row) for row in rows), snapshot_id
+
+def read_changes(snapshot_id: int, indexed: int) -> Tuple[Optional[SearchIndex], list, int]:
+    """What the index needs after ``snapshot_id``, read in a worker thread.
+
+    Returns (index, [], latest) when a new index should replace one of
+    ``indexed`` titles, or (None, rows, latest) when the (id, title,
+    popularity, searchable) rows should be applied to it.
+    """
+    with SessionLocal() as db:
+        latest = latest_snapshot_id(db)
+        if latest <= snapshot_id:
+            return None, [], snapshot_id
+        changed = CatalogMovie.snapshot_id > snapshot_id, CatalogMovie.snapshot_id <= latest
+        if db.scalar(select(func.count()).select_from(CatalogMovie).where(*changed)) > indexed * REBUILD_SHARE:
+            index, latest = build_index(db)
+            return index, [], latest
+        rows = db.execute(select(
+            CatalogMovie.id, CatalogMovie.title, CatalogMovie.popularity,
+            CatalogMovie.removed_at.is_(None) & CatalogMovie.adult.is_(False)
+        ).where(*changed)).all()
+        return None, rows, latest
+
+def apply_changes(index: SearchIndex, rows: Iterable[tuple]) -> None:
+    for movie_id, title, popularity, searchable in rows:
+        if searchable:
+            index.upsert(movie_id, title, popularity)
+        else:
+            index.remove(movie_id)
+
+async def refresh() -> None:
+    """Bring this worker's index up to date with the catalog"""
+    global _index, _snapshot_id
+    index, rows, latest = await asyncio.get_running_loop().run_in_executor(None, read_changes, _snapshot_id, len(_index))
+    if index is not None:
+        _index = index
+    for start in range(0, len(rows), APPLY_CHUNK):
+        apply_changes(_index, rows[start:start + APPLY_CHUNK])
+        await asyncio.sleep(0)
+    _snapshot_id = latest
+
+async def run_refresher(interval: float) -> None:
+    """Load the index, then refresh it every ``interval`` seconds until cancelled"""
+    while True:
+        try:
+            await refresh()
+        except Exception:
+            # E.g. the database isn't up yet; the index keeps what it has until the next try
+            logger.exception("Refreshing the catalog index failed")
+        await asyncio.sleep(interval)
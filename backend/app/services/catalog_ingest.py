@@ -0,0 +1,188 @@
+"""
+Load a TMDB daily ID export into catalog_movies.
+
+The export is a gzipped file with one JSON object per line, like
+{"adult":false,"id":550,"original_title":"Fight Club","popularity":61.4,"video":false}.
+It's read one line at a time and staged into a temporary table in batches of
+BATCH_SIZE rows, with COPY on Postgres (plain INSERTs elsewhere), so memory
+use stays the same whatever the size of the file. The staged snapshot is
+then compared with catalog_movies in the database, in a few set-based
+statements:
+ - movies not in the catalog yet are inserted
+ - movies whose title or adult flag changed, or whose popularity moved by
+   more than POPULARITY_TOLERANCE, are updated (as are removed movies that
+   are back)
+ - live movies missing from the snapshot are marked removed
+and every other row is left alone. Popularity drifts a little every day for
+most movies, so a daily refresh writes a small share of the catalog.
+
+Each run is recorded in catalog_snapshots, in the same transaction as the
+rows it changed, which get its id; that's how workers find the changes to
+apply to their search index (see services/catalog.py).
+"""
+
+import csv
+import gzip
+import io
+import json
+import math
+import os
+from datetime import datetime
+from typing import IO, List, Optional, Tuple
+from sqlalchemy import (Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, delete, exists, func, literal,
+                        or_, select, text, update)
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.db.bulk import upsert_select
+from app.db.models import CatalogMovie, CatalogSnapshot
+
+# Export lines staged per COPY (or INSERT)
+BATCH_SIZE = 50000
+
+# Relative popularity change below which a movie isn't rewritten
+POPULARITY_TOLERANCE = 0.1
+
+# An export with fewer movies than this share of the live catalog is probably truncated,
+# so its missing movies aren't removed unless asked to
+MIN_SNAPSHOT_SHARE = 0.5
+
+# pg_advisory_xact_lock key serializing ingests
+LOCK_KEY = 0x636174616C6F67
+
+_staging_metadata = MetaData()
+
+STAGING = Table(
+    "catalog_staging", _staging_metadata,
+    Column("line", Integer, nullable=False),  # Line number in the export; the last line for an id wins
+    Column("id", Integer, nullable=False),
+    Column("title", String, nullable=False),
+    Column("popularity", Float, nullable=False),
+    Column("adult", Boolean, nullable=False),
+    prefixes=["TEMPORARY"]
+)
+
+class CatalogIngestError(Exception):
+    """An export that wasn't applied, with why"""
+
+def parse_line(line: str) -> Optional[Tuple[int, str, float, bool]]:
+    """(id, title, popularity, adult) from a line of the export, or None if it can't be used"""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    movie_id = data.get("id")
+    title = data.get("original_title") or data.get("title")
+    if not isinstance(movie_id, int) or not 0 < movie_id < 2**31 or not isinstance(title, str):
+        return None
+    # Postgres text can't hold NUL
+    title = title.replace("\x00", "").strip()
+    if not title:
+        return None
+    popularity = data.get("popularity")
+    if not isinstance(popularity, (int, float)) or not math.isfinite(popularity):
+        popularity = 0.0
+    return movie_id, title, float(popularity), bool(data.get("adult"))
+
+def _open(path: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+def _copy_rows(connection: Connection, rows: List[tuple]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.connection.dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {STAGING.name} ({', '.join(STAGING.c.keys())}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+
+def _insert_rows(connection: Connection, rows: List[tuple]) -> None:
+    connection.execute(STAGING.insert(), [dict(zip(STAGING.c.keys(), row)) for row in rows])
+
+def stage(connection: Connection, path: str, batch_size: int = BATCH_SIZE) -> Tuple[int, int]:
+    """Stream the export at ``path`` into the staging table; returns (lines read, lines skipped)"""
+    write = _copy_rows if connection.dialect.driver == "psycopg2" else _insert_rows
+    read = skipped = 0
+    batch = []
+    with _open(path) as lines:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            read += 1
+            movie = parse_line(line)
+            if movie is None:
+                skipped += 1
+                continue
+            batch.append((number,) + movie)
+            if len(batch) >= batch_size:
+                write(connection, batch)
+                batch = []
+    if batch:
+        write(connection, batch)
+    return read, skipped
+
+def ingest_export(db: Session, path: str, batch_size: int = BATCH_SIZE, allow_shrink: bool = False) -> CatalogSnapshot:
+    """Apply the export at ``path`` to the catalog and return its snapshot. The caller commits."""
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        # One ingest at a time: a second one waits here until the first commits
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+    snapshot = CatalogSnapshot(source=os.path.basename(path), started_at=datetime.utcnow())
+    db.add(snapshot)
+    db.flush()
+
+    STAGING.create(connection)
+    snapshot.rows_read, snapshot.rows_skipped = stage(connection, path, batch_size)
+    # Indexed once loaded, which is cheaper than keeping the index up to date while loading
+    connection.execute(text(f"CREATE INDEX ix_{STAGING.name}_id_line ON {STAGING.name} (id, line)"))
+    if connection.dialect.name == "postgresql":
+        # Temporary tables get no statistics from autovacuum
+        connection.execute(text(f"ANALYZE {STAGING.name}"))
+    later = STAGING.alias("later")
+    connection.execute(delete(STAGING).where(
+        exists().where(later.c.id == STAGING.c.id, later.c.line > STAGING.c.line)
+    ))
+
+    staged = connection.scalar(select(func.count()).select_from(STAGING))
+    live = db.scalar(select(func.count()).select_from(CatalogMovie).where(CatalogMovie.removed_at.is_(None)))
+    if staged < live * MIN_SNAPSHOT_SHARE and not allow_shrink:
+        raise CatalogIngestError(
+            f"{path} has {staged} movies against {live} in the catalog, so it may be truncated"
+        )
+
+    now = datetime.utcnow()
+    snapshot.inserted = connection.scalar(
+        select(func.count()).select_from(STAGING).where(~exists().where(CatalogMovie.id == STAGING.c.id))
+    )
+    # Only new and changed movies reach the upsert, which is far slower per row than the join
+    movie = CatalogMovie.__table__
+    changed = upsert_select(
+        db, CatalogMovie, ["id", "title", "popularity", "adult", "snapshot_id", "updated_at"],
+        select(STAGING.c.id, STAGING.c.title, STAGING.c.popularity, STAGING.c.adult,
+               literal(snapshot.id, Integer), literal(now, DateTime))
+        .outerjoin(movie, movie.c.id == STAGING.c.id)
+        .where(or_(
+            movie.c.id.is_(None),
+            movie.c.title != STAGING.c.title,
+            movie.c.adult != STAGING.c.adult,
+            movie.c.removed_at.is_not(None),
+            func.abs(STAGING.c.popularity - movie.c.popularity) > POPULARITY_TOLERANCE * movie.c.popularity
+        )),
+        ["id"],
+        update_columns=["title", "popularity", "adult", "snapshot_id", "updated_at"],
+        update_values={"removed_at": None}
+    )
+    snapshot.updated = changed - snapshot.inserted
+    snapshot.removed = db.execute(
+        update(CatalogMovie)
+        .where(CatalogMovie.removed_at.is_(None), ~exists().where(STAGING.c.id == CatalogMovie.id))
+        .values(removed_at=now, snapshot_id=snapshot.id, updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    STAGING.drop(connection)
+    snapshot.finished_at = datetime.utcnow()
+    db.flush()
+    return snapshot
@@ -0,0 +1,169 @@
+"""
+Group consensus methods over every voter's ranking of a list.
+
+All methods start from the users x items Borda points matrix kept by the
+borda module (a voter prefers i to j when i has more of their points).
+Borda sums it directly; the others work on the items x items preference
+matrix P, where P[i, j] is the number of voters who prefer i to j:
+
+* Copeland: one point for every head-to-head majority an item wins, half a
+  point for every tie.
+* Schulze: strongest beatpath strengths from a Floyd-Warshall widest-path
+  pass, vectorized over each intermediate item; an item scores one point for
+  every item it beats by beatpath.
+* Kemeny: the ordering that disagrees with the fewest voter preferences is
+  NP-hard to find, so we run a bounded local search instead, starting from
+  the Copeland order and moving single items to their best position until
+  nothing improves or KEMENY_MAX_PASSES is reached. Items score their number
+  of places from the bottom.
+
+Results are cached per (list, method) and keyed by the standings' data
+version. Large inputs are computed in a process pool so the event loop
+isn't blocked for the length of a Schulze pass.
+"""
+
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import ConsensusMethodEnum
+from app.services import borda
+
+# How many results to keep in memory
+CACHE_SIZE = 256
+
+# Voters compared per step when building the preference matrix
+PREFERENCE_CHUNK_SIZE = 64
+
+# Upper bound on local search passes over every item
+KEMENY_MAX_PASSES = 20
+
+# Inputs with more voters x items^2 than this are computed in the process pool
+POOL_THRESHOLD = 5_000_000
+
+POOL_WORKERS = 2
+
+_cache: "OrderedDict[tuple, Tuple[tuple, np.ndarray]]" = OrderedDict()
+_pool: Optional[ProcessPoolExecutor] = None
+
+def preference_matrix(points: np.ndarray, chunk_size: int = PREFERENCE_CHUNK_SIZE) -> np.ndarray:
+    """P[i, j] = number of voters (rows of ``points``) ranking item i above item j"""
+    items = points.shape[1]
+    # Borda points are multiples of 1/2, so doubled they compare exactly as small integers,
+    # which is about twice as fast as comparing floats
+    doubled = np.rint(points * 2).astype(np.int16 if items < 2**14 else np.int32)
+    preferences = np.zeros((items, items), dtype=np.int64)
+    for start in range(0, len(doubled), chunk_size):
+        chunk = doubled[start:start + chunk_size]
+        preferences += np.count_nonzero(chunk[:, :, None] > chunk[:, None, :], axis=0)
+    return preferences
+
+def copeland_scores(preferences: np.ndarray) -> np.ndarray:
+    wins = (preferences > preferences.T).sum(axis=1)
+    ties = (preferences == preferences.T).sum(axis=1) - 1  # minus the diagonal
+    return wins + ties / 2
+
+def schulze_scores(preferences: np.ndarray) -> np.ndarray:
+    """Number of items each item beats by strongest beatpath"""
+    paths = np.where(preferences > preferences.T, preferences, 0)
+    for k in range(len(paths)):
+        # Widest path through k: the weaker of the two legs, if that beats the direct path
+        np.maximum(paths, np.minimum(paths[:, k, None], paths[None, k, :]), out=paths)
+    np.fill_diagonal(paths, 0)
+    return (paths > paths.T).sum(axis=1).astype(np.float64)
+
+def kemeny_order(preferences: np.ndarray, initial: np.ndarray, max_passes: int = KEMENY_MAX_PASSES) -> np.ndarray:
+    """Locally optimal ordering (best first) for the Kemeny objective, starting from ``initial``.
+
+    Placing item x at position q of the other items costs the preferences of
+    voters who put x above the items ahead of it, plus those who put the
+    items behind it above x. Each move puts one item at its cheapest
+    position; the total cost never goes up.
+    """
+    order = list(initial)
+    for _ in range(max_passes):
+        improved = False
+        for item in list(order):
+            rest = np.array([other for other in order if other != item], dtype=np.int64)
+            above = np.concatenate([[0], np.cumsum(preferences[item, rest])])
+            below = np.concatenate([np.cumsum(preferences[rest, item][::-1])[::-1], [0]])
+            cost = above + below
+            current = order.index(item)
+            best = int(np.argmin(cost))
+            if cost[best] < cost[current]:
+                order = rest[:best].tolist() + [item] + rest[best:].tolist()
+                improved = True
+        if not improved:
+            break
+    return np.array(order, dtype=np.int64)
+
+def method_scores(method: ConsensusMethodEnum, points: np.ndarray) -> np.ndarray:
+    """Per-item scores for a consensus method, higher is better. Runs in the process pool."""
+    if method == ConsensusMethodEnum.borda:
+        return points.sum(axis=0)
+    preferences = preference_matrix(points)
+    copeland = copeland_scores(preferences)
+    if method == ConsensusMethodEnum.copeland:
+        return copeland
+    if method == ConsensusMethodEnum.schulze:
+        return schulze_scores(preferences)
+    initial = np.lexsort((np.arange(len(copeland)), -copeland))
+    order = kemeny_order(preferences, initial)
+    scores = np.empty(len(order))
+    scores[order] = np.arange(len(order) - 1, -1, -1)
+    return scores
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned workers don't inherit the server's threads or database connections
+        _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def compute_scores(method: ConsensusMethodEnum, points: np.ndarray) -> np.ndarray:
+    """Run method_scores, in the process pool when the input is large"""
+    voters, items = points.shape
+    if voters * items * items <= POOL_THRESHOLD:
+        return method_scores(method, points)
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), method_scores, method, points)
+
+def rank_items(item_ids: np.ndarray, scores: np.ndarray) -> List[Tuple[int, float, int]]:
+    """[(item_id, score, rank), ...] best first; tied items share a rank (1, 2, 2, 4, ...)"""
+    order = np.lexsort((item_ids, -scores))
+    ranked = []
+    for position, index in enumerate(order.tolist()):
+        score = float(scores[index])
+        rank = ranked[-1][2] if ranked and ranked[-1][1] == score else position + 1
+        ranked.append((int(item_ids[index]), score, rank))
+    return ranked
+
+async def results(db: AsyncSession, movie_list_id: int, method: ConsensusMethodEnum) -> Tuple[int, List[Tuple[int, float, int]]]:
+    """The group result for a list as (voters, [(item_id, score, rank), ...]) best first"""
+    standings = await borda.load_standings(db, movie_list_id)
+    voters, item_ids, version = len(standings.stamps), standings.item_ids, standings.version
+    if method == ConsensusMethodEnum.borda:
+        # The standings keep Borda totals up to date themselves
+        return voters, rank_items(item_ids, standings.totals)
+
+    key = (movie_list_id, method)
+    cached = _cache.get(key)
+    if cached and cached[0] == version:
+        _cache.move_to_end(key)
+        return voters, rank_items(item_ids, cached[1])
+
+    # Other requests may refresh the standings in place while we wait for the pool
+    scores = await compute_scores(method, standings.points.copy())
+    _cache[key] = (version, scores)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return voters, rank_items(item_ids, scores)
@@ -0,0 +1,18 @@
+from typing import Tuple
+
+# Starting score for an item nobody has voted on yet
+DEFAULT_SCORE = 1200.0
+
+# How far a single vote can move a score
+K_FACTOR = 32
+
+def expected_score(score_a: float, score_b: float) -> float:
+    """Probability that item A beats item B under the Elo model"""
+    return 1 / (1 + 10**((score_b - score_a) / 400))
+
+def updated_scores(score_a: float, score_b: float, a_won: bool, k: float = K_FACTOR) -> Tuple[float, float]:
+    """Return the new (score_a, score_b) after a single vote"""
+    expected_a = expected_score(score_a, score_b)
+    actual_a = 1 if a_won else 0
+    delta = k * (actual_a - expected_a)
+    return score_a + delta, score_b - delta
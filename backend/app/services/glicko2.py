@@ -0,0 +1,185 @@
+"""
+Glicko-2 ratings and confidence-based early completion.
+
+Glicko-2 tracks a rating deviation (RD) and a volatility next to each score,
+so besides "how good is this item" we know how sure we are about it. Every
+vote is treated as its own rating period with a single game. Ratings share
+the Elo scale (1200 for an unrated item) so they can be shown side by side.
+
+Once a user's top-k is settled - every adjacent pair inside the top-k, and
+the k-th item against everything below it, is either separated by at least
+``CONFIDENCE_Z`` combined standard deviations or known precisely enough to
+call it a tie - their voting is complete and no more matchups are served.
+"""
+
+import math
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db.models import EloScore
+from app.services import elo
+from app.services.matchups import list_item_ids
+from app.services.voting_sessions import get_voting_session, get_or_create_voting_session
+
+DEFAULT_DEVIATION = 350.0
+DEFAULT_VOLATILITY = 0.06
+
+# Constrains how fast volatility can change; Glickman suggests 0.3 - 1.2
+TAU = 0.5
+
+# Conversion between the displayed scale and the internal Glicko-2 scale
+SCALE = 173.7178
+
+# Convergence tolerance for the volatility iteration
+EPSILON = 1e-6
+
+# How many top places have to be settled, and how clearly
+TOP_K = 5
+CONFIDENCE_Z = 1.0
+
+# Two items whose deviations average (RMS) this small are treated as a
+# settled tie: more votes wouldn't tell them apart, they really are that close
+TIE_DEVIATION = 130.0
+
+Rating = Tuple[float, float, float]  # (score, deviation, volatility)
+
+def _g(phi: float) -> float:
+    return 1 / math.sqrt(1 + 3 * phi**2 / math.pi**2)
+
+def _new_volatility(delta: float, phi: float, v: float, volatility: float, tau: float) -> float:
+    """Step 5 of Glickman's paper: solve for the new volatility (Illinois method)"""
+    a = math.log(volatility**2)
+
+    def f(x: float) -> float:
+        ex = math.exp(x)
+        return ex * (delta**2 - phi**2 - v - ex) / (2 * (phi**2 + v + ex)**2) - (x - a) / tau**2
+
+    A = a
+    if delta**2 > phi**2 + v:
+        B = math.log(delta**2 - phi**2 - v)
+    else:
+        k = 1
+        while f(a - k * tau) < 0:
+            k += 1
+        B = a - k * tau
+
+    f_a, f_b = f(A), f(B)
+    while abs(B - A) > EPSILON:
+        C = A + (A - B) * f_a / (f_b - f_a)
+        f_c = f(C)
+        if f_c * f_b <= 0:
+            A, f_a = B, f_b
+        else:
+            f_a /= 2
+        B, f_b = C, f_c
+    return math.exp(A / 2)
+
+def updated_rating(rating: Rating, opponent: Rating, outcome: float, tau: float = TAU) -> Rating:
+    """Return the new (score, deviation, volatility) after one game.
+
+    ``outcome`` is 1 for a win and 0 for a loss.
+    """
+    score, deviation, volatility = rating
+    mu, phi = (score - elo.DEFAULT_SCORE) / SCALE, deviation / SCALE
+    mu_j, phi_j = (opponent[0] - elo.DEFAULT_SCORE) / SCALE, opponent[1] / SCALE
+
+    g = _g(phi_j)
+    expected = 1 / (1 + math.exp(-g * (mu - mu_j)))
+    v = 1 / (g**2 * expected * (1 - expected))
+    delta = v * g * (outcome - expected)
+
+    new_volatility = _new_volatility(delta, phi, v, volatility, tau)
+    phi_star = math.sqrt(phi**2 + new_volatility**2)
+    new_phi = 1 / math.sqrt(1 / phi_star**2 + 1 / v)
+    new_mu = mu + new_phi**2 * g * (outcome - expected)
+    return elo.DEFAULT_SCORE + SCALE * new_mu, SCALE * new_phi, new_volatility
+
+def updated_ratings(rating_a: Rating, rating_b: Rating, a_won: bool) -> Tuple[Rating, Rating]:
+    """Return the new ratings of both items after a single vote"""
+    return (
+        updated_rating(rating_a, rating_b, 1.0 if a_won else 0.0),
+        updated_rating(rating_b, rating_a, 0.0 if a_won else 1.0)
+    )
+
+def apply_vote(score_a: EloScore, score_b: EloScore, a_won: bool) -> None:
+    """Update two score rows in place with the result of a vote"""
+    rating_a = (score_a.score, score_a.deviation, score_a.volatility)
+    rating_b = (score_b.score, score_b.deviation, score_b.volatility)
+    new_a, new_b = updated_ratings(rating_a, rating_b, a_won)
+    score_a.score, score_a.deviation, score_a.volatility = new_a
+    score_b.score, score_b.deviation, score_b.volatility = new_b
+
+def top_k_confidence(scores: np.ndarray, deviations: np.ndarray, k: int = TOP_K,
+                     z: float = CONFIDENCE_Z) -> float:
+    """How settled the top-k is, from 0 to 1; 1 means every check passes.
+
+    There are k checks: each adjacent pair within the top-k, plus the k-th
+    item against the closest challenger below it. A check passes when the
+    pair is at least ``z`` combined deviations apart, or when their RMS
+    deviation is down to TIE_DEVIATION; it contributes its progress towards
+    whichever is closer.
+    """
+    n = len(scores)
+    k = min(k, n - 1)
+    if k < 1:
+        return 1.0
+    order = np.argsort(-scores, kind="stable")
+    s, d = scores[order], deviations[order]
+
+    def progress(i: int, j: np.ndarray) -> np.ndarray:
+        combined = np.sqrt(d[i]**2 + d[j]**2)
+        separation = (s[i] - s[j]) / combined / z
+        precision = (DEFAULT_DEVIATION - combined / math.sqrt(2)) / (DEFAULT_DEVIATION - TIE_DEVIATION)
+        return np.clip(np.maximum(separation, precision), 0, 1)
+
+    # Adjacent pairs inside the top-k
+    adjacent = progress(np.arange(k - 1), np.arange(1, k))
+    # The k-th item against every item below it; the least settled one counts
+    boundary = progress(k - 1, np.arange(k, n)).min()
+    return float(np.append(adjacent, boundary).mean())
+
+def user_ratings(db: Session, movie_list_id: int, user_id: int,
+                 item_ids: Optional[Iterable[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Scores and deviations for every item in the list, defaulting items without a score row.
+
+    Pending changes are flushed first, so this can run in the middle of the
+    vote path.
+    """
+    item_ids = list(item_ids) if item_ids is not None else list_item_ids(db, movie_list_id)
+    ratings: Dict[int, Tuple[float, float]] = {
+        item_id: (elo.DEFAULT_SCORE, DEFAULT_DEVIATION) for item_id in item_ids
+    }
+    db.flush()
+    rows = db.execute(
+        select(EloScore.movie_list_item_id, EloScore.score, EloScore.deviation).where(
+            EloScore.movie_list_id == movie_list_id,
+            EloScore.user_id == user_id
+        )
+    )
+    for item_id, score, deviation in rows:
+        if item_id in ratings:
+            ratings[item_id] = (score, deviation)
+    values = np.array(list(ratings.values()), dtype=np.float64).reshape(-1, 2)
+    return values[:, 0], values[:, 1]
+
+def user_confidence(db: Session, movie_list_id: int, user_id: int, k: int = TOP_K) -> float:
+    """How settled the user's top-k is, see top_k_confidence"""
+    scores, deviations = user_ratings(db, movie_list_id, user_id)
+    return top_k_confidence(scores, deviations, k)
+
+def update_completion(db: Session, movie_list_id: int, user_id: int) -> bool:
+    """Mark the user's voting complete once their top-k is settled.
+
+    Completion is sticky: later votes don't reopen it. Returns whether the
+    user is complete. The caller commits.
+    """
+    session = get_voting_session(db, movie_list_id, user_id)
+    if session is not None and session.completed_at is not None:
+        return True
+    if user_confidence(db, movie_list_id, user_id) < 1:
+        return False
+    session = get_or_create_voting_session(db, movie_list_id, user_id)
+    session.completed_at = datetime.utcnow()
+    return True
@@ -0,0 +1,321 @@
+"""
+Optional Redis-backed Elo scores for the vote path.
+
+With HOT_SCORES_ENABLED, votes on Elo lists (glicko2 lists always stay in
+Postgres) don't touch elo_scores at all. Each (list, user) has a Redis hash
+of item id -> score, and a Lua script applies a user's votes to it
+atomically on the server, so concurrent votes can't lose each other's
+updates and no score row needs a lock. The matchup claim, matchup counts
+and head-to-head counts are still written in the vote's Postgres
+transaction; the score updates are applied once it commits (see
+apply_queued), so a vote that rolls back never moves a score. The API makes
+its Redis calls in a worker thread, since the client blocks.
+
+Updates are applied from the vote log, not from the request. Each hash
+records the last vote event applied to it, and applying a user's votes
+applies every logged vote of theirs after that one, in log order, skipping
+any another request got to first. A vote whose update never reached Redis
+(Redis down right after the commit, a worker killed) is therefore applied
+with the voter's next one, and two requests by the same voter can't apply
+their votes out of order. That relies on a voter's votes on a hot list
+committing in log order, which the vote path ensures by locking the
+voter's session before logging them (see votes.record_votes).
+
+Every updated score is added to a dirty set, and a write-behind flusher
+upserts them into elo_scores in batches every HOT_SCORES_FLUSH_INTERVAL
+seconds, bumping the voters' sessions so cached standings pick the new
+scores up (see borda). Everything reading elo_scores can therefore trail
+the latest votes by up to one interval.
+
+A user's hash is loaded from elo_scores the first time they vote while the
+mode is on, as of just before that vote. If Redis loses its data, reload_list rebuilds a list's hashes
+from Postgres, after replaying the list's vote history if asked to, since
+updates not yet flushed are only recoverable from the votes themselves.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+import redis
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.db.bulk import upsert
+from app.db.models import EloScore, MovieList, MovieListItem, RatingModelEnum, VoteEvent, VotingSession
+from app.services import elo, replay
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "rnkd:scores"
+DIRTY_KEY = f"{KEY_PREFIX}:dirty"
+
+# Field marking a hash as loaded from Postgres, so an empty hash still counts
+LOADED_FIELD = "_loaded"
+
+# Field holding the id of the last vote event applied to a hash
+EVENT_FIELD = "_event"
+
+# Dirty scores written per flush transaction
+FLUSH_BATCH_SIZE = 5000
+
+# Session info key for the voters whose logged votes wait for the vote's commit
+QUEUE_KEY = "hot_score_votes"
+
+# KEYS: user's score hash, dirty set
+# ARGV: k, default score, dirty member prefix, then (event id, item_a, item_b, a_won) per vote in id order
+# Returns nil if the hash isn't loaded, else how many votes it applied; votes up to the hash's last event are skipped
+VOTE_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_loaded') == 0 then
+    return false
+end
+local k, default, prefix = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3]
+local last = tonumber(redis.call('HGET', KEYS[1], '_event')) or (tonumber(ARGV[4]) - 1)
+local scores, touched, applied = {}, {}, 0
+for i = 4, #ARGV, 4 do
+    local event, a, b = tonumber(ARGV[i]), ARGV[i + 1], ARGV[i + 2]
+    if event > last then
+        if scores[a] == nil then scores[a] = tonumber(redis.call('HGET', KEYS[1], a)) or default end
+        if scores[b] == nil then scores[b] = tonumber(redis.call('HGET', KEYS[1], b)) or default end
+        local expected_a = 1 / (1 + 10 ^ ((scores[b] - scores[a]) / 400))
+        local delta = k * (tonumber(ARGV[i + 3]) - expected_a)
+        scores[a] = scores[a] + delta
+        scores[b] = scores[b] - delta
+        touched[a], touched[b] = true, true
+        last, applied = event, applied + 1
+    end
+end
+for item, _ in pairs(touched) do
+    -- %.17g round-trips doubles
+    redis.call('HSET', KEYS[1], item, string.format('%.17g', scores[item]))
+    redis.call('SADD', KEYS[2], prefix .. item)
+end
+if applied > 0 then
+    redis.call('HSET', KEYS[1], '_event', last)
+end
+return applied
+"""
+
+# KEYS: user's score hash
+# ARGV: last event id the scores include, then item, score, item, score, ...; only fields not set yet are written
+LOAD_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_loaded') == 1 then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', KEYS[1], '_loaded', 1, '_event', ARGV[1])
+return 1
+"""
+
+_client: Optional[redis.Redis] = None
+_scripts: Dict[str, object] = {}
+
+def get_client() -> redis.Redis:
+    if _client is None:
+        set_client(redis.Redis.from_url(settings.REDIS_URL, decode_responses=True))
+    return _client
+
+def set_client(client: redis.Redis) -> None:
+    """Use ``client`` for hot scores (e.g. a test server); it must decode responses"""
+    global _client
+    _client = client
+    _scripts.clear()
+
+def _script(name: str, source: str):
+    # Registered scripts run by EVALSHA and reload themselves if Redis restarts
+    if name not in _scripts:
+        _scripts[name] = get_client().register_script(source)
+    return _scripts[name]
+
+def enabled_for(movie_list: Optional[MovieList]) -> bool:
+    """Whether votes on ``movie_list`` update scores in Redis"""
+    return (settings.HOT_SCORES_ENABLED and movie_list is not None
+            and movie_list.rating_model != RatingModelEnum.glicko2)
+
+def scores_key(movie_list_id: int, user_id: int) -> str:
+    return f"{KEY_PREFIX}:{movie_list_id}:{user_id}"
+
+def load_user(db: Session, movie_list_id: int, user_id: int, last_event_id: int) -> None:
+    """Fill the user's hash from elo_scores, which include their votes up to ``last_event_id``,
+    unless it is already loaded
+    """
+    rows = db.execute(
+        select(EloScore.movie_list_item_id, EloScore.score)
+        .where(EloScore.movie_list_id == movie_list_id, EloScore.user_id == user_id)
+    ).all()
+    args = [last_event_id] + [value for row in rows for value in row]
+    _script("load", LOAD_SCRIPT)(keys=[scores_key(movie_list_id, user_id)], args=args)
+
+def apply_votes(db: Session, movie_list_id: int, user_id: int, first_event_id: int, k: float = elo.K_FACTOR) -> int:
+    """Apply the user's logged votes their hash doesn't have yet, in log order; returns how many.
+
+    ``first_event_id`` is the user's first vote the caller committed; a hash
+    that isn't loaded yet is loaded as of just before it.
+    """
+    key = scores_key(movie_list_id, user_id)
+    loaded, last_event_id = get_client().hmget(key, LOADED_FIELD, EVENT_FIELD)
+    if loaded is None or last_event_id is None:
+        last_event_id = first_event_id - 1
+    events = db.execute(
+        select(VoteEvent.id, VoteEvent.item_a_id, VoteEvent.item_b_id, VoteEvent.winner_id)
+        .where(VoteEvent.movie_list_id == movie_list_id, VoteEvent.user_id == user_id,
+               VoteEvent.id > int(last_event_id))
+        .order_by(VoteEvent.id)
+    ).all()
+    if not events:
+        return 0
+    args = [k, elo.DEFAULT_SCORE, f"{movie_list_id}:{user_id}:"]
+    for event_id, item_a_id, item_b_id, winner_id in events:
+        args += [event_id, item_a_id, item_b_id, int(winner_id == item_a_id)]
+    keys = [key, DIRTY_KEY]
+    applied = _script("vote", VOTE_SCRIPT)(keys=keys, args=args)
+    if applied is None:
+        load_user(db, movie_list_id, user_id, events[0].id - 1)
+        applied = _script("vote", VOTE_SCRIPT)(keys=keys, args=args)
+    return applied
+
+def queue_votes(db: Session, events: Iterable) -> None:
+    """Hold logged votes' score updates until the session commits (see apply_queued)"""
+    queued = db.info.setdefault(QUEUE_KEY, {})
+    for event in events:
+        key = (event.movie_list_id, event.user_id)
+        queued[key] = min(queued.get(key, event.id), event.id)
+
+def take_queued(db) -> Dict[Tuple[int, int], int]:
+    """Take the voters queued on ``db`` (a Session or AsyncSession) off it: (list, user) -> first event id"""
+    return db.info.pop(QUEUE_KEY, None) or {}
+
+def apply_user_votes(db: Session, queued: Dict[Tuple[int, int], int]) -> None:
+    for (movie_list_id, user_id), first_event_id in sorted(queued.items()):
+        apply_votes(db, movie_list_id, user_id, first_event_id)
+
+def apply_queued(db: Session) -> None:
+    """Apply the score updates queued on ``db``. Call right after committing the votes."""
+    apply_user_votes(db, take_queued(db))
+
+def apply_in_new_session(queued: Dict[Tuple[int, int], int]) -> None:
+    """Apply taken score updates, reading the log through a session of its own"""
+    with SessionLocal() as db:
+        apply_user_votes(db, queued)
+
+async def apply_queued_in_thread(db: AsyncSession) -> None:
+    """apply_queued for the API: the Redis calls block, so they run in a worker thread"""
+    queued = take_queued(db)
+    if queued:
+        await run_in_threadpool(apply_in_new_session, queued)
+
+def user_scores(movie_list_id: int, user_id: int) -> Optional[Dict[int, float]]:
+    """The user's scores in Redis, or None if their hash isn't loaded"""
+    values = get_client().hgetall(scores_key(movie_list_id, user_id))
+    if LOADED_FIELD not in values:
+        return None
+    return {int(item_id): float(score) for item_id, score in values.items() if item_id not in (LOADED_FIELD, EVENT_FIELD)}
+
+def flush(db: Session, batch_size: int = FLUSH_BATCH_SIZE) -> int:
+    """Write dirty scores to elo_scores in batches, committing each; returns how many were written.
+
+    Scores are read after they are taken off the dirty set, so a vote landing
+    in between is either included or marks the score dirty again. A batch
+    that fails to commit goes back on the dirty set.
+    """
+    client = get_client()
+    written = 0
+    while True:
+        members = client.spop(DIRTY_KEY, batch_size)
+        if not members:
+            return written
+        try:
+            written += _write_batch(db, members)
+            db.commit()
+        except Exception:
+            db.rollback()
+            client.sadd(DIRTY_KEY, *members)
+            raise
+
+def _write_batch(db: Session, members: Iterable[str]) -> int:
+    items_by_user = defaultdict(set)
+    for member in members:
+        movie_list_id, user_id, item_id = map(int, member.split(":"))
+        items_by_user[(movie_list_id, user_id)].add(item_id)
+    users = sorted(items_by_user)
+    pipe = get_client().pipeline(transaction=False)
+    for movie_list_id, user_id in users:
+        pipe.hmget(scores_key(movie_list_id, user_id), sorted(items_by_user[(movie_list_id, user_id)]))
+    values = pipe.execute()
+
+    # Items removed from their list since the vote have lost their score rows for good
+    item_ids = {item_id for items in items_by_user.values() for item_id in items}
+    existing = set(db.scalars(select(MovieListItem.id).where(MovieListItem.id.in_(item_ids))))
+    rows = [
+        {"movie_list_id": movie_list_id, "user_id": user_id, "movie_list_item_id": item_id, "score": float(score)}
+        for (movie_list_id, user_id), scores in zip(users, values)
+        for item_id, score in zip(sorted(items_by_user[(movie_list_id, user_id)]), scores)
+        if score is not None and item_id in existing
+    ]
+    upsert(db, EloScore, rows, index_elements=["movie_list_id", "user_id", "movie_list_item_id"], update_columns=["score"])
+    # Rewritten scores change rankings; bump the sessions so cached standings notice (see borda)
+    db.execute(
+        update(VotingSession)
+        .where(tuple_(VotingSession.movie_list_id, VotingSession.user_id).in_(users))
+        .values(updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return len(rows)
+
+def reload_list(db: Session, movie_list_id: int, replay_votes: bool = False, k: float = elo.K_FACTOR) -> dict:
+    """Replace the list's hashes with the scores in elo_scores. Commits.
+
+    Pending updates are flushed first if Redis still has them. With
+    ``replay_votes`` the stored scores are recomputed from the vote history
+    before loading (see replay), which also recovers updates Redis lost
+    before they were flushed. Otherwise each hash keeps its last applied
+    event, so votes that never reached Redis are still applied with the
+    voter's next one. Votes cast while this runs may be lost, so use it on a
+    quiet list.
+    """
+    flush(db)
+    summary = replay.rebuild_list_scores(db, movie_list_id, k=k) if replay_votes else {}
+    db.commit()
+    client = get_client()
+    stale = list(client.scan_iter(match=f"{KEY_PREFIX}:{movie_list_id}:*"))
+    last_event_ids = dict(db.execute(
+        select(VoteEvent.user_id, func.max(VoteEvent.id))
+        .where(VoteEvent.movie_list_id == movie_list_id)
+        .group_by(VoteEvent.user_id)
+    ).all())
+    if stale:
+        if not replay_votes:
+            pipe = client.pipeline(transaction=False)
+            for key in stale:
+                pipe.hget(key, EVENT_FIELD)
+            for key, last_event_id in zip(stale, pipe.execute()):
+                if last_event_id is not None:
+                    last_event_ids[int(key.rsplit(":", 1)[1])] = int(last_event_id)
+        client.delete(*stale)
+    user_ids = db.scalars(
+        select(EloScore.user_id).where(EloScore.movie_list_id == movie_list_id).distinct()
+    ).all()
+    for user_id in user_ids:
+        load_user(db, movie_list_id, user_id, last_event_ids.get(user_id, 0))
+    return {**summary, "users_loaded": len(user_ids)}
+
+def flush_in_new_session() -> int:
+    with SessionLocal() as db:
+        return flush(db)
+
+async def run_flusher(interval: float) -> None:
+    """Flush dirty scores every ``interval`` seconds until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, flush_in_new_session)
+        except Exception:
+            # Redis or the database was unavailable; the scores stay dirty until the next flush
+            logger.exception("Flushing hot scores failed")
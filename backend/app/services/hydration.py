@@ -0,0 +1,188 @@
+"""
+Filling in list items' metadata in the background.
+
+An item's item_metadata starts out as whatever the client posted with it.
+The hydrator looks up every item that has never been looked up, or not for
+HYDRATION_MAX_AGE_SECONDS, through its media type's adapter (see
+services/media.py) and merges the answer in: upstream's values win, the
+client's other keys stay.
+
+A pass works through the due items of every media type at once, a chunk of
+CHUNK_SIZE items at a time, in three short steps:
+
+1. claim the chunk: mark it as falling due again in RETRY_SECONDS, skipping
+   rows another worker has locked, and commit,
+2. look it up with no transaction open, the adapter batching the ids and
+   bounding the upstream calls in flight, and
+3. write it back: the metadata that changed in one bulk UPDATE, and the
+   whole chunk marked as looked up now.
+
+All the state is in the table, so a pass can stop anywhere. A chunk whose
+lookup failed, or whose worker died, falls due again after RETRY_SECONDS;
+writing a chunk twice writes the same metadata. App workers running passes
+at the same time claim different items.
+
+GET /metrics reports how many items are due (rnkd_hydration_queue_depth) and
+the items looked up so far by result (rnkd_hydration_items_total, whose rate
+is the throughput).
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core import metrics
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.db.models import MediaTypeEnum, MovieList, MovieListItem
+from app.services import media
+
+logger = logging.getLogger(__name__)
+
+# Items claimed, looked up and written back at a time, per media type
+CHUNK_SIZE = 500
+
+# A claimed item falls due again this long after its claim, unless it was written back
+RETRY_SECONDS = 300
+
+RESULTS = ("found", "unknown", "failed")
+
+ITEMS = metrics.Counter(
+    "rnkd_hydration_items_total", "List items the hydrator looked up by media type and result: found, unknown or failed"
+)
+
+# Items due per media type, counted at the start of the last pass and counted down as it goes
+_queue_depth: Dict[str, int] = {}
+
+def _queue_depth_gauge():
+    yield from metrics.gauge_lines(
+        "rnkd_hydration_queue_depth",
+        "List items due for hydration by media type",
+        [({"media_type": media_type}, depth) for media_type, depth in _queue_depth.items()]
+    )
+
+metrics.register(_queue_depth_gauge)
+
+def merge_metadata(current: Optional[dict], found: dict) -> dict:
+    """``found`` over the item's metadata; values upstream doesn't have don't erase the client's"""
+    merged = dict(current or {})
+    merged.update({key: value for key, value in found.items() if value not in (None, "", [])})
+    return merged
+
+def _due(cutoff: datetime):
+    return or_(MovieListItem.metadata_refreshed_at.is_(None), MovieListItem.metadata_refreshed_at < cutoff)
+
+async def queue_depth(db: AsyncSession, cutoff: datetime) -> Dict[MediaTypeEnum, int]:
+    """Items not looked up since ``cutoff``, by media type"""
+    rows = await db.execute(
+        select(MovieList.media_type, func.count())
+        .select_from(MovieListItem)
+        .join(MovieList, MovieList.id == MovieListItem.movie_list_id)
+        .where(_due(cutoff))
+        .group_by(MovieList.media_type)
+    )
+    return dict(rows.all())
+
+async def claim(db: AsyncSession, media_type: MediaTypeEnum, cutoff: datetime, max_age: timedelta,
+                chunk_size: int) -> List:
+    """Claim up to ``chunk_size`` items of ``media_type`` not looked up since ``cutoff``,
+    in id order. Returns their (id, external_id, item_metadata) rows. The caller commits.
+    """
+    due = (
+        select(MovieListItem.id)
+        .join(MovieList, MovieList.id == MovieListItem.movie_list_id)
+        .where(MovieList.media_type == media_type, _due(cutoff))
+        .order_by(MovieListItem.id)
+        .limit(chunk_size)
+        .with_for_update(of=MovieListItem, skip_locked=True)
+    )
+    result = await db.execute(
+        update(MovieListItem)
+        .where(MovieListItem.id.in_(due))
+        .values(metadata_refreshed_at=datetime.utcnow() - max_age + timedelta(seconds=RETRY_SECONDS))
+        .returning(MovieListItem.id, MovieListItem.external_id, MovieListItem.item_metadata)
+        .execution_options(synchronize_session=False)
+    )
+    return result.all()
+
+async def write_back(db: AsyncSession, items: List, found: Dict[str, dict]) -> None:
+    """Merge what was found into the claimed ``items`` and mark them all looked up. The caller commits."""
+    now = datetime.utcnow()
+    changed = []
+    for item_id, external_id, current in items:
+        if external_id in found:
+            merged = merge_metadata(current, found[external_id])
+            if merged != current:
+                changed.append({"id": item_id, "item_metadata": merged, "metadata_refreshed_at": now})
+    if changed:
+        # Bulk UPDATE by primary key, one statement for the chunk
+        await db.execute(update(MovieListItem), changed)
+    await db.execute(
+        update(MovieListItem)
+        .where(MovieListItem.id.in_([item_id for item_id, _, _ in items]))
+        .values(metadata_refreshed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+def _count(counts: Dict[str, int], media_type: MediaTypeEnum, result: str, amount: int) -> None:
+    counts[result] += amount
+    ITEMS.inc(amount, media_type=media_type.value, result=result)
+
+async def hydrate_media_type(session_factory, media_type: MediaTypeEnum, cutoff: datetime, max_age: timedelta,
+                             chunk_size: int) -> Dict[str, int]:
+    """Look up the due items of one media type, chunk by chunk, until there are none left or a lookup fails"""
+    adapter = media.get_adapter(media_type)
+    counts = dict.fromkeys(RESULTS, 0)
+    while True:
+        async with session_factory() as db:
+            items = await claim(db, media_type, cutoff, max_age, chunk_size)
+            await db.commit()
+        if not items:
+            return counts
+        try:
+            found = await adapter.lookup(external_id for _, external_id, _ in items)
+        except media.MediaLookupError:
+            # Left claimed, so they're tried again after RETRY_SECONDS; the batches that worked are cached
+            _count(counts, media_type, "failed", len(items))
+            return counts
+        async with session_factory() as db:
+            await write_back(db, items, found)
+            await db.commit()
+        hits = sum(1 for _, external_id, _ in items if external_id in found)
+        _count(counts, media_type, "found", hits)
+        _count(counts, media_type, "unknown", len(items) - hits)
+        _queue_depth[media_type.value] = max(_queue_depth.get(media_type.value, 0) - len(items), 0)
+
+async def hydrate_pending(session_factory=None, media_types: Optional[Iterable[MediaTypeEnum]] = None,
+                          max_age: Optional[timedelta] = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, Dict[str, int]]:
+    """One pass over the items due for hydration, every media type at once.
+
+    Items looked up during the pass aren't due again until the next one, so
+    a ``max_age`` of 0 looks everything up once. Returns the items looked
+    up by media type and result.
+    """
+    session_factory = session_factory or AsyncSessionLocal
+    max_age = timedelta(seconds=settings.HYDRATION_MAX_AGE_SECONDS) if max_age is None else max_age
+    cutoff = datetime.utcnow() - max_age
+    media_types = list(MediaTypeEnum) if media_types is None else [MediaTypeEnum(m) for m in media_types]
+    async with session_factory() as db:
+        depth = await queue_depth(db, cutoff)
+    for media_type in MediaTypeEnum:
+        _queue_depth[media_type.value] = depth.get(media_type, 0)
+    due = [media_type for media_type in media_types if depth.get(media_type)]
+    results = await asyncio.gather(*(
+        hydrate_media_type(session_factory, media_type, cutoff, max_age, chunk_size) for media_type in due
+    ))
+    return {media_type.value: counts for media_type, counts in zip(due, results)}
+
+async def run_hydrator(interval: float) -> None:
+    """Hydrate the due items every ``interval`` seconds until cancelled"""
+    while True:
+        try:
+            await hydrate_pending()
+        except Exception:
+            # Claimed items that weren't written back fall due again after RETRY_SECONDS
+            logger.exception("Hydrating list items failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,130 @@
+"""
+IGDB client for game metadata.
+
+IGDB takes an Apicalypse query in the request body, so one request covers
+up to MAX_IDS games (where id = (...)). Requests are signed with a Twitch
+app access token, fetched with IGDB_CLIENT_ID and IGDB_CLIENT_SECRET and
+kept until shortly before it expires (or IGDB rejects it). IGDB allows 4
+requests a second, so requests take a token from a TokenBucket first, as
+TMDB's do.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+import httpx
+from app.core.config import settings
+from app.services.tmdb import TokenBucket
+
+# Most ids IGDB accepts per query
+MAX_IDS = 500
+
+# Tries per request when IGDB answers 429
+MAX_ATTEMPTS = 3
+
+# Access tokens are renewed this long before they expire
+TOKEN_MARGIN_SECONDS = 60
+
+COVER_URL = "https://images.igdb.com/igdb/image/upload/t_cover_big/{image_id}.jpg"
+
+FIELDS = "name,summary,first_release_date,genres.name,platforms.name,cover.image_id"
+
+class IGDBError(Exception):
+    """An IGDB request that failed, with the HTTP status the API should answer with"""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def game_from_igdb(data: dict) -> dict:
+    """An IGDB game as list item metadata"""
+    released = data.get("first_release_date")
+    cover = data.get("cover") or {}
+    return {
+        "title": data.get("name") or "",
+        "summary": data.get("summary") or "",
+        "release_date": datetime.utcfromtimestamp(released).date().isoformat() if released else "",
+        "genres": [genre["name"] for genre in data.get("genres", [])],
+        "platforms": [platform["name"] for platform in data.get("platforms", [])],
+        "cover_url": COVER_URL.format(image_id=cover["image_id"]) if cover.get("image_id") else None
+    }
+
+class IGDBClient:
+    def __init__(self, base_url: Optional[str] = None, token_url: Optional[str] = None, client_id: Optional[str] = None,
+                 client_secret: Optional[str] = None, rate_limit: Optional[float] = None):
+        self.base_url = base_url or settings.IGDB_BASE_URL
+        self.token_url = token_url or settings.IGDB_TOKEN_URL
+        self.client_id = client_id or settings.IGDB_CLIENT_ID
+        self.client_secret = client_secret or settings.IGDB_CLIENT_SECRET
+        self.bucket = TokenBucket(settings.IGDB_RATE_LIMIT if rate_limit is None else rate_limit, 1)
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._token: Optional[str] = None
+        self._token_expires = 0.0
+        # The token request in progress, shared by every request waiting for one
+        self._token_task: Optional[asyncio.Task] = None
+
+    def http(self) -> httpx.AsyncClient:
+        # Pooled connections and the token request belong to the event loop they were made on
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            self._http = httpx.AsyncClient(timeout=settings.IGDB_TIMEOUT, headers={"Accept": "application/json"})
+            self._loop = loop
+            self._token_task = None
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _access_token(self) -> str:
+        if self._token is not None and time.monotonic() < self._token_expires:
+            return self._token
+        if self._token_task is None or self._token_task.done():
+            self._token_task = asyncio.ensure_future(self._fetch_token())
+        return await asyncio.shield(self._token_task)
+
+    async def _fetch_token(self) -> str:
+        if not self.client_id or not self.client_secret:
+            raise IGDBError(503, "IGDB_CLIENT_ID and IGDB_CLIENT_SECRET are not set")
+        try:
+            response = await self.http().post(self.token_url, params={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": "client_credentials"
+            })
+        except httpx.HTTPError as e:
+            raise IGDBError(502, f"IGDB token request failed: {e!r}") from e
+        if response.status_code != 200:
+            raise IGDBError(502, f"IGDB token request answered {response.status_code}")
+        data = response.json()
+        self._token = data["access_token"]
+        self._token_expires = time.monotonic() + data.get("expires_in", 3600) - TOKEN_MARGIN_SECONDS
+        return self._token
+
+    async def get_games(self, game_ids: List[int]) -> Dict[int, dict]:
+        """Metadata for up to MAX_IDS games in one request; games IGDB doesn't know are left out"""
+        query = f"fields {FIELDS}; where id = ({','.join(map(str, game_ids))}); limit {len(game_ids)};"
+        for attempt in range(MAX_ATTEMPTS):
+            token = await self._access_token()
+            await self.bucket.acquire()
+            try:
+                response = await self.http().post(
+                    f"{self.base_url}/games", content=query,
+                    headers={"Client-ID": self.client_id, "Authorization": f"Bearer {token}"}
+                )
+            except httpx.HTTPError as e:
+                raise IGDBError(502, f"IGDB request failed: {e!r}") from e
+            if response.status_code == 401 and attempt + 1 < MAX_ATTEMPTS:
+                # Revoked or expired early: get a new token
+                if self._token == token:
+                    self._token = None
+                continue
+            if response.status_code == 429 and attempt + 1 < MAX_ATTEMPTS:
+                await asyncio.sleep(1)
+                continue
+            if response.status_code != 200:
+                raise IGDBError(502, f"IGDB answered {response.status_code}")
+            return {game["id"]: game_from_igdb(game) for game in response.json()}
@@ -0,0 +1,78 @@
+"""
+Bringing an item added mid-voting into every voter's matchups.
+
+Adding an item to a list that people are already voting on shouldn't mean
+re-running generate_matchups (which diffs all O(n^2) pairs) for each of them.
+Instead, for every user with a voting session on the list:
+
+1. their score row for the new item is created, so it shows up in their
+   scores straight away, and
+2. depending on the voting mode, exhaustive lists get just the n - 1 new
+   pairs, in bulk, and tournament lists feed the item into the running sort.
+   Adaptive and round-robin lists pick new items up by themselves.
+
+The API runs this as a background task after the item has been committed, so
+adding an item stays fast however many members a group list has.
+"""
+
+from typing import List
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db.base import SessionLocal
+from app.db.models import MovieList, MovieListItem, VotingModeEnum, VotingSession
+from app.services import tournament
+from app.services.matchups import bulk_insert_item_matchups
+from app.services.votes import ensure_scores
+from app.services.voting_sessions import lock_voting_sessions
+
+def voter_ids(db: Session, movie_list_id: int) -> List[int]:
+    """Users who have started voting on a list, in id order"""
+    return list(db.scalars(
+        select(VotingSession.user_id)
+        .where(VotingSession.movie_list_id == movie_list_id)
+        .order_by(VotingSession.user_id)
+    ))
+
+def seed_item_scores(db: Session, movie_list_id: int, item_id: int, user_ids: List[int]) -> None:
+    """Create every voter's score row for the item at the default score. The caller commits."""
+    ensure_scores(db, [(movie_list_id, user_id, item_id) for user_id in user_ids])
+
+def add_item_for_voters(db: Session, movie_list: MovieList, item_id: int, user_ids: List[int]) -> int:
+    """Bring a new item into the given voters' matchups, according to the list's voting mode.
+
+    Voters' sessions are locked first (in user order), so this can't race
+    with generate_matchups or the tournament vote path for the same user.
+    Returns the number of matchups created. The caller commits.
+    """
+    if movie_list.voting_mode == VotingModeEnum.exhaustive:
+        lock_voting_sessions(db, movie_list.id, user_ids)
+        return sum(bulk_insert_item_matchups(db, movie_list.id, item_id, user_ids).values())
+    if movie_list.voting_mode == VotingModeEnum.tournament:
+        for user_id in user_ids:
+            tournament.add_tournament_item(db, movie_list.id, user_id, item_id)
+    return 0
+
+def add_item_in_background(movie_list_id: int, item_id: int) -> None:
+    """Background task run after an item has been added to a list, with its own database session.
+
+    Scores are seeded and committed before any voting session is locked, so
+    a vote on the new item arriving at the same time can't deadlock with us.
+    """
+    db = SessionLocal()
+    try:
+        movie_list = db.query(MovieList).filter(MovieList.id == movie_list_id).first()
+        item = db.query(MovieListItem).filter(MovieListItem.id == item_id).first()
+        if movie_list is None or item is None or item.movie_list_id != movie_list_id:
+            return
+        user_ids = voter_ids(db, movie_list_id)
+        if not user_ids:
+            return
+        seed_item_scores(db, movie_list_id, item_id, user_ids)
+        db.commit()
+        add_item_for_voters(db, movie_list, item_id, user_ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,171 @@
+"""
+On-demand matchmaking for lists that don't materialize every pair up front.
+
+In adaptive mode the next matchup is picked from the user's current Elo state:
+among items that sit close together in the ranking, prefer the pair whose
+outcome is least predictable and whose scores are backed by the fewest votes.
+Only the matchup the user is about to see is written to the database.
+"""
+
+import math
+from typing import Dict, List, Optional, Set
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+from app.db.models import Matchup, EloScore, MovieList, VotingModeEnum
+from app.services import elo, round_robin, tournament
+from app.services.matchups import Pair, MatchupWithItems, create_matchup, normalize_pair, list_item_ids, existing_pairs, pending_matchups_with_items, spread_items
+from app.services.voting_sessions import get_voting_session
+
+# How many ranking neighbours on each side are candidates for the next pair
+ADAPTIVE_WINDOW = 2
+
+# Pending matchups loaded per matchup requested, to reorder within
+PREFETCH_FACTOR = 3
+
+def adaptive_vote_budget(item_count: int) -> int:
+    """Maximum number of votes adaptive mode asks for, ~n log2 n (capped at all pairs)"""
+    if item_count < 2:
+        return 0
+    total_pairs = item_count * (item_count - 1) // 2
+    return min(total_pairs, math.ceil(item_count * math.log2(item_count)))
+
+def uncertainty(games: int) -> float:
+    """How little we know about an item's score given how many votes it has been in"""
+    return 1 / math.sqrt(1 + games)
+
+def select_adaptive_pair(scores: Dict[int, float], games: Dict[int, int], compared: Set[Pair],
+                         window: int = ADAPTIVE_WINDOW) -> Optional[Pair]:
+    """Pick the most informative pair that hasn't been compared yet.
+
+    Candidates are items within ``window`` places of each other in the current
+    ranking. Each is weighted by the outcome variance p(1 - p) and the summed
+    uncertainty of both items. Returns None once every candidate has been
+    compared, meaning each item has been checked against its neighbours.
+    """
+    ranking = sorted(scores, key=lambda item_id: (-scores[item_id], games.get(item_id, 0), item_id))
+    best_pair = None
+    best_gain = -1.0
+    for i, item_a in enumerate(ranking):
+        for item_b in ranking[i + 1:i + 1 + window]:
+            pair = normalize_pair(item_a, item_b)
+            if pair in compared:
+                continue
+            p = elo.expected_score(scores[item_a], scores[item_b])
+            gain = p * (1 - p) * (uncertainty(games.get(item_a, 0)) + uncertainty(games.get(item_b, 0)))
+            if gain > best_gain:
+                best_pair, best_gain = pair, gain
+    return best_pair
+
+def user_scores(db: Session, movie_list_id: int, user_id: int, item_ids) -> Dict[int, float]:
+    """Current scores for every item in the list, defaulting items without a score row"""
+    scores = {item_id: elo.DEFAULT_SCORE for item_id in item_ids}
+    rows = db.execute(
+        select(EloScore.movie_list_item_id, EloScore.score).where(
+            EloScore.movie_list_id == movie_list_id,
+            EloScore.user_id == user_id
+        )
+    )
+    for item_id, score in rows:
+        if item_id in scores:
+            scores[item_id] = score
+    return scores
+
+def games_played(db: Session, movie_list_id: int, user_id: int) -> Dict[int, int]:
+    """Number of voted matchups each item has appeared in for the user"""
+    voted = (
+        Matchup.movie_list_id == movie_list_id,
+        Matchup.user_id == user_id,
+        Matchup.winner_id != None
+    )
+    sides = union_all(
+        select(Matchup.item_a_id.label("item_id")).where(*voted),
+        select(Matchup.item_b_id.label("item_id")).where(*voted)
+    ).subquery()
+    return dict(db.execute(select(sides.c.item_id, func.count()).group_by(sides.c.item_id)).all())
+
+def pending_matchup(db: Session, movie_list_id: int, user_id: int) -> Optional[Matchup]:
+    """The user's oldest unvoted matchup, if any"""
+    return db.query(Matchup).filter(
+        Matchup.movie_list_id == movie_list_id,
+        Matchup.user_id == user_id,
+        Matchup.winner_id == None
+    ).order_by(Matchup.id).first()
+
+def select_next_adaptive_pair(db: Session, movie_list_id: int, user_id: int) -> Optional[Pair]:
+    """Choose the user's next adaptive pair from the database state without writing anything.
+
+    Returns None when the user has used up the vote budget or every candidate
+    pair has already been compared.
+    """
+    item_ids = list_item_ids(db, movie_list_id)
+    games = games_played(db, movie_list_id, user_id)
+    votes_cast = sum(games.values()) // 2
+    if votes_cast >= adaptive_vote_budget(len(item_ids)):
+        return None
+
+    return select_adaptive_pair(
+        user_scores(db, movie_list_id, user_id, item_ids),
+        games,
+        existing_pairs(db, movie_list_id, user_id)
+    )
+
+def next_adaptive_matchup(db: Session, movie_list_id: int, user_id: int) -> Optional[Matchup]:
+    """Return the pending adaptive matchup, creating one if the user has none.
+
+    Returns None once adaptive voting is finished. The caller is responsible
+    for committing.
+    """
+    matchup = pending_matchup(db, movie_list_id, user_id)
+    if matchup:
+        return matchup
+
+    pair = select_next_adaptive_pair(db, movie_list_id, user_id)
+    if pair is None:
+        return None
+
+    return create_matchup(db, movie_list_id, user_id, pair)
+
+def next_matchup(db: Session, movie_list: MovieList, user_id: int) -> Optional[Matchup]:
+    """Get the matchup a user should vote on next, according to the list's voting mode.
+
+    Returns None once the user's voting has been marked complete.
+    """
+    round_robin_mode = movie_list.voting_mode == VotingModeEnum.round_robin
+    # Round robin tops up from the session's cursor, so it's locked right away
+    session = get_voting_session(db, movie_list.id, user_id, for_update=round_robin_mode)
+    if session is not None and session.completed_at is not None:
+        return None
+    if movie_list.voting_mode == VotingModeEnum.adaptive:
+        return next_adaptive_matchup(db, movie_list.id, user_id)
+    if movie_list.voting_mode == VotingModeEnum.tournament:
+        return tournament.next_tournament_matchup(db, movie_list.id, user_id, pending_matchup(db, movie_list.id, user_id))
+    if round_robin_mode:
+        created = round_robin.top_up_matchups(db, movie_list.id, user_id, 1, session)
+        # A matchup is only created when the user had none pending
+        if created:
+            return created[0]
+    return pending_matchup(db, movie_list.id, user_id)
+
+def record_vote(db: Session, movie_list: MovieList, matchup: Matchup) -> None:
+    """Let the list's voting mode react to a vote that has just been recorded on ``matchup``"""
+    if movie_list.voting_mode == VotingModeEnum.tournament:
+        tournament.record_tournament_vote(db, matchup)
+
+def next_matchups(db: Session, movie_list: MovieList, user_id: int, count: int) -> List[MatchupWithItems]:
+    """Get up to ``count`` upcoming matchups with their items, spread so items don't repeat back-to-back.
+
+    Adaptive and tournament lists only know one matchup ahead, so they return
+    at most one; round-robin lists create the matchups they hand out. The caller commits, since a matchup may have been created.
+    """
+    if movie_list.voting_mode in (VotingModeEnum.exhaustive, VotingModeEnum.round_robin):
+        session = get_voting_session(db, movie_list.id, user_id)
+        if session is not None and session.completed_at is not None:
+            return []
+        if movie_list.voting_mode == VotingModeEnum.round_robin:
+            round_robin.top_up_matchups(db, movie_list.id, user_id, count)
+    elif next_matchup(db, movie_list, user_id) is None:
+        return []
+
+    # Look a little further ahead than needed so there is room to reorder
+    rows = pending_matchups_with_items(db, movie_list.id, user_id, count * PREFETCH_FACTOR)
+    return spread_items(rows)[:count]
@@ -0,0 +1,201 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.orm import Session, aliased
+from app.db.models import Matchup, MovieListItem
+from app.services.voting_sessions import add_to_counts, add_to_many_counts
+
+# Rows per INSERT statement when writing matchups in bulk
+INSERT_CHUNK_SIZE = 1000
+
+Pair = Tuple[int, int]
+
+def normalize_pair(item_a_id: int, item_b_id: int) -> Pair:
+    """Return a pair with the lower item id first so (a, b) and (b, a) compare equal"""
+    return (item_a_id, item_b_id) if item_a_id < item_b_id else (item_b_id, item_a_id)
+
+def list_item_ids(db: Session, movie_list_id: int) -> List[int]:
+    """Get the ids of all items in a movie list, in id order"""
+    return list(db.scalars(
+        select(MovieListItem.id)
+        .where(MovieListItem.movie_list_id == movie_list_id)
+        .order_by(MovieListItem.id)
+    ))
+
+def count_items(db: Session, movie_list_id: int) -> int:
+    """Number of items in a movie list"""
+    return db.scalar(select(func.count()).where(MovieListItem.movie_list_id == movie_list_id))
+
+def existing_pairs(db: Session, movie_list_id: int, user_id: int) -> Set[Pair]:
+    """Load every (item_a, item_b) pair the user already has a matchup for, in one query"""
+    rows = db.execute(
+        select(Matchup.item_a_id, Matchup.item_b_id).where(
+            Matchup.movie_list_id == movie_list_id,
+            Matchup.user_id == user_id
+        )
+    )
+    return {normalize_pair(a, b) for a, b in rows}
+
+def round_robin_pairs(item_ids: Iterable[int]) -> Iterator[Pair]:
+    """Yield every pair of items exactly once, one round at a time.
+
+    Uses the circle method: each round pairs every item with a different
+    partner, so consecutive pairs within a round never share an item.
+    """
+    slots: List[Optional[int]] = sorted(item_ids)
+    if len(slots) % 2:
+        slots.append(None)  # Bye
+    n = len(slots)
+    for _ in range(n - 1):
+        for i in range(n // 2):
+            a, b = slots[i], slots[n - 1 - i]
+            if a is not None and b is not None:
+                yield normalize_pair(a, b)
+        # Keep the first slot fixed and rotate the rest one place
+        slots = [slots[0], slots[-1]] + slots[1:-1]
+
+def missing_pairs(item_ids: Iterable[int], existing: Set[Pair]) -> List[Pair]:
+    """Compute the pairs of items that don't have a matchup yet, in round-robin order"""
+    return [pair for pair in round_robin_pairs(item_ids) if pair not in existing]
+
+def bulk_insert_matchups(db: Session, movie_list_id: int, user_id: int, pairs: List[Pair],
+                         chunk_size: int = INSERT_CHUNK_SIZE) -> int:
+    """Insert unvoted matchups for the given pairs with multi-row INSERTs.
+
+    Rows are written in chunks of ``chunk_size`` without loading ORM objects,
+    and the user's matchup count is bumped to match. The caller is
+    responsible for committing.
+    """
+    _insert_matchups(db, movie_list_id, [(user_id, pair) for pair in pairs], chunk_size)
+    add_to_counts(db, movie_list_id, user_id, total=len(pairs))
+    return len(pairs)
+
+def bulk_insert_item_matchups(db: Session, movie_list_id: int, item_id: int, user_ids: Iterable[int],
+                              chunk_size: int = INSERT_CHUNK_SIZE) -> Dict[int, int]:
+    """Pair a newly added item with every other item in the list, for each of the given users.
+
+    Only the n - 1 pairs involving the item are considered, and pairs a user
+    already has are skipped, so this is safe to repeat. Returns the number of
+    matchups created per user. The caller commits.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return {}
+    others = [other_id for other_id in list_item_ids(db, movie_list_id) if other_id != item_id]
+    existing = set(db.execute(
+        select(Matchup.user_id, Matchup.item_a_id, Matchup.item_b_id).where(
+            Matchup.movie_list_id == movie_list_id,
+            Matchup.user_id.in_(user_ids),
+            or_(Matchup.item_a_id == item_id, Matchup.item_b_id == item_id)
+        )
+    ).all())
+    existing = {(user_id, normalize_pair(a, b)) for user_id, a, b in existing}
+
+    rows = [
+        (user_id, pair)
+        for user_id in user_ids
+        for pair in (normalize_pair(item_id, other_id) for other_id in others)
+        if (user_id, pair) not in existing
+    ]
+    _insert_matchups(db, movie_list_id, rows, chunk_size)
+    created = Counter(user_id for user_id, _ in rows)
+    add_to_many_counts(db, {(movie_list_id, user_id): (count, 0) for user_id, count in created.items()})
+    return dict(created)
+
+def _insert_matchups(db: Session, movie_list_id: int, rows: List[Tuple[int, Pair]], chunk_size: int) -> None:
+    """Write unvoted matchups for (user_id, pair) rows with multi-row INSERTs"""
+    created_at = datetime.utcnow()
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(Matchup), [
+            {
+                "movie_list_id": movie_list_id,
+                "user_id": user_id,
+                "item_a_id": item_a_id,
+                "item_b_id": item_b_id,
+                "winner_id": None,
+                "created_at": created_at
+            }
+            for user_id, (item_a_id, item_b_id) in rows[start:start + chunk_size]
+        ])
+
+def create_matchup(db: Session, movie_list_id: int, user_id: int, pair: Pair) -> Matchup:
+    """Create a single unvoted matchup and count it. The caller commits."""
+    matchup = Matchup(
+        movie_list_id=movie_list_id,
+        user_id=user_id,
+        item_a_id=pair[0],
+        item_b_id=pair[1],
+        winner_id=None,
+        created_at=datetime.utcnow()
+    )
+    db.add(matchup)
+    db.flush()
+    add_to_counts(db, movie_list_id, user_id, total=1)
+    return matchup
+
+def delete_matchup(db: Session, matchup: Matchup) -> None:
+    """Delete an unvoted matchup and uncount it. The caller commits."""
+    db.delete(matchup)
+    add_to_counts(db, matchup.movie_list_id, matchup.user_id, total=-1)
+
+def pending_matchup_ids(db: Session, movie_list_id: int, user_id: int, limit: int) -> List[int]:
+    """Get the ids of the first ``limit`` unvoted matchups for a user"""
+    return list(db.scalars(
+        select(Matchup.id)
+        .where(
+            Matchup.movie_list_id == movie_list_id,
+            Matchup.user_id == user_id,
+            Matchup.winner_id == None
+        )
+        .order_by(Matchup.id)
+        .limit(limit)
+    ))
+
+MatchupWithItems = Tuple[Matchup, MovieListItem, MovieListItem]
+
+def pending_matchups_with_items(db: Session, movie_list_id: int, user_id: int, limit: int) -> List[MatchupWithItems]:
+    """Load the first ``limit`` unvoted matchups with both items, in one joined query.
+
+    The matchups are picked in a subquery first so only those rows are
+    joined, however many matchups are pending.
+    """
+    pending = (
+        select(Matchup.id)
+        .where(
+            Matchup.movie_list_id == movie_list_id,
+            Matchup.user_id == user_id,
+            Matchup.winner_id == None
+        )
+        .order_by(Matchup.id)
+        .limit(limit)
+        .subquery()
+    )
+    item_a = aliased(MovieListItem)
+    item_b = aliased(MovieListItem)
+    return [tuple(row) for row in db.execute(
+        select(Matchup, item_a, item_b)
+        .join(pending, Matchup.id == pending.c.id)
+        .join(item_a, Matchup.item_a_id == item_a.id)
+        .join(item_b, Matchup.item_b_id == item_b.id)
+        .order_by(Matchup.id)
+    )]
+
+def spread_items(rows: List[MatchupWithItems]) -> List[MatchupWithItems]:
+    """Reorder matchups so no item appears in two matchups in a row where possible.
+
+    Greedily takes the earliest matchup that doesn't share an item with the
+    previous one, falling back to the earliest matchup left.
+    """
+    remaining = list(rows)
+    ordered = []
+    previous: Set[int] = set()
+    while remaining:
+        index = next((
+            i for i, (matchup, _, _) in enumerate(remaining)
+            if matchup.item_a_id not in previous and matchup.item_b_id not in previous
+        ), 0)
+        row = remaining.pop(index)
+        ordered.append(row)
+        previous = {row[0].item_a_id, row[0].item_b_id}
+    return ordered
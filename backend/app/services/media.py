@@ -0,0 +1,215 @@
+"""
+Metadata lookups for every media type, behind one interface.
+
+Each MediaTypeEnum has a MediaAdapter in ADAPTERS: movies come from the
+catalog (and TMDB for details it lacks), books from OpenLibrary and games
+from IGDB. Callers hand an adapter all the external ids they need at once,
+e.g. a whole list's items, and get back metadata by id:
+
+    found = await media.get_adapter(movie_list.media_type).lookup(external_ids)
+
+An adapter answers what it can from its in-memory cache (unknown ids are
+remembered too) and splits the rest into batches of batch_size ids, one
+upstream call each, with at most max_concurrency in flight, so hydrating a
+100-item list takes a few upstream requests rather than 100. Batches that
+succeed are cached even when another fails, so a retry only asks for what's
+still missing.
+
+An adapter's upstream client is passed in, so it can be pointed at a stub
+server or a fixture instead (see benchmarks/bench_media_adapters.py).
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from app.core import metrics
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.db.models import CatalogMovie, MediaTypeEnum
+from app.services import catalog, igdb, openlibrary, tmdb
+
+LOOKUPS = metrics.Counter("rnkd_media_lookups_total", "Metadata lookups by media type and result: hit or miss")
+UPSTREAM_BATCHES = metrics.Counter("rnkd_media_upstream_batches_total", "Batches of ids sent upstream by media type")
+
+class MediaLookupError(Exception):
+    """A metadata lookup that failed, with the HTTP status the API should answer with"""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class MediaAdapter:
+    """Looks up metadata for one media type. Subclasses implement fetch_batch."""
+    media_type: MediaTypeEnum
+    # External ids per upstream call
+    batch_size = 50
+    # Upstream calls in flight at once
+    max_concurrency = 4
+    # Seconds an answer is served from the cache, found or not
+    cache_ttl = 6 * 3600.0
+    cache_size = 10000
+
+    def __init__(self, batch_size: Optional[int] = None, max_concurrency: Optional[int] = None):
+        self.batch_size = batch_size or self.batch_size
+        self.max_concurrency = max_concurrency or self.max_concurrency
+        self._cache: "OrderedDict[str, Tuple[Optional[dict], float]]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    async def fetch_batch(self, external_ids: List[str]) -> Dict[str, dict]:
+        """Metadata for up to batch_size ids in one upstream call; ids upstream doesn't know are left out"""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+    def _limit(self) -> asyncio.Semaphore:
+        # Like connections, a semaphore belongs to the event loop it was made on
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def lookup(self, external_ids: Iterable[str]) -> Dict[str, dict]:
+        """Metadata by external id for the ids that exist; raises MediaLookupError if a batch failed"""
+        external_ids = list(dict.fromkeys(external_ids))
+        found: Dict[str, dict] = {}
+        missing: List[str] = []
+        now = time.monotonic()
+        for external_id in external_ids:
+            entry = self._cache.get(external_id)
+            if entry is not None and now < entry[1]:
+                self._cache.move_to_end(external_id)
+                if entry[0] is not None:
+                    found[external_id] = entry[0]
+            else:
+                missing.append(external_id)
+        LOOKUPS.inc(len(missing), media_type=self.media_type.value, result="miss")
+        LOOKUPS.inc(len(external_ids) - len(missing), media_type=self.media_type.value, result="hit")
+
+        batches = [missing[start:start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+        results = await asyncio.gather(*(self._fetch(batch) for batch in batches), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        for result in results:
+            if not isinstance(result, BaseException):
+                found.update({external_id: metadata for external_id, metadata in result.items() if metadata is not None})
+        if errors:
+            raise errors[0]
+        return found
+
+    async def _fetch(self, batch: List[str]) -> Dict[str, Optional[dict]]:
+        async with self._limit():
+            UPSTREAM_BATCHES.inc(media_type=self.media_type.value)
+            found = await self.fetch_batch(batch)
+        expires = time.monotonic() + self.cache_ttl
+        for external_id in batch:
+            self._cache[external_id] = (found.get(external_id), expires)
+            self._cache.move_to_end(external_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return found
+
+class MovieAdapter(MediaAdapter):
+    """Movies from the catalog, one query per batch; details it lacks come from TMDB, when enabled"""
+    media_type = MediaTypeEnum.movie
+    batch_size = 500
+    max_concurrency = 4
+
+    def __init__(self, session_factory=None, tmdb_client: Optional[tmdb.TMDBClient] = None, **limits):
+        super().__init__(**limits)
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.tmdb_client = tmdb_client
+
+    async def fetch_batch(self, external_ids: List[str]) -> Dict[str, dict]:
+        movie_ids = [int(external_id) for external_id in external_ids if external_id.isdigit()]
+        async with self.session_factory() as db:
+            rows = {movie.id: movie for movie in await db.scalars(select(CatalogMovie).where(CatalogMovie.id.in_(movie_ids)))}
+        client = self.tmdb_client or (tmdb.get_client() if settings.TMDB_ENABLED else None)
+        movies = {movie_id: catalog.movie_json(movie) for movie_id, movie in rows.items()
+                  if movie.details is not None or client is None}
+        if client is not None:
+            # TMDB looks movies up one at a time; its client caches, pools connections and rate limits.
+            # Each lookup also reads the cache table, so no more are started than it has connections.
+            limit = asyncio.Semaphore(settings.TMDB_MAX_CONNECTIONS)
+
+            async def get_movie(movie_id):
+                async with limit:
+                    return await client.get_movie(movie_id)
+
+            missing = [movie_id for movie_id in movie_ids if movie_id not in movies]
+            details = await asyncio.gather(*(get_movie(movie_id) for movie_id in missing), return_exceptions=True)
+            for movie_id, movie in zip(missing, details):
+                if not isinstance(movie, BaseException):
+                    movies[movie_id] = movie
+                elif not isinstance(movie, tmdb.TMDBError):
+                    raise movie
+                elif movie.status_code != 404:
+                    raise MediaLookupError(movie.status_code, movie.detail)
+                elif movie_id in rows:
+                    movies[movie_id] = catalog.movie_json(rows[movie_id])
+        return {str(movie_id): {key: value for key, value in movie.items() if key not in ("id", "external_id")}
+                for movie_id, movie in movies.items()}
+
+class BookAdapter(MediaAdapter):
+    """Books from OpenLibrary's Books API, many per request"""
+    media_type = MediaTypeEnum.book
+    batch_size = 50
+    max_concurrency = 2
+
+    def __init__(self, client: Optional[openlibrary.OpenLibraryClient] = None, **limits):
+        super().__init__(**limits)
+        self.client = client or openlibrary.OpenLibraryClient()
+
+    async def fetch_batch(self, external_ids: List[str]) -> Dict[str, dict]:
+        try:
+            return await self.client.get_books(external_ids)
+        except openlibrary.OpenLibraryError as e:
+            raise MediaLookupError(e.status_code, e.detail) from e
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+class GameAdapter(MediaAdapter):
+    """Games from IGDB, up to igdb.MAX_IDS per query"""
+    media_type = MediaTypeEnum.game
+    batch_size = igdb.MAX_IDS
+    max_concurrency = 4
+
+    def __init__(self, client: Optional[igdb.IGDBClient] = None, **limits):
+        super().__init__(**limits)
+        self.client = client or igdb.IGDBClient()
+
+    async def fetch_batch(self, external_ids: List[str]) -> Dict[str, dict]:
+        game_ids = [int(external_id) for external_id in external_ids if external_id.isdigit()]
+        if not game_ids:
+            return {}
+        try:
+            games = await self.client.get_games(game_ids)
+        except igdb.IGDBError as e:
+            raise MediaLookupError(e.status_code, e.detail) from e
+        return {str(game_id): game for game_id, game in games.items()}
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+ADAPTERS = {
+    MediaTypeEnum.movie: MovieAdapter,
+    MediaTypeEnum.book: BookAdapter,
+    MediaTypeEnum.game: GameAdapter,
+}
+
+_adapters: Dict[MediaTypeEnum, MediaAdapter] = {}
+
+def get_adapter(media_type: MediaTypeEnum) -> MediaAdapter:
+    """The process's shared adapter for ``media_type``"""
+    media_type = MediaTypeEnum(media_type)
+    if media_type not in _adapters:
+        _adapters[media_type] = ADAPTERS[media_type]()
+    return _adapters[media_type]
+
+async def close() -> None:
+    for adapter in _adapters.values():
+        await adapter.aclose()
@@ -0,0 +1,81 @@
+"""
+OpenLibrary client for book metadata.
+
+The Books API answers for many books in one request (bibkeys=OLID:...,ISBN:...),
+so get_books takes a batch of ids. A book's external_id is its OpenLibrary
+edition id (OL7353617M), an ISBN, or any bibkey with its prefix
+(OCLC:..., LCCN:...). OpenLibrary asks API users to identify themselves,
+hence the User-Agent.
+"""
+
+import asyncio
+import re
+from typing import Dict, List, Optional
+import httpx
+from app.core.config import settings
+
+USER_AGENT = "rnkd/1.0 (collaborative ranking app)"
+
+# Most subjects kept per book
+MAX_SUBJECTS = 10
+
+class OpenLibraryError(Exception):
+    """An OpenLibrary request that failed, with the HTTP status the API should answer with"""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def bibkey(book_id: str) -> str:
+    if ":" in book_id:
+        return book_id
+    if re.fullmatch(r"\d{9}[\dX]|\d{13}", book_id.replace("-", "")):
+        return f"ISBN:{book_id.replace('-', '')}"
+    return f"OLID:{book_id}"
+
+def book_from_openlibrary(data: dict) -> dict:
+    """A Books API entry (jscmd=data) as list item metadata"""
+    return {
+        "title": data.get("title") or "",
+        "authors": [author["name"] for author in data.get("authors", []) if author.get("name")],
+        "pages": data.get("number_of_pages"),
+        "publish_date": data.get("publish_date") or "",
+        "cover_url": (data.get("cover") or {}).get("medium"),
+        "subjects": [subject["name"] for subject in data.get("subjects", [])[:MAX_SUBJECTS]]
+    }
+
+class OpenLibraryClient:
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url or settings.OPENLIBRARY_BASE_URL
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop = None
+
+    def http(self) -> httpx.AsyncClient:
+        # Pooled connections belong to the event loop they were made on
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=settings.OPENLIBRARY_TIMEOUT,
+                headers={"Accept": "application/json", "User-Agent": USER_AGENT}
+            )
+            self._loop = loop
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def get_books(self, book_ids: List[str]) -> Dict[str, dict]:
+        """Metadata for ``book_ids`` in one request; books OpenLibrary doesn't know are left out"""
+        keys = {bibkey(book_id): book_id for book_id in book_ids}
+        try:
+            response = await self.http().get(
+                "/api/books", params={"bibkeys": ",".join(keys), "format": "json", "jscmd": "data"}
+            )
+        except httpx.HTTPError as e:
+            raise OpenLibraryError(502, f"OpenLibrary request failed: {e!r}") from e
+        if response.status_code != 200:
+            raise OpenLibraryError(502, f"OpenLibrary answered {response.status_code}")
+        return {keys[key]: book_from_openlibrary(data) for key, data in response.json().items() if key in keys}
@@ -0,0 +1,96 @@
+"""
+Per-list head-to-head win counts across every voter.
+
+One PairwiseWin row per compared pair of items (lower item id first) holds
+how often each side won. The vote path adds to it with an atomic
+INSERT ... ON CONFLICT DO UPDATE in the same transaction as the vote (or the
+background projector does, with pairwise in ASYNC_PROJECTIONS; see
+vote_log), so head-to-head questions, consensus methods and group rating
+fits can read a few rows per pair instead of scanning the matchup history.
+"""
+
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from app.db.bulk import upsert_increment
+from app.db.models import MovieListItem, PairwiseWin
+
+def record_results(db: Session, movie_list_id: int, results: Iterable[Tuple[int, int]]) -> None:
+    """Add (winner_id, loser_id) results to the list's counts. The caller commits.
+
+    Rows are written in pair order so concurrent batches lock them in the
+    same order.
+    """
+    wins = Counter()
+    for winner_id, loser_id in results:
+        item_a_id, item_b_id = sorted((winner_id, loser_id))
+        wins[(item_a_id, item_b_id, winner_id == item_a_id)] += 1
+    pairs = sorted({(item_a_id, item_b_id) for item_a_id, item_b_id, _ in wins})
+    upsert_increment(db, PairwiseWin, [
+        {
+            "movie_list_id": movie_list_id,
+            "item_a_id": item_a_id,
+            "item_b_id": item_b_id,
+            "a_wins": wins[(item_a_id, item_b_id, True)],
+            "b_wins": wins[(item_a_id, item_b_id, False)]
+        }
+        for item_a_id, item_b_id in pairs
+    ], index_elements=["movie_list_id", "item_a_id", "item_b_id"], increment_columns=["a_wins", "b_wins"])
+
+def record_votes(db: Session, votes: Iterable) -> None:
+    """Add voted matchups or vote events to their lists' counts. The caller commits."""
+    results = defaultdict(list)
+    for vote in votes:
+        loser_id = vote.item_b_id if vote.winner_id == vote.item_a_id else vote.item_a_id
+        results[vote.movie_list_id].append((vote.winner_id, loser_id))
+    for movie_list_id, list_results in sorted(results.items()):
+        record_results(db, movie_list_id, list_results)
+
+def pair_counts(db: Session, movie_list_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Every compared pair of the list as parallel arrays (item_a_ids, item_b_ids, a_wins, b_wins)"""
+    rows = db.execute(
+        select(PairwiseWin.item_a_id, PairwiseWin.item_b_id, PairwiseWin.a_wins, PairwiseWin.b_wins)
+        .where(PairwiseWin.movie_list_id == movie_list_id)
+    ).all()
+    values = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 4)
+    return values[:, 0], values[:, 1], values[:, 2], values[:, 3]
+
+def total_votes(db: Session, movie_list_id: int) -> int:
+    """Number of votes counted for the list"""
+    return db.scalar(
+        select(func.coalesce(func.sum(PairwiseWin.a_wins + PairwiseWin.b_wins), 0))
+        .where(PairwiseWin.movie_list_id == movie_list_id)
+    )
+
+def win_matrix(db: Session, movie_list_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The list's item ids and an items x items matrix where [i, j] is how often i beat j"""
+    item_ids = np.array(db.scalars(
+        select(MovieListItem.id).where(MovieListItem.movie_list_id == movie_list_id).order_by(MovieListItem.id)
+    ).all(), dtype=np.int64)
+    item_a_ids, item_b_ids, a_wins, b_wins = pair_counts(db, movie_list_id)
+    item_ids = np.union1d(item_ids, np.concatenate([item_a_ids, item_b_ids]))
+    a = np.searchsorted(item_ids, item_a_ids)
+    b = np.searchsorted(item_ids, item_b_ids)
+    wins = np.zeros((len(item_ids), len(item_ids)), dtype=np.int64)
+    wins[a, b] = a_wins
+    wins[b, a] = b_wins
+    return item_ids, wins
+
+def item_record(db: Session, movie_list_id: int, item_id: int) -> List[Dict[str, int]]:
+    """One item's wins and losses against each opponent it has been compared with"""
+    rows = db.execute(
+        select(PairwiseWin.item_a_id, PairwiseWin.item_b_id, PairwiseWin.a_wins, PairwiseWin.b_wins)
+        .where(
+            PairwiseWin.movie_list_id == movie_list_id,
+            or_(PairwiseWin.item_a_id == item_id, PairwiseWin.item_b_id == item_id)
+        )
+    ).all()
+    record = [
+        {"opponent_id": item_b_id, "wins": a_wins, "losses": b_wins} if item_a_id == item_id
+        else {"opponent_id": item_a_id, "wins": b_wins, "losses": a_wins}
+        for item_a_id, item_b_id, a_wins, b_wins in rows
+    ]
+    return sorted(record, key=lambda row: row["opponent_id"])
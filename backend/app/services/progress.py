@@ -0,0 +1,74 @@
+"""
+Voting progress from the session counters.
+
+Exhaustive lists know every matchup up front and round-robin lists know how
+many there will be. Adaptive and tournament lists create matchups as the
+user goes, so their total is an estimate until the user is done.
+"""
+
+from typing import Optional
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+from app.db.models import GroupUser, MovieList, User, VotingModeEnum, VotingSession
+from app.services import matchmaking, tournament
+
+def summarize(movie_list: MovieList, item_count: int, total: int, completed: int,
+              session: Optional[VotingSession], finished: bool = False) -> dict:
+    """Progress for one user. ``finished`` says the caller already knows no matchups are left."""
+    if session is not None and session.completed_at is not None:
+        finished = True
+    if movie_list.voting_mode == VotingModeEnum.adaptive:
+        # Matchups are created as the user goes, so measure against the vote budget
+        finished = finished or completed >= matchmaking.adaptive_vote_budget(item_count)
+        total = completed if finished else max(matchmaking.adaptive_vote_budget(item_count), total)
+    elif movie_list.voting_mode == VotingModeEnum.tournament:
+        finished = finished or (tournament.sort_state(session) is not None and tournament.is_complete(session.state))
+        total = completed if finished else max(tournament.estimated_comparisons(item_count), completed + 1)
+    elif movie_list.voting_mode == VotingModeEnum.round_robin:
+        # Only served pairs are stored, but every pair gets voted on
+        total = max(item_count * (item_count - 1) // 2, completed)
+        finished = finished or 0 < total == completed
+    else:
+        finished = finished or 0 < total == completed
+    return {
+        "total_matchups": total,
+        "completed_matchups": completed,
+        "progress_percentage": 100.0 if finished else (completed / total * 100) if total > 0 else 0,
+        "voting_complete": finished
+    }
+
+def member_progress(db: Session, movie_list: MovieList, item_count: int) -> list:
+    """Progress for every voter on a list in one query.
+
+    Group lists report every group member, including ones who haven't voted
+    yet; personal lists report everyone with a voting session.
+    """
+    if movie_list.group_id is not None:
+        query = (
+            select(User.id, User.name, VotingSession)
+            .select_from(GroupUser)
+            .join(User, User.id == GroupUser.user_id)
+            .outerjoin(VotingSession, and_(
+                VotingSession.movie_list_id == movie_list.id,
+                VotingSession.user_id == GroupUser.user_id
+            ))
+            .where(GroupUser.group_id == movie_list.group_id)
+        )
+    else:
+        query = (
+            select(User.id, User.name, VotingSession)
+            .select_from(VotingSession)
+            .join(User, User.id == VotingSession.user_id)
+            .where(VotingSession.movie_list_id == movie_list.id)
+        )
+
+    members = []
+    for user_id, name, session in db.execute(query.order_by(User.id)):
+        total = session.total_matchups if session is not None else 0
+        completed = session.completed_matchups if session is not None else 0
+        members.append({
+            "user_id": user_id,
+            "name": name,
+            **summarize(movie_list, item_count, total, completed, session)
+        })
+    return members
@@ -0,0 +1,134 @@
+"""
+Deriving views from the vote log: the background projector and rebuilds.
+
+Projections named in ASYNC_PROJECTIONS are left out of the vote path and
+applied here instead, from the log in id order, a batch of events per
+transaction. The batch and the projection's checkpoint (the last event id
+it has covered) are committed together, so each event is applied exactly
+once, and the checkpoint row is locked for the batch, so only one app
+worker advances a projection at a time. Events already applied inline (see
+vote_log) just move the checkpoint along.
+
+Any projection of a list can also be rebuilt from scratch from the log,
+after a bug or a data repair. A rebuild covers the events the view should
+include right now (see vote_log.covered); like replaying scores, it's meant
+for a quiet list, since inline votes committed while it runs may be missed.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+from app.db.base import SessionLocal
+from app.db.models import MovieList, PairwiseWin, VoteEvent, VotingSession
+from app.services import hot_scores, pairwise, replay, vote_log, voting_sessions
+from app.services.votes import apply_scores
+
+logger = logging.getLogger(__name__)
+
+# Events applied per transaction
+BATCH_SIZE = 1000
+
+def apply_logged_scores(db: Session, events: List) -> None:
+    """Apply logged votes' scores and bump their voters' sessions, so cached standings notice.
+
+    Counting the votes towards progress bumped them already, but possibly
+    before these scores changed.
+    """
+    apply_scores(db, events)
+    voting_sessions.touch(db, ((event.movie_list_id, event.user_id) for event in events))
+
+APPLY: Dict[str, Callable[[Session, List], None]] = {
+    "scores": apply_logged_scores,
+    "progress": voting_sessions.add_completed_votes,
+    "pairwise": pairwise.record_votes,
+}
+
+def run_projection(db: Session, name: str, batch_size: int = BATCH_SIZE) -> int:
+    """Catch a projection up with the log; returns how many events it applied"""
+    bit = vote_log.PROJECTIONS[name]
+    applied = 0
+    while True:
+        checkpoint = vote_log.lock_checkpoint(db, name, skip_locked=True)
+        # Someone else is running it
+        if checkpoint is None:
+            db.rollback()
+            return applied
+        events = vote_log.events_after(db, checkpoint.last_event_id, batch_size)
+        if not events:
+            db.rollback()
+            return applied
+        pending = [event for event in events if not event.inline_projections & bit]
+        APPLY[name](db, pending)
+        checkpoint.last_event_id = events[-1].id
+        checkpoint.updated_at = datetime.utcnow()
+        db.commit()
+        applied += len(pending)
+
+def run_async_projections(db: Session) -> Dict[str, int]:
+    return {name: run_projection(db, name) for name in vote_log.PROJECTIONS if not vote_log.is_inline(name)}
+
+def run_in_new_session() -> Dict[str, int]:
+    with SessionLocal() as db:
+        return run_async_projections(db)
+
+async def run_projector(interval: float) -> None:
+    """Apply the async projections every ``interval`` seconds until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, run_in_new_session)
+        except Exception:
+            # Checkpoints only move with committed batches, so the next run picks up where this one failed
+            logger.exception("Applying async projections failed")
+
+def rebuild_progress(db: Session, movie_list_id: int) -> dict:
+    """Recount every voter's completed matchups from the log. The caller commits."""
+    covered = vote_log.covered(db, "progress")
+    counts = db.execute(
+        select(VoteEvent.user_id, func.count())
+        .where(VoteEvent.movie_list_id == movie_list_id, covered)
+        .group_by(VoteEvent.user_id)
+    ).all()
+    db.execute(
+        update(VotingSession)
+        .where(VotingSession.movie_list_id == movie_list_id)
+        .values(completed_matchups=0)
+        .execution_options(synchronize_session=False)
+    )
+    voting_sessions.add_to_many_counts(db, {(movie_list_id, user_id): (0, count) for user_id, count in counts})
+    return {"voters": len(counts), "votes": sum(count for _, count in counts)}
+
+def rebuild_pairwise(db: Session, movie_list_id: int) -> dict:
+    """Recount the list's head-to-head results from the log. The caller commits."""
+    covered = vote_log.covered(db, "pairwise")
+    db.execute(delete(PairwiseWin).where(PairwiseWin.movie_list_id == movie_list_id))
+    events = db.execute(
+        select(VoteEvent.movie_list_id, VoteEvent.item_a_id, VoteEvent.item_b_id, VoteEvent.winner_id)
+        .where(VoteEvent.movie_list_id == movie_list_id, covered)
+    ).all()
+    pairwise.record_votes(db, events)
+    return {"votes": len(events)}
+
+def rebuild_scores(db: Session, movie_list_id: int) -> dict:
+    """Replay the list's scores from the log (Elo lists only). The caller commits."""
+    if hot_scores.enabled_for(db.get(MovieList, movie_list_id)):
+        return hot_scores.reload_list(db, movie_list_id, replay_votes=True)
+    return replay.rebuild_list_scores(db, movie_list_id)
+
+REBUILD: Dict[str, Callable[[Session, int], dict]] = {
+    "scores": rebuild_scores,
+    "progress": rebuild_progress,
+    "pairwise": rebuild_pairwise,
+}
+
+def rebuild_list(db: Session, movie_list_id: int, names: Iterable[str]) -> Dict[str, dict]:
+    """Rebuild the named projections of a list from the log, committing each"""
+    summaries = {}
+    for name in names:
+        summaries[name] = REBUILD[name](db, movie_list_id)
+        db.commit()
+    return summaries
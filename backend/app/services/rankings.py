@@ -0,0 +1,109 @@
+"""
+A user's ranking of a list, ordered and paginated by the database.
+
+Pages are read straight off the (movie_list_id, user_id, score DESC,
+movie_list_item_id) index with keyset pagination: the cursor is the
+(score, item id) of the last row served, so any page costs the same however
+deep it is. Rows are plain Core tuples joined to their items; no ORM
+objects are built.
+
+Ranks are competition ranks (1, 2, 2, 4, ...) over the user's scored items,
+worked out from one count of the scores above the page plus the rows within
+it. The percentile is 100 * (total - rank) / (total - 1): 100 for the top
+rank, 0 for the bottom. Items the user hasn't been scored on yet aren't
+ranked.
+"""
+
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+from app.db.models import EloScore, MovieListItem
+
+Cursor = Tuple[float, int]  # (score, movie_list_item_id) of the last row served
+
+class RankedItem(NamedTuple):
+    rank: int
+    percentile: float
+    movie_list_item_id: int
+    title: str
+    external_id: str
+    item_metadata: Optional[dict]
+    score: float
+    deviation: float
+
+def encode_cursor(cursor: Cursor) -> str:
+    # repr round-trips floats exactly
+    return f"{cursor[0]!r}:{cursor[1]}"
+
+def decode_cursor(value: str) -> Cursor:
+    """Parse a cursor from encode_cursor; raises ValueError if it isn't one"""
+    score, item_id = value.rsplit(":", 1)
+    return float(score), int(item_id)
+
+def _user_scores(movie_list_id: int, user_id: int):
+    return (EloScore.movie_list_id == movie_list_id, EloScore.user_id == user_id)
+
+def ranking_page(db: Session, movie_list_id: int, user_id: int, limit: int,
+                 after: Optional[Cursor] = None) -> Tuple[int, List[RankedItem], Optional[Cursor]]:
+    """One page of the user's ranking, best first.
+
+    Returns (number of ranked items, the page, cursor for the next page or
+    None if this is the last one).
+    """
+    conditions = list(_user_scores(movie_list_id, user_id))
+    if after is not None:
+        score, item_id = after
+        conditions.append(or_(
+            EloScore.score < score,
+            and_(EloScore.score == score, EloScore.movie_list_item_id > item_id)
+        ))
+    # One extra row tells us whether there is a next page
+    rows = db.execute(
+        select(
+            EloScore.movie_list_item_id, MovieListItem.title, MovieListItem.external_id,
+            MovieListItem.item_metadata, EloScore.score, EloScore.deviation
+        )
+        .join(MovieListItem, MovieListItem.id == EloScore.movie_list_item_id)
+        .where(*conditions)
+        .order_by(EloScore.score.desc(), EloScore.movie_list_item_id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        total = db.scalar(select(func.count()).where(*_user_scores(movie_list_id, user_id)))
+        return total, [], None
+
+    # Everything the ranks need in one index-only count: ranked items, and how
+    # many score above / at least the page's first score
+    first_score = rows[0].score
+    total, above, at_or_above = db.execute(
+        select(
+            func.count(),
+            func.count().filter(EloScore.score > first_score),
+            func.count().filter(EloScore.score >= first_score)
+        ).where(*_user_scores(movie_list_id, user_id))
+    ).one()
+
+    page = []
+    first_index = {}
+    tied_with_first = sum(1 for row in rows if row.score == first_score)
+    for position, row in enumerate(rows):
+        first_index.setdefault(row.score, position)
+        if row.score == first_score:
+            rank = above + 1
+        else:
+            # Everything at or above the first score, plus this page's rows in between
+            rank = at_or_above + first_index[row.score] - tied_with_first + 1
+        page.append(RankedItem(
+            rank=rank,
+            percentile=100.0 * (total - rank) / (total - 1) if total > 1 else 100.0,
+            movie_list_item_id=row.movie_list_item_id,
+            title=row.title,
+            external_id=row.external_id,
+            item_metadata=row.item_metadata,
+            score=row.score,
+            deviation=row.deviation
+        ))
+    last = rows[-1]
+    return total, page, (last.score, last.movie_list_item_id) if has_more else None
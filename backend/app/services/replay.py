@@ -0,0 +1,181 @@
+"""
+Rebuild Elo scores for a list by replaying its vote history.
+
+Useful after a K-factor change, an item deletion or a data repair. Votes are
+replayed for all users at once: each user's votes are numbered 0, 1, 2, ...
+and step t applies the t-th vote of every user in a single set of NumPy
+operations over a users x items score matrix (a user appears at most once
+per step, so the updates never collide). Once fewer than MIN_VECTOR_WIDTH
+users are left with votes, the remaining tail is replayed in plain Python,
+which is faster than NumPy for a handful of scalars.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import chain
+from typing import Optional
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.db.bulk import upsert
+from app.db.models import EloScore, MovieListItem, VoteEvent, VotingSession
+from app.services import elo, vote_log
+
+# Below this many users in a step, replay the remaining votes without NumPy
+MIN_VECTOR_WIDTH = 8
+
+# Rows fetched per round trip when loading vote history
+LOAD_CHUNK_SIZE = 50000
+
+# Rows per upsert statement when writing scores back
+WRITE_CHUNK_SIZE = 5000
+
+@dataclass
+class VoteHistory:
+    """A list's votes in the order they were applied, as parallel arrays"""
+    user_ids: np.ndarray
+    item_a_ids: np.ndarray
+    item_b_ids: np.ndarray
+    a_won: np.ndarray
+
+    def __len__(self):
+        return len(self.user_ids)
+
+@dataclass
+class ReplayResult:
+    user_ids: np.ndarray   # row labels of ``scores``
+    item_ids: np.ndarray   # column labels of ``scores``
+    scores: np.ndarray     # users x items
+    votes: int
+
+def load_vote_history(db: Session, movie_list_id: int) -> VoteHistory:
+    """Load a list's votes from the vote log in the order they were recorded.
+
+    Only the votes the stored scores include are loaded: with scores applied
+    in the background, that's those up to the projector's checkpoint (see
+    vote_log.covered).
+    """
+    result = db.execute(
+        select(VoteEvent.user_id, VoteEvent.item_a_id, VoteEvent.item_b_id, VoteEvent.winner_id)
+        .where(VoteEvent.movie_list_id == movie_list_id, vote_log.covered(db, "scores"))
+        .order_by(VoteEvent.id)
+        .execution_options(yield_per=LOAD_CHUNK_SIZE)
+    )
+    # fromiter over the flattened rows avoids building a Python tuple per row
+    chunks = [np.fromiter(chain.from_iterable(rows), dtype=np.int64) for rows in result.partitions()]
+    rows = np.concatenate(chunks).reshape(-1, 4) if chunks else np.empty((0, 4), dtype=np.int64)
+    return VoteHistory(
+        user_ids=rows[:, 0],
+        item_a_ids=rows[:, 1],
+        item_b_ids=rows[:, 2],
+        a_won=rows[:, 3] == rows[:, 1]
+    )
+
+def replay_votes(history: VoteHistory, item_ids: Optional[np.ndarray] = None, user_ids: Optional[np.ndarray] = None,
+                 k: float = elo.K_FACTOR, initial_score: float = elo.DEFAULT_SCORE) -> ReplayResult:
+    """Replay votes from scratch and return the final users x items score matrix.
+
+    ``item_ids`` / ``user_ids`` add rows and columns that have no votes, so
+    they come out at ``initial_score``.
+    """
+    item_labels = np.unique(np.concatenate([
+        history.item_a_ids, history.item_b_ids,
+        np.asarray(item_ids if item_ids is not None else [], dtype=np.int64)
+    ]))
+    user_labels = np.unique(np.concatenate([
+        history.user_ids,
+        np.asarray(user_ids if user_ids is not None else [], dtype=np.int64)
+    ]))
+    scores = np.full((len(user_labels), len(item_labels)), initial_score, dtype=np.float64)
+    if len(history) == 0:
+        return ReplayResult(user_labels, item_labels, scores, 0)
+
+    users = np.searchsorted(user_labels, history.user_ids)
+    items_a = np.searchsorted(item_labels, history.item_a_ids)
+    items_b = np.searchsorted(item_labels, history.item_b_ids)
+    outcome = history.a_won.astype(np.float64)
+
+    # Number each user's votes 0, 1, 2, ... keeping their original order
+    by_user = np.argsort(users, kind="stable")
+    counts = np.bincount(users, minlength=len(user_labels))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    steps = np.empty(len(users), dtype=np.int64)
+    steps[by_user] = np.arange(len(users)) - np.repeat(starts, counts)
+
+    # Group votes by step; widths[t] is how many users have a t-th vote
+    order = np.lexsort((users, steps))
+    widths = np.bincount(steps)
+    bounds = np.concatenate([[0], np.cumsum(widths)])
+
+    vector_steps = int(np.argmax(widths < MIN_VECTOR_WIDTH)) if (widths < MIN_VECTOR_WIDTH).any() else len(widths)
+    for t in range(vector_steps):
+        idx = order[bounds[t]:bounds[t + 1]]
+        u, a, b = users[idx], items_a[idx], items_b[idx]
+        expected_a = 1 / (1 + 10 ** ((scores[u, b] - scores[u, a]) / 400))
+        delta = k * (outcome[idx] - expected_a)
+        scores[u, a] += delta
+        scores[u, b] -= delta
+
+    # Replay the narrow tail user by user in plain Python
+    tail = order[bounds[vector_steps]:]
+    if len(tail):
+        tail = tail[np.lexsort((steps[tail], users[tail]))]
+        tail_users = users[tail].tolist()
+        tail_a = items_a[tail].tolist()
+        tail_b = items_b[tail].tolist()
+        tail_won = history.a_won[tail].tolist()
+        current_user, row = None, None
+        for u, a, b, a_won in zip(tail_users, tail_a, tail_b, tail_won):
+            if u != current_user:
+                if row is not None:
+                    scores[current_user] = row
+                current_user, row = u, scores[u].tolist()
+            row[a], row[b] = elo.updated_scores(row[a], row[b], a_won, k)
+        scores[current_user] = row
+
+    return ReplayResult(user_labels, item_labels, scores, len(history))
+
+def write_scores(db: Session, movie_list_id: int, result: ReplayResult, chunk_size: int = WRITE_CHUNK_SIZE) -> int:
+    """Upsert every (user, item) score from a replay. The caller commits."""
+    user_ids = result.user_ids.tolist()
+    item_ids = result.item_ids.tolist()
+    rows = []
+    written = 0
+    for u, user_id in enumerate(user_ids):
+        for i, score in enumerate(result.scores[u].tolist()):
+            rows.append({"movie_list_id": movie_list_id, "user_id": user_id, "movie_list_item_id": item_ids[i], "score": score})
+            if len(rows) >= chunk_size:
+                upsert(db, EloScore, rows, index_elements=["movie_list_id", "user_id", "movie_list_item_id"], update_columns=["score"])
+                written += len(rows)
+                rows = []
+    upsert(db, EloScore, rows, index_elements=["movie_list_id", "user_id", "movie_list_item_id"], update_columns=["score"])
+    return written + len(rows)
+
+def rebuild_list_scores(db: Session, movie_list_id: int, k: float = elo.K_FACTOR) -> dict:
+    """Recompute and store every user's scores for a list from its vote history.
+
+    Users with score rows but no votes are reset to the default score. The
+    caller commits.
+    """
+    history = load_vote_history(db, movie_list_id)
+    item_ids = np.array(db.scalars(
+        select(MovieListItem.id).where(MovieListItem.movie_list_id == movie_list_id)
+    ).all(), dtype=np.int64)
+    scored_users = np.array(db.scalars(
+        select(EloScore.user_id).where(EloScore.movie_list_id == movie_list_id).distinct()
+    ).all(), dtype=np.int64)
+    result = replay_votes(history, item_ids=item_ids, user_ids=scored_users, k=k)
+    written = write_scores(db, movie_list_id, result)
+    # Rewritten scores change rankings; bump the sessions so cached standings notice (see borda)
+    db.execute(
+        update(VotingSession)
+        .where(VotingSession.movie_list_id == movie_list_id)
+        .values(updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return {
+        "votes_replayed": result.votes,
+        "users": len(result.user_ids),
+        "items": len(result.item_ids),
+        "scores_written": written
+    }
@@ -0,0 +1,186 @@
+"""
+Exhaustive voting without pre-generating matchups.
+
+Every pair of items is still voted on, but pairs are derived on demand from
+a deterministic schedule instead of being written as Matchup rows up front;
+only the matchups a user has been served (pending or voted) are stored.
+
+The schedule is a round robin built with the circle method, seeded per
+(list, user): the item order and the order of the rounds are shuffled. Each
+round pairs every item exactly once, so consecutive pairs within a round
+never share an item, and each round starts with a pair that doesn't share an
+item with the last pair of the round before. A cursor in the user's
+VotingSession state records how far through the schedule they are:
+
+    {
+        "seed": "<list>:<user>:<phase>",
+        "items": [item_id, ...],       # shuffled snapshot of the list's items
+        "position": 0,                 # next schedule slot to look at
+        "round": None,                 # schedule round the offset belongs to
+        "offset": 0,                   # slot that round started at
+        "last": [item_a, item_b] | None
+    }
+
+Pairs that already have a matchup, or whose items have left the list, are
+skipped. If items were added after the schedule was built, a new phase over
+all current items starts once the old one runs out.
+
+Serving the next matchup usually costs one lookup for the pair at the
+cursor, one insert for its matchup and one update of the session, which
+moves the cursor and counts the matchup together; the list's items are only
+loaded when a phase runs out.
+"""
+
+import random
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session
+from app.db.models import Matchup, MovieListItem, VotingSession
+from app.services.matchups import Pair, existing_pairs, list_item_ids, normalize_pair
+from app.services.voting_sessions import get_or_create_voting_session
+
+# Unavailable pairs checked one query at a time before loading the list's items and all of the user's pairs at once
+LOOKUP_LIMIT = 8
+
+def new_state(item_ids: List[int], seed: str) -> dict:
+    items = sorted(item_ids)
+    random.Random(seed).shuffle(items)
+    return {"seed": seed, "items": items, "position": 0, "round": None, "offset": 0, "last": None}
+
+def schedule_size(item_count: int) -> int:
+    """Number of slots in the schedule, including byes when the item count is odd"""
+    slots = item_count + item_count % 2
+    return (slots - 1) * (slots // 2)
+
+@lru_cache(maxsize=256)
+def round_order(seed: str, rounds: int) -> Tuple[int, ...]:
+    order = list(range(rounds))
+    random.Random(f"{seed}:rounds").shuffle(order)
+    return tuple(order)
+
+def slot_positions(round_number: int, slot: int, slots: int) -> Tuple[int, int]:
+    """Indexes into the item list paired in ``slot`` of a circle-method round.
+
+    The first position stays fixed and the others rotate one place per
+    round; an index equal to the item count is the bye.
+    """
+    def position(j: int) -> int:
+        return 0 if j == 0 else 1 + (j - 1 - round_number) % (slots - 1)
+    return position(slot), position(slots - 1 - slot)
+
+def next_pair(state: dict, is_available: Callable[[Pair], bool]) -> Optional[Pair]:
+    """Find the next available pair in the schedule, advancing the cursor in ``state``.
+
+    The cursor stays on the returned pair, so a pair that never got its
+    matchup is offered again. Returns None when the schedule is used up.
+    """
+    items = state["items"]
+    n = len(items)
+    slots = n + n % 2
+    per_round = slots // 2
+    order = round_order(state["seed"], slots - 1)
+    last = set(state["last"] or ())
+
+    while state["position"] < schedule_size(n):
+        round_index, step = divmod(state["position"], per_round)
+        round_number = order[round_index]
+        if state["round"] != round_index:
+            # Start the round on a pair that doesn't repeat an item from the last one
+            for offset in range(per_round):
+                a, b = slot_positions(round_number, offset, slots)
+                if a < n and b < n and not last & {items[a], items[b]}:
+                    break
+            else:
+                offset = 0
+            state["round"], state["offset"] = round_index, offset
+        a, b = slot_positions(round_number, (state["offset"] + step) % per_round, slots)
+        if a < n and b < n:
+            pair = normalize_pair(items[a], items[b])
+            if is_available(pair):
+                state["last"] = list(pair)
+                return pair
+            last = set(pair)
+            state["last"] = list(pair)
+        state["position"] += 1
+    return None
+
+def _availability(db: Session, movie_list_id: int, user_id: int) -> Callable[[Pair], bool]:
+    """A check for pairs of current items the user has no matchup for yet.
+
+    Looks pairs up one query at a time, switching to a single load of the
+    list's items and every pair the user has once more than LOOKUP_LIMIT
+    have turned out to be unavailable.
+    """
+    loaded = {"misses": 0, "items": None, "pairs": None}
+
+    def is_available(pair: Pair) -> bool:
+        if loaded["pairs"] is not None:
+            return pair[0] in loaded["items"] and pair[1] in loaded["items"] and pair not in loaded["pairs"]
+        current, taken = db.execute(select(
+            select(func.count()).where(MovieListItem.movie_list_id == movie_list_id, MovieListItem.id.in_(pair))
+            .scalar_subquery(),
+            exists().where(
+                Matchup.movie_list_id == movie_list_id,
+                Matchup.user_id == user_id,
+                Matchup.item_a_id.in_(pair),
+                Matchup.item_b_id.in_(pair)
+            )
+        )).one()
+        available = current == 2 and not taken
+        if not available:
+            loaded["misses"] += 1
+            if loaded["misses"] > LOOKUP_LIMIT:
+                loaded["items"] = set(list_item_ids(db, movie_list_id))
+                loaded["pairs"] = existing_pairs(db, movie_list_id, user_id)
+        return available
+    return is_available
+
+def top_up_matchups(db: Session, movie_list_id: int, user_id: int, count: int,
+                    session: Optional[VotingSession] = None) -> List[Matchup]:
+    """Make sure the user has up to ``count`` pending matchups, creating them from the schedule.
+
+    ``session`` is the user's voting session if the caller has already
+    locked it. Returns the matchups created. The caller commits.
+    """
+    if session is None:
+        session = get_or_create_voting_session(db, movie_list_id, user_id, for_update=True)
+    missing = count - (session.total_matchups - session.completed_matchups)
+    if missing <= 0:
+        return []
+
+    if isinstance(session.state, dict) and "seed" in session.state:
+        state = dict(session.state)
+    else:
+        # No schedule yet, or state left over from another voting mode
+        state = new_state(list_item_ids(db, movie_list_id), f"{movie_list_id}:{user_id}:0")
+    is_available = _availability(db, movie_list_id, user_id)
+
+    created = []
+    while len(created) < missing:
+        pair = next_pair(state, is_available)
+        if pair is None:
+            item_ids = list_item_ids(db, movie_list_id)
+            if set(item_ids) <= set(state["items"]):
+                break
+            # Items were added since the schedule was built; go round again over all of them,
+            # with the matchups just made visible to the lookups
+            phase = int(state["seed"].rsplit(":", 1)[1]) + 1
+            state = new_state(item_ids, f"{movie_list_id}:{user_id}:{phase}")
+            db.flush()
+            is_available = _availability(db, movie_list_id, user_id)
+            continue
+        matchup = Matchup(movie_list_id=movie_list_id, user_id=user_id, item_a_id=pair[0], item_b_id=pair[1],
+                          winner_id=None, created_at=datetime.utcnow())
+        db.add(matchup)
+        created.append(matchup)
+        # The pair has a matchup now, so move straight past it
+        state["position"] += 1
+
+    session.state = state
+    # The row is locked, so the count goes out with the cursor rather than as an increment of its own
+    session.total_matchups += len(created)
+    session.updated_at = datetime.utcnow()
+    db.flush()
+    return created
@@ -0,0 +1,326 @@
+"""
+In-process title index for autocomplete.
+
+Titles are normalized (lowercased, accents and punctuation dropped) and
+split into words. Each word has a posting list of the titles containing it,
+ordered by popularity, and the words are kept in a sorted vocabulary, which
+works as a flattened prefix trie: the words starting with a prefix are one
+bisect range of it. A query matches titles containing all of its words,
+the last one as a prefix while it's still being typed, and results come
+out in popularity order, so a search reads the front of a few posting lists
+and stops once it has enough.
+
+ - A short prefix ("s") covers thousands of words, too many to merge on
+   every keystroke, so the top titles of every prefix covering at least
+   HEAVY_PREFIX_WORDS words are kept precomputed.
+ - With several words, the rarest one drives: its postings are read in
+   popularity order and the other words are checked against each title.
+ - A word that matches nothing is taken for a typo and replaced with the
+   vocabulary words sharing most of its trigrams (trigram postings map each
+   trigram to the words containing it).
+
+SearchIndex.build indexes a whole catalog at once; upsert and remove keep it
+current between rebuilds. An index is only ever touched from one thread
+(the event loop's), so there's no locking.
+"""
+
+import heapq
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# The most results a search returns
+TOP_K = 50
+
+# Titles kept per precomputed prefix; the spare ones absorb removals
+TOP_CAPACITY = 2 * TOP_K
+
+# Prefixes covering at least this many words get precomputed results
+HEAVY_PREFIX_WORDS = 64
+
+# Titles a multi-word search checks before settling for what it has,
+# bounding searches made of common words whose matches are rare
+MAX_SCAN = 5000
+
+# Typo tolerance: the shortest word corrected, the trigram similarity a
+# correction needs (Dice for whole words, containment for prefixes) and how
+# many corrections are tried per word
+MIN_FUZZY_LENGTH = 4
+MIN_SIMILARITY = 0.5
+MAX_CORRECTIONS = 8
+
+Document = Tuple[int, str, float]  # (id, title, popularity)
+
+_APOSTROPHES = re.compile(r"['’]")
+_NON_WORD = re.compile(r"[\W_]+")
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", _APOSTROPHES.sub("", text.lower()))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+def trigrams(word: str, is_prefix: bool = False) -> List[str]:
+    # Padded so the start and end of a word count; a prefix has no end yet
+    padded = f"${word}" if is_prefix else f"${word}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+@lru_cache(maxsize=16384)
+def _word_trigrams(word: str) -> frozenset:
+    # The same candidate words come up for one typo after another
+    return frozenset(trigrams(word))
+
+class SearchIndex:
+    def __init__(self):
+        # Titles live in slots, which the posting lists refer to
+        self._slots: Dict[int, int] = {}  # id -> slot
+        self._ids: List[Optional[int]] = []
+        self._titles: List[str] = []
+        self._popularity: List[float] = []
+        self._words: List[str] = []  # Normalized title padded with spaces, for checking candidates
+        self._free: List[int] = []
+        self._postings: Dict[str, array] = {}
+        self._vocabulary: List[str] = []
+        # Words by trigram; words no longer indexed are skipped, not removed
+        self._trigram_words: Dict[str, List[str]] = defaultdict(list)
+        # Top slots of heavy prefixes ("" for the whole index), and the
+        # prefixes whose list holds every title they match
+        self._top: Dict[str, List[int]] = {}
+        self._complete: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _key(self, slot: int) -> Tuple[float, int]:
+        # Most popular first; the slot breaks ties so a title can be found by bisection
+        return -self._popularity[slot], slot
+
+    @classmethod
+    def build(cls, documents: Iterable[Document]) -> "SearchIndex":
+        index = cls()
+        # Slots handed out in popularity order leave every posting list sorted without insorts
+        for doc_id, title, popularity in sorted(documents, key=lambda document: -document[2]):
+            if doc_id in index._slots:
+                continue
+            slot = index._new_slot(doc_id, title, popularity)
+            for word in set(index._words[slot].split()):
+                postings = index._postings.get(word)
+                if postings is None:
+                    postings = index._postings[word] = array("i")
+                postings.append(slot)
+        index._vocabulary = sorted(index._postings)
+        for word in index._vocabulary:
+            for trigram in set(trigrams(word)):
+                index._trigram_words[trigram].append(word)
+        index._precompute_top()
+        return index
+
+    def _precompute_top(self) -> None:
+        words_by_prefix = Counter(word[:length] for word in self._vocabulary for length in range(1, len(word) + 1))
+        self._top = {prefix: [] for prefix, count in words_by_prefix.items() if count >= HEAVY_PREFIX_WORDS}
+        ranked = sorted(self._slots.values(), key=self._key)
+        self._top[""] = ranked[:TOP_CAPACITY]
+        # In popularity order, so each prefix's list fills up with its top titles
+        for slot in ranked:
+            for word in self._words[slot].split():
+                for length in range(1, len(word) + 1):
+                    top = self._top.get(word[:length])
+                    # A prefix covers fewer words than its own prefixes
+                    if top is None:
+                        break
+                    if len(top) < TOP_CAPACITY and (not top or top[-1] != slot):
+                        top.append(slot)
+        self._complete = {prefix for prefix, top in self._top.items() if len(top) < TOP_CAPACITY}
+
+    def _new_slot(self, doc_id: int, title: str, popularity: float) -> int:
+        words = f" {normalize(title)} "
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot], self._titles[slot], self._popularity[slot], self._words[slot] = doc_id, title, popularity, words
+        else:
+            slot = len(self._ids)
+            self._ids.append(doc_id)
+            self._titles.append(title)
+            self._popularity.append(popularity)
+            self._words.append(words)
+        self._slots[doc_id] = slot
+        return slot
+
+    def upsert(self, doc_id: int, title: str, popularity: float) -> None:
+        """Add a title, or update one already indexed"""
+        if doc_id in self._slots:
+            self.remove(doc_id)
+        slot = self._new_slot(doc_id, title, popularity)
+        for word in set(self._words[slot].split()):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = array("i")
+                insort(self._vocabulary, word)
+                for trigram in set(trigrams(word)):
+                    self._trigram_words[trigram].append(word)
+            insort(postings, slot, key=self._key)
+            for length in range(len(word) + 1):
+                self._offer(word[:length], slot)
+
+    def _offer(self, prefix: str, slot: int) -> None:
+        top = self._top.get(prefix)
+        if top is None or slot in top:
+            return
+        # Below the last title of an incomplete list, titles in between may be missing
+        if prefix in self._complete or self._key(slot) < self._key(top[-1]):
+            insort(top, slot, key=self._key)
+            if len(top) > TOP_CAPACITY:
+                del top[TOP_CAPACITY:]
+                self._complete.discard(prefix)
+
+    def remove(self, doc_id: int) -> None:
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return
+        for word in set(self._words[slot].split()):
+            postings = self._postings[word]
+            del postings[bisect_left(postings, self._key(slot), key=self._key)]
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+            for length in range(len(word) + 1):
+                prefix = word[:length]
+                top = self._top.get(prefix)
+                if top is not None and slot in top:
+                    top.remove(slot)
+                    # Recomputed by the next search that needs it
+                    if len(top) < TOP_K and prefix not in self._complete:
+                        del self._top[prefix]
+        self._ids[slot] = None
+        self._free.append(slot)
+
+    def search(self, query: str, limit: int = 10) -> List[int]:
+        """Ids of the most popular titles matching ``query``, which may end mid-word"""
+        limit = min(limit, TOP_K)
+        words = normalize(query).split()
+        if not words:
+            return self._ids_of(self._top_of("")[:limit])
+        still_typing = not query[-1].isspace()
+        terms = []  # (word, is_prefix, vocabulary range for a prefix, else the words it stands for)
+        for i, word in enumerate(words):
+            is_prefix = still_typing and i == len(words) - 1
+            if is_prefix:
+                matches = self._prefix_range(word)
+                matches = None if matches[0] == matches[1] else matches
+            else:
+                matches = [word] if word in self._postings else None
+            if matches is None:
+                corrections = self._corrections(word, is_prefix)
+                if not corrections:
+                    return []
+                terms.append((word, False, corrections))
+            else:
+                terms.append((word, is_prefix, matches))
+
+        if len(terms) == 1 and terms[0][1]:
+            word, _, (lo, hi) = terms[0]
+            if hi - lo >= HEAVY_PREFIX_WORDS or word in self._top:
+                return self._ids_of(self._top_of(word)[:limit])
+
+        driver = min(terms, key=self._cost)
+        # The rarest words first, so they turn most candidates down before the rest are checked
+        checks = [self._needles(term) for term in sorted(terms, key=self._cost) if term is not driver]
+        stream = self._stream(driver)
+        results = []
+        scanned, chunk = 0, 64
+        # Candidates go through the checks a chunk at a time, growing chunks since the first usually has enough
+        while len(results) < limit and scanned < MAX_SCAN:
+            slots = list(islice(stream, chunk))
+            if not slots:
+                break
+            scanned += len(slots)
+            for needles in checks:
+                slots = self._having(slots, needles)
+            results += slots
+            chunk = min(chunk * 2, 1024)
+        return self._ids_of(results[:limit])
+
+    def _having(self, slots: List[int], needles: Tuple[str, ...]) -> List[int]:
+        titles = self._words
+        if len(needles) == 1:
+            needle = needles[0]
+            return [slot for slot in slots if needle in titles[slot]]
+        return [slot for slot in slots if any(needle in titles[slot] for needle in needles)]
+
+    def _ids_of(self, slots: List[int]) -> List[int]:
+        return [self._ids[slot] for slot in slots]
+
+    def titles(self, doc_ids: Iterable[int]) -> List[str]:
+        return [self._titles[self._slots[doc_id]] for doc_id in doc_ids]
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect_left(self._vocabulary, prefix)
+        # "\uffff" sorts after any character a normalized word contains
+        return lo, bisect_left(self._vocabulary, prefix + "\uffff", lo)
+
+    def _words_of(self, term) -> List[str]:
+        word, is_prefix, matches = term
+        return self._vocabulary[matches[0]:matches[1]] if is_prefix else matches
+
+    def _cost(self, term) -> float:
+        word, is_prefix, matches = term
+        if is_prefix and matches[1] - matches[0] >= HEAVY_PREFIX_WORDS:
+            return float("inf")
+        return sum(len(self._postings[match]) for match in self._words_of(term))
+
+    @staticmethod
+    def _needles(term) -> Tuple[str, ...]:
+        """Substrings of a padded title, one of which it contains if it matches ``term``"""
+        word, is_prefix, matches = term
+        return (f" {word}",) if is_prefix else tuple(f" {match} " for match in matches)
+
+    def _stream(self, term) -> Iterator[int]:
+        """The slots of the titles matching ``term``, most popular first"""
+        lists = [self._postings[match] for match in self._words_of(term)]
+        if len(lists) == 1:
+            return iter(lists[0])
+        return self._merged(lists)
+
+    def _merged(self, lists: List[array]) -> Iterator[int]:
+        seen = set()
+        for slot in heapq.merge(*lists, key=self._key):
+            if slot not in seen:
+                seen.add(slot)
+                yield slot
+
+    def _top_of(self, prefix: str) -> List[int]:
+        top = self._top.get(prefix)
+        if top is None:
+            if prefix:
+                top = list(islice(self._stream((prefix, True, self._prefix_range(prefix))), TOP_CAPACITY))
+            else:
+                top = heapq.nsmallest(TOP_CAPACITY, self._slots.values(), key=self._key)
+            self._top[prefix] = top
+            if len(top) < TOP_CAPACITY:
+                self._complete.add(prefix)
+        return top
+
+    def _corrections(self, word: str, is_prefix: bool) -> List[str]:
+        """Indexed words ``word`` is most likely a misspelling of"""
+        if len(word) < MIN_FUZZY_LENGTH:
+            return []
+        grams = set(trigrams(word, is_prefix))
+        # A word sharing enough trigrams shares one of the rarest few, so only those are looked up
+        needed = max(1, int(MIN_SIMILARITY * len(grams) + 0.999))
+        rarest = sorted(grams, key=lambda gram: len(self._trigram_words.get(gram, ())))[:len(grams) - needed + 1]
+        candidates = {candidate for gram in rarest for candidate in self._trigram_words.get(gram, ())}
+        scored = []
+        for candidate in candidates:
+            if candidate not in self._postings:
+                continue
+            candidate_grams = _word_trigrams(candidate)
+            shared = len(grams & candidate_grams)
+            # A prefix only has to be contained in the word it's the start of
+            similarity = shared / len(grams) if is_prefix else 2 * shared / (len(grams) + len(candidate_grams))
+            if similarity >= MIN_SIMILARITY:
+                scored.append((similarity, len(self._postings[candidate]), candidate))
+        return [candidate for _, _, candidate in heapq.nlargest(MAX_CORRECTIONS, scored)]
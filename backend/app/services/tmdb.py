@@ -0,0 +1,318 @@
+"""
+TMDB client for movie search, popular movies and movie details.
+
+Requests to TMDB share one httpx.AsyncClient per process, which keeps up to
+TMDB_MAX_CONNECTIONS connections alive between requests instead of opening
+one per call. Each request first takes a token from a token bucket refilled
+at TMDB_RATE_LIMIT a second (bursts of TMDB_RATE_BURST), so a burst of
+searches queues up here rather than running into TMDB's own limit; a 429
+that gets through anyway is retried after its Retry-After.
+
+Responses are cached in external_api_cache, keyed by path and parameters
+(never the API key), so they survive restarts and are shared by every
+worker; the most recently used entries are also kept in memory, so popular
+searches don't need a database round trip. An entry is served as is for its
+endpoint's TTL, then for up to TMDB_CACHE_STALE_SECONDS more while a
+background request refreshes it (stale-while-revalidate); after that it's
+fetched before answering, unless TMDB fails, in which case the expired
+entry beats an error. Entries past their stale window are deleted every
+TMDB_CACHE_PURGE_INTERVAL seconds, so the table only holds what can still
+be served. Identical requests to TMDB in flight at the same time,
+misses or refreshes, share one upstream call.
+
+/metrics counts cache lookups by result, upstream requests by status,
+coalesced requests and time spent waiting for the rate limit, along with
+the cache hit ratio.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+import httpx
+from sqlalchemy import delete
+from app.core import metrics
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.db.bulk import upsert
+from app.db.models import ExternalApiCache
+
+logger = logging.getLogger(__name__)
+
+# How long each kind of response is served from the cache before it's refreshed
+SEARCH_TTL = timedelta(days=1)
+POPULAR_TTL = timedelta(hours=6)
+MOVIE_TTL = timedelta(days=7)
+
+# Tries per request when TMDB answers 429
+MAX_ATTEMPTS = 3
+
+# Seconds to wait after a 429 without a usable Retry-After, and the most we wait whatever it says
+DEFAULT_RETRY_AFTER = 1.0
+MAX_RETRY_AFTER = 30.0
+
+# Cache entries kept in memory per process
+MEMORY_CACHE_SIZE = 2048
+
+Entry = Tuple[dict, datetime, datetime]  # (payload, fresh_until, stale_until)
+
+LOOKUPS = metrics.Counter("rnkd_tmdb_cache_lookups_total", "TMDB cache lookups by result: hit, stale or miss")
+UPSTREAM_REQUESTS = metrics.Counter("rnkd_tmdb_upstream_requests_total", "Requests sent to TMDB by response status")
+COALESCED = metrics.Counter("rnkd_tmdb_coalesced_requests_total", "TMDB requests answered by an identical one already in flight")
+RATE_LIMIT_WAIT = metrics.Counter("rnkd_tmdb_rate_limit_wait_seconds_total", "Time requests spent waiting for the TMDB rate limit")
+
+def _hit_ratio():
+    hits = LOOKUPS.value(result="hit") + LOOKUPS.value(result="stale")
+    total = hits + LOOKUPS.value(result="miss")
+    yield from metrics.gauge_lines(
+        "rnkd_tmdb_cache_hit_ratio",
+        "Share of TMDB cache lookups answered from the cache, stale entries included",
+        [({}, hits / total)] if total else []
+    )
+
+metrics.register(_hit_ratio)
+
+class TMDBError(Exception):
+    """A TMDB request that failed, with the HTTP status the API should answer with"""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class TokenBucket:
+    """Spaces out callers of acquire() to ``rate`` a second, after an initial burst of ``burst``"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Take the token now, going into debt if there is none, and wait until it would have
+        # been there; callers queue up in order without a lock
+        self.tokens -= 1
+        if self.tokens < 0:
+            wait = -self.tokens / self.rate
+            RATE_LIMIT_WAIT.inc(wait)
+            await asyncio.sleep(wait)
+
+def retry_after(value: Optional[str]) -> float:
+    """Seconds to wait for a Retry-After header, which is either seconds or an HTTP date"""
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return DEFAULT_RETRY_AFTER
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    if seconds != seconds:  # NaN
+        return DEFAULT_RETRY_AFTER
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+def cache_key(path: str, params: Dict[str, Any]) -> str:
+    return f"tmdb:{path}?{urlencode(sorted(params.items()))}"
+
+def movie_from_tmdb(data: dict) -> dict:
+    """A TMDB movie, from a result list or the details endpoint, in the shape of the movies API"""
+    genre_ids = data.get("genre_ids")
+    if genre_ids is None:
+        genre_ids = [genre["id"] for genre in data.get("genres", [])]
+    return {
+        "id": data["id"],
+        "title": data.get("title") or "",
+        "overview": data.get("overview") or "",
+        "poster_path": data.get("poster_path"),
+        "release_date": data.get("release_date") or "",
+        "genre_ids": genre_ids,
+        "external_id": str(data["id"])
+    }
+
+class TMDBClient:
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None, session_factory=None,
+                 rate_limit: Optional[float] = None, burst: Optional[int] = None):
+        self.base_url = base_url or settings.TMDB_BASE_URL
+        self.api_key = api_key or settings.TMDB_API_KEY
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.bucket = TokenBucket(
+            settings.TMDB_RATE_LIMIT if rate_limit is None else rate_limit,
+            settings.TMDB_RATE_BURST if burst is None else burst
+        )
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        # Upstream calls in progress by cache key
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._memory: "OrderedDict[str, Entry]" = OrderedDict()
+
+    def http(self) -> httpx.AsyncClient:
+        # Pooled connections and in-flight tasks belong to the event loop they were made on
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=settings.TMDB_TIMEOUT,
+                limits=httpx.Limits(max_connections=settings.TMDB_MAX_CONNECTIONS,
+                                    max_keepalive_connections=settings.TMDB_MAX_CONNECTIONS),
+                headers={"Accept": "application/json"}
+            )
+            self._loop = loop
+            self._in_flight = {}
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None, ttl: timedelta = MOVIE_TTL) -> dict:
+        """GET ``path`` from TMDB, through the cache"""
+        params = params or {}
+        key = cache_key(path, params)
+        entry = await self._lookup(key)
+        now = datetime.utcnow()
+        if entry is not None and now < entry[1]:
+            LOOKUPS.inc(result="hit")
+            return entry[0]
+        if entry is not None and now < entry[2]:
+            LOOKUPS.inc(result="stale")
+            # Errors are left to the next lookup; the task is kept in _in_flight until it's done
+            self._start_fetch(key, path, params, ttl)
+            return entry[0]
+        LOOKUPS.inc(result="miss")
+        try:
+            # Shielded so a request that goes away doesn't cancel the call for everyone sharing it
+            return await asyncio.shield(self._start_fetch(key, path, params, ttl))
+        except TMDBError:
+            if entry is None:
+                raise
+            return entry[0]
+
+    async def _lookup(self, key: str) -> Optional[Entry]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        async with self.session_factory() as db:
+            row = await db.get(ExternalApiCache, key)
+        if row is None:
+            return None
+        entry = (row.payload, row.fresh_until, row.stale_until)
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: Entry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        if len(self._memory) > MEMORY_CACHE_SIZE:
+            self._memory.popitem(last=False)
+
+    def _start_fetch(self, key: str, path: str, params: Dict[str, Any], ttl: timedelta) -> asyncio.Task:
+        self.http()
+        task = self._in_flight.get(key)
+        if task is not None:
+            COALESCED.inc()
+            return task
+        task = asyncio.ensure_future(self._fetch(key, path, params, ttl))
+        self._in_flight[key] = task
+        task.add_done_callback(partial(self._fetch_done, key))
+        return task
+
+    def _fetch_done(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark background refresh failures as seen
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, key: str, path: str, params: Dict[str, Any], ttl: timedelta) -> dict:
+        payload = await self._request(path, params)
+        now = datetime.utcnow()
+        row = {
+            "key": key,
+            "payload": payload,
+            "fetched_at": now,
+            "fresh_until": now + ttl,
+            "stale_until": now + ttl + timedelta(seconds=settings.TMDB_CACHE_STALE_SECONDS)
+        }
+        async with self.session_factory() as db:
+            await db.run_sync(upsert, ExternalApiCache, [row], ["key"])
+            await db.commit()
+        self._remember(key, (payload, row["fresh_until"], row["stale_until"]))
+        return payload
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> dict:
+        for attempt in range(MAX_ATTEMPTS):
+            await self.bucket.acquire()
+            try:
+                response = await self.http().get(path, params={**params, "api_key": self.api_key})
+            except httpx.HTTPError as e:
+                UPSTREAM_REQUESTS.inc(status="error")
+                raise TMDBError(502, f"TMDB request failed: {e!r}") from e
+            UPSTREAM_REQUESTS.inc(status=str(response.status_code))
+            if response.status_code == 429 and attempt + 1 < MAX_ATTEMPTS:
+                await asyncio.sleep(retry_after(response.headers.get("Retry-After")))
+                continue
+            if response.status_code == 404:
+                raise TMDBError(404, "Movie not found")
+            if response.status_code != 200:
+                raise TMDBError(502, f"TMDB answered {response.status_code}")
+            return response.json()
+
+    async def search_movies(self, query: str, page: int = 1) -> List[dict]:
+        # TMDB's search ignores case and surrounding spaces, so the cache does too
+        data = await self.get("/search/movie", {"query": query.strip().lower(), "page": page}, SEARCH_TTL)
+        return [movie_from_tmdb(movie) for movie in data.get("results", [])]
+
+    async def popular_movies(self, page: int = 1) -> List[dict]:
+        data = await self.get("/movie/popular", {"page": page}, POPULAR_TTL)
+        return [movie_from_tmdb(movie) for movie in data.get("results", [])]
+
+    async def get_movie(self, tmdb_id: int) -> dict:
+        return movie_from_tmdb(await self.get(f"/movie/{tmdb_id}", {}, MOVIE_TTL))
+
+_client: Optional[TMDBClient] = None
+
+def get_client() -> TMDBClient:
+    """The process's shared client"""
+    global _client
+    if _client is None:
+        _client = TMDBClient()
+    return _client
+
+async def purge_expired(session_factory=None) -> int:
+    """Delete the cache entries past their stale window; returns how many"""
+    async with (session_factory or AsyncSessionLocal)() as db:
+        result = await db.execute(
+            delete(ExternalApiCache).where(ExternalApiCache.stale_until < datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return result.rowcount
+
+async def run_purger(interval: float) -> None:
+    """Purge expired cache entries every ``interval`` seconds until cancelled"""
+    while True:
+        try:
+            await purge_expired()
+        except Exception:
+            logger.exception("Purging the TMDB cache failed")
+        await asyncio.sleep(interval)
+
+async def close() -> None:
+    if _client is not None:
+        await _client.aclose()
@@ -0,0 +1,185 @@
+"""
+Merge-sort "best-of" tournament for ranking large lists.
+
+Each user's sort is kept as a small JSON document on their VotingSession, so
+it survives restarts and costs a few bytes per item instead of one Matchup
+row per possible pair. The sort is a queue-based bottom-up merge sort: the
+two runs at the front of the queue are merged one comparison at a time and
+the merged run goes to the back, until a single run (the final ranking,
+best first) is left. When one side of a merge is a single item it is placed
+with a binary search instead, so late additions cost ~log2 n comparisons.
+
+State layout::
+
+    {
+        "runs": [[item_id, ...], ...],           # sorted runs waiting to be merged
+        "merge": {"left": [...], "right": [...], "out": [...]} | None,
+        "insert": {"item": id, "run": [...], "lo": 0, "hi": n} | None,
+        "comparisons": 0
+    }
+"""
+
+import copy
+import math
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from app.db.models import Matchup, VotingSession
+from app.services.matchups import create_matchup, delete_matchup, list_item_ids
+from app.services.voting_sessions import get_voting_session, get_or_create_voting_session
+
+def new_state(item_ids: List[int]) -> dict:
+    """Start a sort over the given items"""
+    state = {"runs": [[item_id] for item_id in item_ids], "merge": None, "insert": None, "comparisons": 0}
+    _start_next_merge(state)
+    return state
+
+def estimated_comparisons(item_count: int) -> int:
+    """Worst-case number of comparisons merge sort needs for ``item_count`` items"""
+    if item_count < 2:
+        return 0
+    depth = math.ceil(math.log2(item_count))
+    return item_count * depth - 2**depth + 1
+
+def is_complete(state: dict) -> bool:
+    return state["merge"] is None and state["insert"] is None
+
+def ranking(state: dict) -> Optional[List[int]]:
+    """The final ranking (best first), or None while the sort is still running"""
+    if not is_complete(state):
+        return None
+    return state["runs"][0] if state["runs"] else []
+
+def pending_pair(state: dict) -> Optional[Tuple[int, int]]:
+    """The comparison the sort needs next, or None when it is finished"""
+    if state["insert"] is not None:
+        insert = state["insert"]
+        mid = (insert["lo"] + insert["hi"]) // 2
+        return insert["item"], insert["run"][mid]
+    if state["merge"] is not None:
+        return state["merge"]["left"][0], state["merge"]["right"][0]
+    return None
+
+def apply_result(state: dict, winner_id: int, loser_id: int) -> bool:
+    """Advance the sort with the outcome of a comparison.
+
+    Returns False (leaving the state untouched) if the pair isn't the one the
+    sort is currently waiting on, e.g. a vote on a stale matchup.
+    """
+    pair = pending_pair(state)
+    if pair is None or {winner_id, loser_id} != set(pair):
+        return False
+
+    state["comparisons"] += 1
+    if state["insert"] is not None:
+        insert = state["insert"]
+        mid = (insert["lo"] + insert["hi"]) // 2
+        if winner_id == insert["item"]:
+            insert["hi"] = mid
+        else:
+            insert["lo"] = mid + 1
+        if insert["lo"] == insert["hi"]:
+            run = insert["run"]
+            run.insert(insert["lo"], insert["item"])
+            state["insert"] = None
+            state["runs"].append(run)
+            _start_next_merge(state)
+        return True
+
+    merge = state["merge"]
+    side = merge["left"] if merge["left"][0] == winner_id else merge["right"]
+    merge["out"].append(side.pop(0))
+    if not merge["left"] or not merge["right"]:
+        state["runs"].append(merge["out"] + merge["left"] + merge["right"])
+        state["merge"] = None
+        _start_next_merge(state)
+    return True
+
+def add_item(state: dict, item_id: int) -> None:
+    """Add an item to a running or finished sort"""
+    state["runs"].append([item_id])
+    if is_complete(state):
+        _start_next_merge(state)
+
+def sort_items(state: dict) -> Set[int]:
+    """Every item the sort knows about, wherever it currently sits"""
+    items = {item_id for run in state["runs"] for item_id in run}
+    if state["merge"] is not None:
+        items.update(*(state["merge"][side] for side in ("left", "right", "out")))
+    if state["insert"] is not None:
+        items.add(state["insert"]["item"])
+        items.update(state["insert"]["run"])
+    return items
+
+def _start_next_merge(state: dict) -> None:
+    runs = state["runs"]
+    if len(runs) < 2:
+        return
+    left, right = runs.pop(0), runs.pop(0)
+    if len(left) == 1 or len(right) == 1:
+        item, run = (left[0], right) if len(left) == 1 else (right[0], left)
+        state["insert"] = {"item": item, "run": run, "lo": 0, "hi": len(run)}
+    else:
+        state["merge"] = {"left": left, "right": right, "out": []}
+
+def sort_state(session: Optional[VotingSession]) -> Optional[dict]:
+    """The tournament sort kept on a session, if it holds one (the list may have switched modes)"""
+    if session is None or not isinstance(session.state, dict) or "runs" not in session.state:
+        return None
+    return session.state
+
+def get_or_start_sort(db: Session, movie_list_id: int, user_id: int) -> VotingSession:
+    """Load the user's sort, starting one over the list's current items if needed"""
+    session = get_or_create_voting_session(db, movie_list_id, user_id)
+    if sort_state(session) is None:
+        session.state = new_state(list_item_ids(db, movie_list_id))
+        session.updated_at = datetime.utcnow()
+        db.flush()
+    return session
+
+def next_tournament_matchup(db: Session, movie_list_id: int, user_id: int, pending: Optional[Matchup]) -> Optional[Matchup]:
+    """Return the matchup for the comparison the sort is waiting on, creating it if needed.
+
+    The caller is responsible for committing.
+    """
+    session = get_or_start_sort(db, movie_list_id, user_id)
+    pair = pending_pair(session.state)
+    if pair is None:
+        return None
+    if pending is not None:
+        if {pending.item_a_id, pending.item_b_id} == set(pair):
+            return pending
+        # Left over from before the sort changed (e.g. an item was added)
+        delete_matchup(db, pending)
+    return create_matchup(db, movie_list_id, user_id, pair)
+
+def add_tournament_item(db: Session, movie_list_id: int, user_id: int, item_id: int) -> bool:
+    """Feed an item added to the list into the user's sort, if they have one running.
+
+    The user's next matchup is the first comparison for the new item once the
+    current step is done; a pending matchup that no longer matches is
+    replaced by next_tournament_matchup. The caller is responsible for
+    committing.
+    """
+    session = get_voting_session(db, movie_list_id, user_id, for_update=True)
+    if sort_state(session) is None or item_id in sort_items(session.state):
+        return False
+    state = copy.deepcopy(session.state)
+    add_item(state, item_id)
+    session.state = state
+    session.updated_at = datetime.utcnow()
+    return True
+
+def record_tournament_vote(db: Session, matchup: Matchup) -> bool:
+    """Feed a vote into the user's sort. The caller is responsible for committing."""
+    session = get_voting_session(db, matchup.movie_list_id, matchup.user_id, for_update=True)
+    if sort_state(session) is None:
+        return False
+    loser_id = matchup.item_b_id if matchup.winner_id == matchup.item_a_id else matchup.item_a_id
+    state = copy.deepcopy(session.state)
+    if not apply_result(state, matchup.winner_id, loser_id):
+        return False
+    # Assign a new object so the JSON column is flagged as changed
+    session.state = state
+    session.updated_at = datetime.utcnow()
+    return True
@@ -0,0 +1,113 @@
+"""
+Append-only log of every recorded vote.
+
+The vote path appends one vote_events row per vote, with a single insert in
+the vote's transaction, and events are never changed afterwards. Ids come
+from a sequence, so the log is an ordered record of every vote that views
+can be rebuilt from (see projections and replay) and new rating models can
+be computed from.
+
+Views derived from the log are called projections. Each is applied inline,
+in the vote's transaction, unless it is named in ASYNC_PROJECTIONS, in which
+case a background projector applies it later from the log. Every event
+records which projections were applied inline with it, so a projection can
+move between inline and async without an event being applied twice or not
+at all.
+
+Ids are handed out when a vote is inserted, not when it commits, so a reader
+can see event 9 before event 8 has committed. Readers therefore stop at the
+first gap in the ids, unless the event after it is older than GAP_TIMEOUT,
+by which time the missing event's transaction must have rolled back.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.bulk import insert_ignore
+from app.db.models import Matchup, ProjectionCheckpoint, VoteEvent
+
+# Bit per projection, set in an event's inline_projections when it was applied with the vote
+PROJECTIONS: Dict[str, int] = {
+    "scores": 1,     # voters' Elo / Glicko-2 scores (elo_scores)
+    "progress": 2,   # completed matchup counters (voting_sessions)
+    "pairwise": 4,   # the list's head-to-head counts (pairwise_wins), behind group results
+}
+
+# How long a gap in the event ids can be waited on before it's taken as a rolled back vote
+GAP_TIMEOUT = timedelta(seconds=30)
+
+def is_inline(name: str) -> bool:
+    return name not in settings.ASYNC_PROJECTIONS
+
+def inline_bits(*names: str) -> int:
+    return sum(PROJECTIONS[name] for name in names)
+
+def append(db: Session, matchups: Iterable[Matchup], inline_projections: Dict[int, int]) -> List:
+    """Log voted matchups in one insert; ``inline_projections`` maps list id -> bits. The caller commits.
+
+    Returns the events' (id, movie_list_id, user_id) rows.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "movie_list_id": matchup.movie_list_id,
+            "user_id": matchup.user_id,
+            "matchup_id": matchup.id,
+            "item_a_id": matchup.item_a_id,
+            "item_b_id": matchup.item_b_id,
+            "winner_id": matchup.winner_id,
+            "inline_projections": inline_projections[matchup.movie_list_id],
+            "created_at": now
+        }
+        for matchup in matchups
+    ]
+    if not rows:
+        return []
+    table = VoteEvent.__table__
+    return db.execute(table.insert().returning(table.c.id, table.c.movie_list_id, table.c.user_id), rows).all()
+
+def contiguous(events: List, after_id: int, now: Optional[datetime] = None) -> List:
+    """The leading events that can't have an earlier event still to commit (see GAP_TIMEOUT)"""
+    cutoff = (now or datetime.utcnow()) - GAP_TIMEOUT
+    expected = after_id + 1
+    for position, event in enumerate(events):
+        if event.id != expected and event.created_at > cutoff:
+            return events[:position]
+        expected = event.id + 1
+    return events
+
+def events_after(db: Session, after_id: int, limit: int) -> List:
+    """Up to ``limit`` events after ``after_id`` in log order, stopping at an open gap"""
+    # Plain rows; the projections only read their columns
+    events = db.execute(
+        select(*VoteEvent.__table__.c).where(VoteEvent.id > after_id).order_by(VoteEvent.id).limit(limit)
+    ).all()
+    return contiguous(events, after_id)
+
+def lock_checkpoint(db: Session, name: str, skip_locked: bool = False) -> Optional[ProjectionCheckpoint]:
+    """Load and row-lock a projection's checkpoint, creating it at the start of the log.
+
+    With ``skip_locked``, returns None if another transaction holds it.
+    """
+    insert_ignore(db, ProjectionCheckpoint, [{"name": name, "last_event_id": 0}], index_elements=["name"])
+    return db.scalars(
+        select(ProjectionCheckpoint)
+        .where(ProjectionCheckpoint.name == name)
+        .with_for_update(skip_locked=skip_locked)
+        .execution_options(populate_existing=True)
+    ).first()
+
+def covered(db: Session, name: str):
+    """Condition on vote_events for the events a projection's view includes right now.
+
+    That's everything up to its checkpoint, plus later events applied
+    inline. The checkpoint stays locked until the caller's transaction ends,
+    so the projector can't move it while the view is being rebuilt.
+    """
+    checkpoint = lock_checkpoint(db, name)
+    return or_(
+        VoteEvent.id <= checkpoint.last_event_id,
+        VoteEvent.inline_projections.op("&")(PROJECTIONS[name]) != 0
+    )
@@ -0,0 +1,227 @@
+"""
+Recording votes and applying their Elo updates.
+
+Both the single-vote and batch endpoints go through here, and the vote path
+is safe against concurrent requests for the same user (double taps, retries,
+two tabs):
+
+1. Score rows for every item involved are created with INSERT ... ON CONFLICT
+   DO NOTHING, backed by a unique constraint, so racing requests can't
+   create duplicates.
+2. Those rows are locked with SELECT ... FOR UPDATE in a fixed key order, so
+   concurrent votes touching the same items queue up instead of losing each
+   other's updates, and can't deadlock.
+3. Each matchup is claimed with a conditional UPDATE ... WHERE winner_id IS
+   NULL; only one request can win the claim.
+
+Every claimed vote is appended to the vote log (see vote_log). Scores are
+then updated in memory under the locks, with Elo or Glicko-2 depending on
+the list's rating model, and the caller commits everything in one
+transaction, together with the voter's matchup counts and the list's
+head-to-head counts (see pairwise). Glicko-2 lists also check whether the
+voter's ranking has settled (see glicko2.update_completion).
+
+Any of those derived views named in ASYNC_PROJECTIONS is skipped here and
+applied from the log in the background instead (see projections); steps 1
+and 2 only happen when scores are applied inline. With hot scores enabled,
+Elo updates skip them too and are queued for Redis instead, to be applied
+once the transaction commits (see hot_scores); the voter's session is
+locked first, so their votes on a hot list are logged in commit order.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from app.db.bulk import insert_ignore
+from app.db.models import Matchup, EloScore, MovieList, RatingModelEnum
+from app.services import elo, glicko2, hot_scores, matchmaking, pairwise, vote_log, voting_sessions
+
+ScoreKey = Tuple[int, int, int]  # (movie_list_id, user_id, movie_list_item_id)
+
+SCORE_KEY_COLUMNS = ('movie_list_id', 'user_id', 'movie_list_item_id')
+
+class VoteError(Exception):
+    """A vote that can't be recorded, with the HTTP status the API should answer with"""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def check_vote(matchup: Optional[Matchup], winner_id: int) -> None:
+    """Raise VoteError if ``winner_id`` can't be recorded on ``matchup``"""
+    if not matchup:
+        raise VoteError(404, "Matchup not found")
+    if matchup.winner_id is not None:
+        raise VoteError(400, "Matchup has already been voted on")
+    if winner_id not in [matchup.item_a_id, matchup.item_b_id]:
+        raise VoteError(400, "Winner must be one of the items in the matchup")
+
+def score_keys(matchup: Matchup) -> Tuple[ScoreKey, ScoreKey]:
+    return (
+        (matchup.movie_list_id, matchup.user_id, matchup.item_a_id),
+        (matchup.movie_list_id, matchup.user_id, matchup.item_b_id)
+    )
+
+def ensure_scores(db: Session, keys: Iterable[ScoreKey]) -> None:
+    """Create any missing score rows at the default score"""
+    insert_ignore(db, EloScore, [
+        dict(zip(SCORE_KEY_COLUMNS, key), score=elo.DEFAULT_SCORE)
+        for key in sorted(set(keys))
+    ], index_elements=SCORE_KEY_COLUMNS)
+
+def lock_scores(db: Session, keys: Iterable[ScoreKey]) -> Dict[ScoreKey, EloScore]:
+    """Load and row-lock the score rows for the given keys, in key order.
+
+    Rows already in the session are refreshed so updates are always applied
+    to the latest committed score.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    rows = db.scalars(
+        select(EloScore)
+        .where(tuple_(EloScore.movie_list_id, EloScore.user_id, EloScore.movie_list_item_id).in_(keys))
+        .order_by(EloScore.movie_list_id, EloScore.user_id, EloScore.movie_list_item_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    return {(row.movie_list_id, row.user_id, row.movie_list_item_id): row for row in rows}
+
+def claim_matchup(db: Session, matchup: Matchup, winner_id: int) -> bool:
+    """Atomically set the winner if nobody has voted on the matchup yet"""
+    voted_at = datetime.utcnow()
+    result = db.execute(
+        update(Matchup)
+        .where(Matchup.id == matchup.id, Matchup.winner_id == None)
+        .values(winner_id=winner_id, voted_at=voted_at)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    set_committed_value(matchup, "winner_id", winner_id)
+    set_committed_value(matchup, "voted_at", voted_at)
+    return True
+
+def claim_vote(db: Session, matchup: Matchup, winner_id: int) -> None:
+    """Check the vote and claim the matchup for it, raising VoteError if either fails"""
+    check_vote(matchup, winner_id)
+    if not claim_matchup(db, matchup, winner_id):
+        raise VoteError(400, "Matchup has already been voted on")
+
+def apply_scores(db: Session, votes: Sequence, scores: Optional[Dict[ScoreKey, EloScore]] = None) -> None:
+    """Apply votes' rating updates to the voters' score rows, in order. The caller commits.
+
+    ``votes`` are voted matchups or vote events. ``scores`` may already hold
+    the locked rows for their items (see ensure_scores and lock_scores);
+    otherwise they are created and locked here. Glicko-2 voters are then
+    checked for a settled ranking, once each (see glicko2.update_completion).
+    """
+    if not votes:
+        return
+    keys = {key for vote in votes for key in score_keys(vote)}
+    if scores is None or not keys <= scores.keys():
+        ensure_scores(db, keys)
+        scores = lock_scores(db, keys)
+    settling = set()
+    for vote in votes:
+        key_a, key_b = score_keys(vote)
+        score_a, score_b = scores[key_a], scores[key_b]
+        a_won = vote.winner_id == vote.item_a_id
+        # Lists are loaded once per session; later lookups come from the identity map
+        if rating_model_for(db.get(MovieList, vote.movie_list_id)) == RatingModelEnum.glicko2:
+            glicko2.apply_vote(score_a, score_b, a_won)
+            settling.add((vote.movie_list_id, vote.user_id))
+        else:
+            score_a.score, score_b.score = elo.updated_scores(score_a.score, score_b.score, a_won=a_won)
+    for movie_list_id, user_id in sorted(settling):
+        glicko2.update_completion(db, movie_list_id, user_id)
+
+def record_votes(db: Session, voted: List[Matchup], hot_lists: Set[int],
+                 scores: Optional[Dict[ScoreKey, EloScore]] = None) -> None:
+    """Log claimed votes and apply the projections that run inline (see vote_log).
+
+    Hot lists' votes are queued for Redis; the caller commits, then applies the queue.
+    """
+    inline = vote_log.inline_bits(*(name for name in vote_log.PROJECTIONS if vote_log.is_inline(name)))
+    # Redis keeps hot lists' scores, applied from the log once the votes commit, so those count as applied with the vote
+    hot = vote_log.PROJECTIONS["scores"]
+    hot_voters = {(m.movie_list_id, m.user_id) for m in voted if m.movie_list_id in hot_lists}
+    # Counting the votes locks the voters' sessions until commit, so a voter's later votes get later
+    # event ids and Redis can apply them in log order; without it, hot lists' voters are locked here
+    if vote_log.is_inline("progress"):
+        voting_sessions.add_completed_votes(db, voted)
+    else:
+        for movie_list_id in sorted({movie_list_id for movie_list_id, _ in hot_voters}):
+            voting_sessions.lock_voting_sessions(
+                db, movie_list_id, (user_id for list_id, user_id in hot_voters if list_id == movie_list_id)
+            )
+    events = vote_log.append(
+        db, voted, {m.movie_list_id: inline | (hot if m.movie_list_id in hot_lists else 0) for m in voted}
+    )
+    hot_scores.queue_votes(db, (event for event in events if (event.movie_list_id, event.user_id) in hot_voters))
+    if vote_log.is_inline("scores"):
+        apply_scores(db, [m for m in voted if m.movie_list_id not in hot_lists], scores)
+    if vote_log.is_inline("pairwise"):
+        pairwise.record_votes(db, voted)
+
+def rating_model_for(movie_list: Optional[MovieList]) -> RatingModelEnum:
+    return movie_list.rating_model if movie_list else RatingModelEnum.elo
+
+def cast_vote(db: Session, matchup_id: int, winner_id: int) -> Matchup:
+    """Record a single vote. Raises VoteError; the caller commits or rolls back."""
+    matchup = db.query(Matchup).filter(Matchup.id == matchup_id).first()
+    check_vote(matchup, winner_id)
+    movie_list = db.query(MovieList).filter(MovieList.id == matchup.movie_list_id).first()
+
+    hot_lists = {matchup.movie_list_id} if hot_scores.enabled_for(movie_list) else set()
+    scores = None
+    if not hot_lists and vote_log.is_inline("scores"):
+        keys = score_keys(matchup)
+        ensure_scores(db, keys)
+        scores = lock_scores(db, keys)
+    claim_vote(db, matchup, winner_id)
+    record_votes(db, [matchup], hot_lists, scores)
+
+    if movie_list:
+        matchmaking.record_vote(db, movie_list, matchup)
+    return matchup
+
+def cast_votes(db: Session, entries: List[Tuple[int, int]]) -> List[Optional[VoteError]]:
+    """Record an ordered batch of (matchup_id, winner_id) votes.
+
+    Returns one entry per vote: None if it was recorded, otherwise the
+    VoteError explaining why not. Failed entries don't affect the rest. The
+    caller commits.
+    """
+    matchups = {m.id: m for m in db.query(Matchup).filter(Matchup.id.in_({m_id for m_id, _ in entries}))}
+    list_ids = {m.movie_list_id for m in matchups.values()}
+    movie_lists = {l.id: l for l in db.query(MovieList).filter(MovieList.id.in_(list_ids))}
+
+    hot_lists = {l_id for l_id, l in movie_lists.items() if hot_scores.enabled_for(l)}
+    keys = [
+        key for m in matchups.values() if m.winner_id is None and m.movie_list_id not in hot_lists
+        for key in score_keys(m)
+    ] if vote_log.is_inline("scores") else []
+    ensure_scores(db, keys)
+    scores = lock_scores(db, keys)
+
+    results = []
+    voted = []
+    for matchup_id, winner_id in entries:
+        matchup = matchups.get(matchup_id)
+        try:
+            claim_vote(db, matchup, winner_id)
+        except VoteError as e:
+            results.append(e)
+            continue
+        movie_list = movie_lists.get(matchup.movie_list_id)
+        if movie_list:
+            matchmaking.record_vote(db, movie_list, matchup)
+        voted.append(matchup)
+        results.append(None)
+
+    # One log insert, and one counter update and convergence check per voter, for the whole batch
+    record_votes(db, voted, hot_lists, scores)
+    return results
@@ -0,0 +1,102 @@
+"""
+Per-(list, user) voting sessions.
+
+Besides mode-specific state, a session keeps running counts of the user's
+matchups so progress can be read from one row instead of counting matchups.
+Every path that creates, deletes or votes on matchups updates the counts in
+the same transaction, with atomic increments so concurrent requests don't
+lose updates.
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.orm import Session
+from app.db.bulk import insert_ignore, upsert_increment
+from app.db.models import Matchup, VotingSession
+
+def get_voting_session(db: Session, movie_list_id: int, user_id: int, for_update: bool = False) -> Optional[VotingSession]:
+    query = db.query(VotingSession).filter(
+        VotingSession.movie_list_id == movie_list_id,
+        VotingSession.user_id == user_id
+    )
+    if for_update:
+        # Locking reads must see the latest row, not a copy already in the session
+        query = query.with_for_update().populate_existing()
+    return query.first()
+
+def lock_voting_sessions(db: Session, movie_list_id: int, user_ids: Iterable[int]) -> List[VotingSession]:
+    """Row-lock the given users' sessions for a list in one query, in user order"""
+    return db.query(VotingSession).filter(
+        VotingSession.movie_list_id == movie_list_id,
+        VotingSession.user_id.in_(set(user_ids))
+    ).order_by(VotingSession.user_id).with_for_update().populate_existing().all()
+
+def get_or_create_voting_session(db: Session, movie_list_id: int, user_id: int, for_update: bool = False) -> VotingSession:
+    """Load the user's voting session for a list, creating it if needed"""
+    session = get_voting_session(db, movie_list_id, user_id, for_update=for_update)
+    if session is None:
+        # Concurrent requests may both get here; only one row is created
+        insert_ignore(db, VotingSession, [{
+            "movie_list_id": movie_list_id,
+            "user_id": user_id,
+            "created_at": datetime.utcnow()
+        }], index_elements=["movie_list_id", "user_id"])
+        session = get_voting_session(db, movie_list_id, user_id, for_update=for_update)
+    return session
+
+def add_to_counts(db: Session, movie_list_id: int, user_id: int, total: int = 0, completed: int = 0) -> None:
+    """Add to the user's matchup counts, creating the session row if needed"""
+    add_to_many_counts(db, {(movie_list_id, user_id): (total, completed)})
+
+def add_to_many_counts(db: Session, counts: Dict[Tuple[int, int], Tuple[int, int]]) -> None:
+    """Add (total, completed) to each (list id, user id) session's matchup counts in one upsert,
+    creating rows as needed. Rows are written in key order, so concurrent callers lock them in the same order.
+    """
+    now = datetime.utcnow()
+    upsert_increment(db, VotingSession, [{
+        "movie_list_id": movie_list_id,
+        "user_id": user_id,
+        "total_matchups": total,
+        "completed_matchups": completed,
+        "created_at": now,
+        "updated_at": now
+    } for (movie_list_id, user_id), (total, completed) in sorted(counts.items()) if total or completed],
+        index_elements=["movie_list_id", "user_id"],
+        increment_columns=["total_matchups", "completed_matchups"], update_columns=["updated_at"])
+
+def touch(db: Session, keys: Iterable[Tuple[int, int]]) -> None:
+    """Bump the (list id, user id) sessions' updated_at so cached standings notice changed scores (see borda)"""
+    keys = sorted(set(keys))
+    if keys:
+        db.execute(
+            update(VotingSession)
+            .where(tuple_(VotingSession.movie_list_id, VotingSession.user_id).in_(keys))
+            .values(updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+
+def add_completed_votes(db: Session, votes: Iterable) -> None:
+    """Count voted matchups or vote events towards their voters' completed matchups. The caller commits."""
+    counts = Counter((vote.movie_list_id, vote.user_id) for vote in votes)
+    add_to_many_counts(db, {key: (0, count) for key, count in counts.items()})
+
+def count_matchups(db: Session, movie_list_id: int, user_id: int) -> Tuple[int, int]:
+    """Count the user's (total, completed) matchups with a single aggregate query"""
+    total, completed = db.execute(
+        select(func.count(), func.count().filter(Matchup.winner_id != None)).where(
+            Matchup.movie_list_id == movie_list_id,
+            Matchup.user_id == user_id
+        )
+    ).one()
+    return total, completed
+
+def matchup_counts(db: Session, movie_list_id: int, user_id: int,
+                   session: Optional[VotingSession] = None) -> Tuple[int, int]:
+    """The user's (total, completed) matchups, from the session counters when there is a session"""
+    if session is None:
+        session = get_voting_session(db, movie_list_id, user_id)
+    if session is None:
+        return count_matchups(db, movie_list_id, user_id)
+    return session.total_matchups, session.completed_matchups
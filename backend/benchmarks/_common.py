@@ -0,0 +1,122 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway database (a temporary SQLite file by
+default) so they can be run anywhere; pass --database-url to point them at a
+scratch Postgres instead.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from app.db.base import async_database_url
+from app.db.models import Base, User, MovieList, MovieListItem, ListTypeEnum, MediaTypeEnum, ListStatusEnum
+
+def add_database_argument(parser):
+    parser.add_argument(
+        "--database-url",
+        default=None,
+        help="Scratch database to benchmark against (default: temporary SQLite file)"
+    )
+
+def make_engine(database_url=None):
+    """Create an engine with a fresh schema"""
+    if database_url is None:
+        fd, path = tempfile.mkstemp(suffix=".db", prefix="rnkd-bench-")
+        os.close(fd)
+        database_url = f"sqlite:///{path}"
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return engine
+
+def make_session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def make_api_db_override(engine):
+    """A get_db override pointing the API at ``engine``'s database; returns (override, async_engine).
+
+    Count the API's statements with QueryCounter(async_engine). Pooled
+    connections belong to one event loop, so drive the API with a
+    ``with TestClient(app) as client:`` block, which keeps a single loop.
+    """
+    async_engine = create_async_engine(async_database_url(engine.url.render_as_string(hide_password=False)))
+    AsyncSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with AsyncSession() as db:
+            yield db
+
+    return override_get_db, async_engine
+
+class QueryCounter:
+    """Counts statements sent to the database while active"""
+    def __init__(self, engine):
+        # Async engines emit their events on the sync engine they wrap
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+@contextmanager
+def timed():
+    """Yield a dict whose 'seconds' key is filled in when the block exits"""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
+
+def create_users(db, count):
+    """Create ``count`` benchmark users and return their ids"""
+    users = [User(name=f"Bench User {i}", email=f"bench{i}@example.com", password_hash="x") for i in range(count)]
+    db.add_all(users)
+    db.commit()
+    return [user.id for user in users]
+
+def create_list(db, item_count, created_by_user_id, group_id=None, **list_fields):
+    """Create a movie list with ``item_count`` items and return (list_id, item_ids)"""
+    movie_list = MovieList(
+        name=f"Bench list ({item_count} items)",
+        group_id=group_id,
+        created_by_user_id=created_by_user_id,
+        type=ListTypeEnum.group if group_id else ListTypeEnum.personal,
+        media_type=MediaTypeEnum.movie,
+        status=ListStatusEnum.voting,
+        **list_fields
+    )
+    db.add(movie_list)
+    db.commit()
+    db.execute(insert(MovieListItem), [
+        {"movie_list_id": movie_list.id, "external_id": str(i), "title": f"Movie {i}"}
+        for i in range(item_count)
+    ])
+    db.commit()
+    item_ids = [item_id for (item_id,) in db.query(MovieListItem.id).filter(
+        MovieListItem.movie_list_id == movie_list.id
+    ).order_by(MovieListItem.id)]
+    return movie_list.id, item_ids
+
+def print_table(headers, rows):
+    """Print rows as a simple aligned text table"""
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(row, widths)))
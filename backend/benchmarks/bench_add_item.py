@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Compare bringing an item added mid-voting into an exhaustive group list by
+re-running generate_matchups for every member (a full O(n^2) pair diff each)
+against the incremental path used by the API, which only writes the n - 1
+new pairs per member.
+
+Every member has generated their matchups before the item is added. For the
+incremental path we time list_items.add_item_in_background, the task the
+add-item endpoint schedules; the request itself only inserts the item.
+
+Usage: python benchmarks/bench_add_item.py [--items 300] [--members 20]
+"""
+
+import argparse
+
+from sqlalchemy import func
+from _common import add_database_argument, make_engine, make_session_factory, QueryCounter, timed, create_users, create_list, print_table
+from app.db.models import Matchup, MovieListItem, VotingModeEnum
+from app.services import list_items, matchups as matchups_service
+
+def setup(Session, items, members):
+    """A list whose members all have their matchups, plus a freshly added item"""
+    with Session() as db:
+        user_ids = create_users(db, members)
+        list_id, item_ids = create_list(db, items, user_ids[0], voting_mode=VotingModeEnum.exhaustive)
+        for user_id in user_ids:
+            matchups_service.bulk_insert_matchups(db, list_id, user_id, matchups_service.missing_pairs(item_ids, set()))
+        item = MovieListItem(movie_list_id=list_id, external_id="wildcard", title="Wildcard")
+        db.add(item)
+        db.commit()
+        return user_ids, list_id, item.id
+
+def regenerate(Session, list_id, user_ids):
+    with Session() as db:
+        item_ids = matchups_service.list_item_ids(db, list_id)
+        for user_id in user_ids:
+            existing = matchups_service.existing_pairs(db, list_id, user_id)
+            matchups_service.bulk_insert_matchups(db, list_id, user_id, matchups_service.missing_pairs(item_ids, existing))
+        db.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=300)
+    parser.add_argument("--members", type=int, default=20)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    rows = []
+    for name in ("regenerate", "incremental"):
+        engine = make_engine(args.database_url)
+        Session = make_session_factory(engine)
+        list_items.SessionLocal = Session
+        user_ids, list_id, item_id = setup(Session, args.items, args.members)
+        with Session() as db:
+            before = db.query(func.count(Matchup.id)).scalar()
+
+        with QueryCounter(engine) as queries, timed() as elapsed:
+            if name == "regenerate":
+                regenerate(Session, list_id, user_ids)
+            else:
+                list_items.add_item_in_background(list_id, item_id)
+
+        with Session() as db:
+            created = db.query(func.count(Matchup.id)).scalar() - before
+        rows.append((name, f"{elapsed['seconds'] * 1000:.0f}", queries.count, created))
+        engine.dispose()
+
+    print(f"{args.items} items + 1, {args.members} members")
+    print_table(["approach", "ms", "queries", "matchups created"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Compare vote throughput of single-vote calls against POST /voting/votes:batch.
+
+Both run through the API (FastAPI TestClient) on the same generated list so
+request handling, validation and the Elo update are all included.
+
+Usage: python benchmarks/bench_batch_votes.py [--items 60] [--votes 1000] [--batch-sizes 10 50 200]
+"""
+
+import argparse
+import random
+
+from fastapi.testclient import TestClient
+from _common import add_database_argument, make_engine, make_session_factory, make_api_db_override, QueryCounter, timed, create_users, create_list, print_table
+from app.main import app
+from app.db.base import get_db
+from app.db.models import Matchup
+from app.services import matchups as matchups_service
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=60)
+    parser.add_argument("--votes", type=int, default=1000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 50, 200])
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+
+    app.dependency_overrides[get_db], api_engine = make_api_db_override(engine)
+    rng = random.Random(7)
+
+    def fresh_votes(db, user_id):
+        list_id, item_ids = create_list(db, args.items, user_id)
+        pairs = matchups_service.missing_pairs(item_ids, set())
+        matchups_service.bulk_insert_matchups(db, list_id, user_id, pairs)
+        db.commit()
+        rows = db.query(Matchup.id, Matchup.item_a_id, Matchup.item_b_id).filter(
+            Matchup.movie_list_id == list_id
+        ).order_by(Matchup.id).limit(args.votes).all()
+        return [{"matchup_id": m_id, "winner_id": rng.choice((a, b))} for m_id, a, b in rows]
+
+    rows = []
+    with Session() as db, TestClient(app) as client:
+        user_id = create_users(db, 1)[0]
+
+        planned = fresh_votes(db, user_id)
+        with QueryCounter(api_engine) as counter, timed() as t:
+            for vote in planned:
+                r = client.post(f"/api/v1/voting/matchups/{vote['matchup_id']}/vote", params={"winner_id": vote["winner_id"]})
+                assert r.status_code == 200, r.text
+        rows.append(("single", len(planned), f"{t['seconds']:.2f}", round(len(planned) / t["seconds"]), f"{counter.count / len(planned):.2f}"))
+
+        for batch_size in args.batch_sizes:
+            planned = fresh_votes(db, user_id)
+            with QueryCounter(api_engine) as counter, timed() as t:
+                for start in range(0, len(planned), batch_size):
+                    r = client.post("/api/v1/voting/votes:batch", json={"votes": planned[start:start + batch_size]})
+                    assert r.status_code == 200 and r.json()["failed"] == 0, r.text
+            rows.append((f"batch of {batch_size}", len(planned), f"{t['seconds']:.2f}", round(len(planned) / t["seconds"]), f"{counter.count / len(planned):.2f}"))
+
+    print_table(["mode", "votes", "seconds", "votes/s", "queries/vote"], rows)
+
+if __name__ == "__main__":
+    main()
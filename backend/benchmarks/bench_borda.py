@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Measure the Borda results for a large community list: a cold build over every
+voter, a request with nothing changed, and a request after a few voters
+voted (which only re-ranks those voters), against rebuilding from scratch.
+
+Scores are written directly as random EloScore rows with a voting session per
+voter; a "vote" bumps the voter's session and moves two of their scores.
+
+Usage: python benchmarks/bench_borda.py [--items 100] [--voters 3000] [--changed 1 10 100]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert, update
+from _common import add_database_argument, make_engine, make_session_factory, QueryCounter, timed, create_users, create_list, print_table
+from app.db.models import EloScore, VotingSession
+from app.services import borda, consensus
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--voters", type=int, default=3000)
+    parser.add_argument("--changed", type=int, nargs="+", default=[1, 10, 100])
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+    rng = np.random.default_rng(0)
+    started = datetime.utcnow()
+
+    with Session() as db:
+        user_ids = create_users(db, args.voters)
+        list_id, item_ids = create_list(db, args.items, user_ids[0])
+        db.execute(insert(VotingSession), [
+            {"movie_list_id": list_id, "user_id": user_id, "total_matchups": 1, "completed_matchups": 1,
+             "created_at": started, "updated_at": started}
+            for user_id in user_ids
+        ])
+        scores = 1200 + rng.normal(0, 100, (args.voters, args.items)).round(1)
+        rows = [
+            {"movie_list_id": list_id, "user_id": user_id, "movie_list_item_id": item_id, "score": score}
+            for user_id, user_scores in zip(user_ids, scores.tolist())
+            for item_id, score in zip(item_ids, user_scores)
+        ]
+        for start in range(0, len(rows), 10000):
+            db.execute(insert(EloScore), rows[start:start + 10000])
+        db.commit()
+
+    def measure(name):
+        with Session() as db, QueryCounter(engine) as queries, timed() as elapsed:
+            # What consensus.results does for a Borda list
+            standings = borda.list_standings(db, list_id)
+            consensus.rank_items(standings.item_ids, standings.totals)
+        return name, f"{elapsed['seconds'] * 1000:.1f}", queries.count
+
+    rows = [measure("cold build"), measure("unchanged")]
+    for step, count in enumerate(args.changed, start=1):
+        voters = rng.choice(user_ids, count, replace=False).tolist()
+        with Session() as db:
+            for user_id in voters:
+                a, b = rng.choice(item_ids, 2, replace=False).tolist()
+                for item_id, delta in ((a, 16), (b, -16)):
+                    db.execute(update(EloScore).where(
+                        EloScore.movie_list_id == list_id, EloScore.user_id == user_id, EloScore.movie_list_item_id == item_id
+                    ).values(score=EloScore.score + delta))
+            db.execute(update(VotingSession).where(
+                VotingSession.movie_list_id == list_id, VotingSession.user_id.in_(voters)
+            ).values(updated_at=started + timedelta(seconds=step)))
+            db.commit()
+        rows.append(measure(f"{count} voters changed"))
+        incremental = borda._cache[list_id].totals.copy()
+        borda._cache.clear()
+        rows.append(measure("  full rebuild"))
+        assert np.array_equal(incremental, borda._cache[list_id].totals)
+
+    print(f"{args.items} items, {args.voters} voters")
+    print_table(["request", "ms", "queries"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark Bradley-Terry fits (app/services/bradley_terry.py).
+
+Simulates --users users each casting --votes-per-user votes on a list of
+--items items (votes follow hidden true strengths), then times
+  * one fit per user,
+  * one group fit over every user's votes, and
+  * a warm-started group refit after 1% more votes arrive,
+and reports how well each fit recovers the true ranking.
+
+Usage: python benchmarks/bench_bradley_terry.py [--items 1000] [--users 100] [--votes-per-user 10000]
+"""
+
+import argparse
+
+import numpy as np
+from _common import timed, print_table
+from app.services.bradley_terry import fit_strengths
+
+def simulate_votes(rng, true_log_strength, count):
+    n = len(true_log_strength)
+    a = rng.integers(0, n, size=count)
+    b = (a + rng.integers(1, n, size=count)) % n
+    p_a = 1 / (1 + np.exp(true_log_strength[b] - true_log_strength[a]))
+    a_won = rng.random(count) < p_a
+    return np.where(a_won, a, b), np.where(a_won, b, a)
+
+def spearman(x, y):
+    rx = np.argsort(np.argsort(x))
+    ry = np.argsort(np.argsort(y))
+    return np.corrcoef(rx, ry)[0, 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--votes-per-user", type=int, default=10000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    shared_taste = rng.normal(0, 1.5, args.items)
+    per_user = []
+    for _ in range(args.users):
+        taste = shared_taste + rng.normal(0, 0.5, args.items)
+        per_user.append((taste, *simulate_votes(rng, taste, args.votes_per_user)))
+
+    rows = []
+    iterations = []
+    with timed() as t:
+        for taste, winners, losers in per_user:
+            strengths, its = fit_strengths(winners, losers, args.items)
+            iterations.append(its)
+    rho = spearman(strengths, per_user[-1][0])
+    rows.append((f"per user x{args.users}", f"{args.votes_per_user:,} each", f"{t['seconds']:.2f}s",
+                 f"{t['seconds'] / args.users * 1000:.1f}ms", round(float(np.mean(iterations))), f"{rho:.3f}"))
+
+    winners = np.concatenate([w for _, w, _ in per_user])
+    losers = np.concatenate([l for _, _, l in per_user])
+    with timed() as t:
+        group, its = fit_strengths(winners, losers, args.items)
+    rows.append(("group", f"{len(winners):,}", f"{t['seconds']:.2f}s", "-", its, f"{spearman(group, shared_taste):.3f}"))
+
+    extra_w, extra_l = simulate_votes(rng, shared_taste, len(winners) // 100)
+    with timed() as t:
+        _, its = fit_strengths(np.concatenate([winners, extra_w]), np.concatenate([losers, extra_l]), args.items, init=group)
+    rows.append(("group refit (+1%, warm)", f"{len(winners) + len(extra_w):,}", f"{t['seconds']:.2f}s", "-", its, "-"))
+
+    print(f"{args.items} items x {args.users} users")
+    print_table(["fit", "votes", "total", "per fit", "iterations", "spearman vs truth"], rows)
+
+if __name__ == "__main__":
+    main()
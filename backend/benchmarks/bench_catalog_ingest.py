@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading TMDB ID exports into the movie catalog.
+
+Writes synthetic gzipped exports shaped like TMDB's daily ones and ingests
+them, each in a fresh process so its peak memory can be read:
+  - a first load of --movies / 10 movies and one of --movies, to show
+    memory doesn't grow with the file
+  - the next day's export, where every popularity drifts a little,
+    --rerank-share of them by far more, and --churn-share of the movies
+    are retitled, removed or new
+  - the previous export again, as one more daily refresh
+  - the next day's export upserted row by row in batches of 5000, no diff
+and we report the time, lines a second, rows written, WAL written (on
+Postgres), peak RSS and how much of it the ingest added to the process.
+
+Usage: python benchmarks/bench_catalog_ingest.py [--movies 1000000] [--rerank-share 0.05] [--churn-share 0.005] [--database-url postgresql://...]
+"""
+
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session
+from _common import add_database_argument, make_engine, print_table
+from app.db.bulk import upsert
+from app.db.models import CatalogMovie
+from app.services import catalog_ingest
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ber", "dan", "gor", "hel", "jin", "mar", "nos"]
+
+def make_movies(rng, count):
+    words = ["".join(rng.choice(SYLLABLES, size=rng.integers(1, 4))).capitalize() for _ in range(5000)]
+    picks = rng.integers(0, len(words), size=(count, 3))
+    lengths = rng.integers(1, 4, size=count)
+    return {
+        movie_id: [" ".join(words[i] for i in picks[row, :lengths[row]]), float(popularity), bool(adult)]
+        for row, (movie_id, popularity, adult) in enumerate(zip(
+            rng.choice(count * 2, size=count, replace=False) + 1,
+            rng.lognormal(mean=0.5, sigma=1.5, size=count).round(3),
+            rng.random(count) < 0.02
+        ))
+    }
+
+def next_day(rng, movies, rerank_share, churn_share):
+    movies = {movie_id: list(movie) for movie_id, movie in movies.items()}
+    ids = np.fromiter(movies, dtype=np.int64)
+    for movie_id, drift in zip(ids, rng.lognormal(0, 0.02, size=len(ids))):
+        movies[movie_id][1] = round(movies[movie_id][1] * drift, 3)
+    for movie_id in rng.choice(ids, size=int(len(ids) * rerank_share), replace=False):
+        movies[movie_id][1] = round(movies[movie_id][1] * float(rng.lognormal(0, 1)) + 1, 3)
+    churn = int(len(ids) * churn_share)
+    for movie_id in rng.choice(ids, size=churn, replace=False):
+        movies[movie_id][0] += " (Director's Cut)"
+    for movie_id in rng.choice(ids, size=churn, replace=False):
+        movies.pop(movie_id, None)
+    for movie_id in range(int(ids.max()) + 1, int(ids.max()) + 1 + churn):
+        movies[movie_id] = [f"New Release {movie_id}", 10.0, False]
+    return movies
+
+def write_export(movies, directory, name):
+    path = os.path.join(directory, name)
+    with gzip.open(path, "wt", compresslevel=6) as export:
+        for movie_id, (title, popularity, adult) in movies.items():
+            export.write(json.dumps({"adult": adult, "id": int(movie_id), "original_title": title,
+                                     "popularity": popularity, "video": False}) + "\n")
+    return path
+
+def wal_position(engine):
+    if engine.dialect.name != "postgresql":
+        return None
+    with engine.connect() as connection:
+        return connection.scalar(text("SELECT pg_current_wal_lsn()"))
+
+def wal_bytes(engine, since):
+    if since is None:
+        return "-"
+    with engine.connect() as connection:
+        written = connection.scalar(text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), :since)"), {"since": since})
+    return f"{written / 2**20:.0f} MiB"
+
+def rss_bytes():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def sample_peak_rss(peak, done):
+    while not done.wait(0.005):
+        peak[0] = max(peak[0], rss_bytes())
+
+def ingest(database_url, path, naive, results):
+    """Runs in a fresh child process, with a thread sampling its memory use"""
+    engine = create_engine(database_url)
+    baseline = rss_bytes()
+    peak, done = [baseline], threading.Event()
+    sampler = threading.Thread(target=sample_peak_rss, args=(peak, done))
+    sampler.start()
+    start = time.perf_counter()
+    with Session(engine) as db:
+        if naive:
+            written = 0
+            batch = []
+            with gzip.open(path, "rt") as lines:
+                for line in lines:
+                    movie = catalog_ingest.parse_line(line)
+                    batch.append({"id": movie[0], "title": movie[1], "popularity": movie[2], "adult": movie[3],
+                                  "snapshot_id": results["snapshot_id"]})
+                    if len(batch) == 5000:
+                        upsert(db, CatalogMovie, batch, ["id"])
+                        written += len(batch)
+                        batch = []
+            upsert(db, CatalogMovie, batch, ["id"])
+            written += len(batch)
+        else:
+            snapshot = catalog_ingest.ingest_export(db, path, allow_shrink=True)
+            written = snapshot.inserted + snapshot.updated + snapshot.removed
+            results["snapshot_id"] = snapshot.id
+        db.commit()
+    results["seconds"] = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    results["written"] = written
+    results["peak_rss"] = peak[0]
+    results["growth"] = peak[0] - baseline
+
+def run(engine, label, path, lines, naive=False, snapshot_id=None):
+    # Spawned rather than forked, so the child doesn't start with this process's exports in memory
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict(snapshot_id=snapshot_id)
+        before = wal_position(engine)
+        child = context.Process(
+            target=ingest, args=(engine.url.render_as_string(hide_password=False), path, naive, results)
+        )
+        child.start()
+        child.join()
+        results = dict(results)
+    return results, (label, lines, f"{results['seconds']:.1f}", f"{lines / results['seconds']:,.0f}",
+                      f"{results['written']:,}", wal_bytes(engine, before), f"{results['peak_rss'] / 2**20:.0f} MiB",
+                      f"{results['growth'] / 2**20:.0f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=1000000)
+    parser.add_argument("--rerank-share", type=float, default=0.05, help="Movies whose popularity changes a lot overnight")
+    parser.add_argument("--churn-share", type=float, default=0.005, help="Movies retitled, and as many removed and added")
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    directory = tempfile.mkdtemp(prefix="rnkd-catalog-")
+    small = make_movies(rng, args.movies // 10)
+    day_one = make_movies(rng, args.movies)
+    day_two = next_day(rng, day_one, args.rerank_share, args.churn_share)
+    paths = {name: write_export(movies, directory, f"{name}.json.gz")
+             for name, movies in (("small", small), ("day_one", day_one), ("day_two", day_two))}
+    print(f"exports: {', '.join(f'{name} {os.path.getsize(path) / 2**20:.1f} MiB' for name, path in paths.items())}")
+
+    rows = []
+    engine = make_engine(args.database_url)
+    _, row = run(engine, "first load, small", paths["small"], len(small))
+    rows.append(row)
+    engine = make_engine(args.database_url)
+    _, row = run(engine, "first load", paths["day_one"], len(day_one))
+    rows.append(row)
+    results, row = run(engine, "next day", paths["day_two"], len(day_two))
+    rows.append(row)
+    _, row = run(engine, "day before again", paths["day_one"], len(day_one))
+    rows.append(row)
+    _, row = run(engine, "upsert every row", paths["day_two"], len(day_two), naive=True, snapshot_id=results["snapshot_id"])
+    rows.append(row)
+    with Session(engine) as db:
+        live = db.scalar(select(func.count()).select_from(CatalogMovie).where(CatalogMovie.removed_at.is_(None)))
+    print(f"{engine.dialect.name}, {live:,} live movies in the catalog")
+    print_table(["run", "lines", "s", "lines/s", "rows written", "WAL", "peak RSS", "RSS growth"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Time the consensus methods on a users x items ranking matrix, inline and
+through the process pool the results endpoint uses for large inputs.
+
+Voters rank items by a shared "true" quality plus personal noise, so there
+is a consensus to find but plenty of disagreement. Preference matrix is
+the items x items input Copeland, Schulze and Kemeny share; the pool
+column includes shipping the matrix to a worker and back.
+
+Usage: python benchmarks/bench_consensus.py [--items 500] [--voters 1000]
+"""
+
+import argparse
+import asyncio
+
+import numpy as np
+from _common import timed, print_table
+from app.db.models import ConsensusMethodEnum
+from app.services import consensus
+from app.services.borda import borda_points
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--voters", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=1.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    quality = rng.normal(0, 1, args.items)
+    scores = quality + rng.normal(0, args.noise, (args.voters, args.items))
+    with timed() as t:
+        points = borda_points(scores)
+    rows = [("borda points", f"{t['seconds'] * 1000:.0f}", "")]
+
+    with timed() as t:
+        preferences = consensus.preference_matrix(points)
+    rows.append(("preference matrix", f"{t['seconds'] * 1000:.0f}", ""))
+
+    # Warm the pool up so worker start-up isn't counted
+    consensus._get_pool().submit(abs, 1).result()
+
+    truth = np.argsort(-quality)
+    for method in ConsensusMethodEnum:
+        with timed() as inline:
+            result = consensus.method_scores(method, points)
+        consensus.POOL_THRESHOLD = 0
+        with timed() as pooled:
+            asyncio.run(consensus.compute_scores(method, points))
+        order = np.lexsort((np.arange(args.items), -result))
+        top = len(set(order[:10].tolist()) & set(truth[:10].tolist()))
+        rows.append((method.value, f"{inline['seconds'] * 1000:.0f}", f"{pooled['seconds'] * 1000:.0f}", f"{top}/10"))
+    consensus.shutdown_pool()
+
+    kemeny = consensus.method_scores(ConsensusMethodEnum.kemeny, points)
+    copeland = consensus.copeland_scores(preferences)
+
+    def disagreements(scores):
+        order = np.lexsort((np.arange(args.items), -scores))
+        rank = np.empty(args.items, dtype=np.int64)
+        rank[order] = np.arange(args.items)
+        placed_above = rank[:, None] < rank[None, :]
+        return int(preferences.T[placed_above].sum())
+
+    print(f"{args.items} items, {args.voters} voters")
+    print_table(["step", "inline ms", "pool ms", "true top 10 found"], [row + ("",) * (4 - len(row)) for row in rows])
+    print(f"Kemeny disagreements: Copeland start {disagreements(copeland)}, after local search {disagreements(kemeny)}")
+
+if __name__ == "__main__":
+    main()
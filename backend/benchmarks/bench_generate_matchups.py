@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark matchup generation: the original per-pair existence query loop
+versus the set-based bulk generation used by POST /voting/matchups/{id}/generate,
+which runs through the API (FastAPI TestClient).
+
+Usage: python benchmarks/bench_generate_matchups.py [--sizes 50 200 1000] [--legacy-max 200]
+"""
+
+import argparse
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from _common import add_database_argument, make_engine, make_session_factory, make_api_db_override, QueryCounter, timed, create_users, create_list, print_table
+from app.db.base import get_db
+from app.db.models import Matchup, MovieListItem
+from app.main import app
+
+def legacy_generate(db, movie_list_id, user_id):
+    """The original implementation: one SELECT per pair, one ORM add per row"""
+    items = db.query(MovieListItem).filter(MovieListItem.movie_list_id == movie_list_id).all()
+    created = 0
+    for i in range(len(items) - 1):
+        for j in range(i + 1, len(items)):
+            existing = db.query(Matchup).filter(
+                Matchup.movie_list_id == movie_list_id,
+                Matchup.user_id == user_id,
+                Matchup.item_a_id == items[i].id,
+                Matchup.item_b_id == items[j].id
+            ).first()
+            if not existing:
+                db.add(Matchup(
+                    movie_list_id=movie_list_id, user_id=user_id,
+                    item_a_id=items[i].id, item_b_id=items[j].id,
+                    winner_id=None, created_at=datetime.utcnow()
+                ))
+                created += 1
+    db.commit()
+    return created
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--legacy-max", type=int, default=200, help="Skip the legacy loop above this many items")
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+    app.dependency_overrides[get_db], api_engine = make_api_db_override(engine)
+
+    def generate(list_id, user_id):
+        r = client.post(f"/api/v1/voting/matchups/{list_id}/generate", params={"user_id": user_id})
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    rows = []
+    with Session() as db, TestClient(app) as client:
+        user_ids = create_users(db, 2)
+        for size in args.sizes:
+            list_id, _ = create_list(db, size, user_ids[0])
+            pairs = size * (size - 1) // 2
+
+            if size <= args.legacy_max:
+                with QueryCounter(engine) as counter, timed() as t:
+                    legacy_generate(db, list_id, user_ids[0])
+                rows.append((size, pairs, "legacy", counter.count, f"{t['seconds']:.3f}"))
+            else:
+                rows.append((size, pairs, "legacy", "skipped", "-"))
+
+            with QueryCounter(api_engine) as counter, timed() as t:
+                summary = generate(list_id, user_ids[1])
+            assert summary["created"] == pairs
+            rows.append((size, pairs, "bulk", counter.count, f"{t['seconds']:.3f}"))
+
+            # Re-running generation is a no-op diff
+            with QueryCounter(api_engine) as counter, timed() as t:
+                summary = generate(list_id, user_ids[1])
+            assert summary["created"] == 0
+            rows.append((size, pairs, "bulk (rerun)", counter.count, f"{t['seconds']:.3f}"))
+
+    print_table(["items", "pairs", "strategy", "queries", "seconds"], rows)
+
+if __name__ == "__main__":
+    main()
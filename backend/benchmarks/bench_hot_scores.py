@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compare the vote path with Elo scores in Postgres against hot scores in
+Redis, for a group voting night: every member votes on their own matchups
+from their own thread, one vote per request.
+
+Both modes replay exactly the same votes on identical lists; we time them,
+count the statements sent to the database per vote, time the write-behind
+flush of the Redis run and check both lists end up with identical scores.
+
+Needs a scratch Redis (the given database is flushed):
+
+Usage: python benchmarks/bench_hot_scores.py [--items 40] [--members 12] [--votes 200] [--redis-url redis://localhost:6379/15]
+"""
+
+import argparse
+import random
+import threading
+
+import redis
+from _common import add_database_argument, make_engine, make_session_factory, QueryCounter, timed, create_users, create_list, print_table
+from app.core.config import settings
+from app.db.models import EloScore, Matchup
+from app.services import hot_scores, votes, matchups as matchups_service
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--members", type=int, default=12, help="Voting threads; keep within the engine's connection pool")
+    parser.add_argument("--votes", type=int, default=200, help="Votes per member")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+    client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    client.flushdb()
+    hot_scores.set_client(client)
+    hot_scores.SessionLocal = Session
+
+    def prepare():
+        """An identical list for each run; returns (list_id, planned votes per member in id order)"""
+        with Session() as db:
+            list_id, item_ids = create_list(db, args.items, user_ids[0])
+            pairs = matchups_service.missing_pairs(item_ids, set())
+            for user_id in user_ids:
+                matchups_service.bulk_insert_matchups(db, list_id, user_id, pairs)
+            db.commit()
+            plans = []
+            for user_id in user_ids:
+                ids = [m_id for (m_id,) in db.query(Matchup.id).filter(
+                    Matchup.movie_list_id == list_id, Matchup.user_id == user_id).order_by(Matchup.id)]
+                rows = {m.id: m for m in db.query(Matchup).filter(Matchup.id.in_(ids))}
+                rng = random.Random(user_id)
+                chosen = rng.sample(range(len(ids)), min(args.votes, len(ids)))
+                plans.append([(ids[i], rng.choice((rows[ids[i]].item_a_id, rows[ids[i]].item_b_id))) for i in chosen])
+        return list_id, plans
+
+    def run(plans):
+        def member(plan):
+            for matchup_id, winner_id in plan:
+                with Session() as db:
+                    votes.cast_vote(db, matchup_id, winner_id)
+                    db.commit()
+                    hot_scores.apply_queued(db)
+        threads = [threading.Thread(target=member, args=(plan,)) for plan in plans]
+        with QueryCounter(engine) as queries, timed() as elapsed:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return elapsed["seconds"], queries.count
+
+    def final_scores(list_id):
+        with Session() as db:
+            rows = db.query(EloScore.user_id, EloScore.movie_list_item_id, EloScore.score).filter(
+                EloScore.movie_list_id == list_id).order_by(EloScore.user_id, EloScore.movie_list_item_id).all()
+        return [score for _, _, score in rows]
+
+    with Session() as db:
+        user_ids = create_users(db, args.members)
+
+    rows = []
+    settings.HOT_SCORES_ENABLED = False
+    cold_list, plans = prepare()
+    total_votes = sum(len(plan) for plan in plans)
+    seconds, queries = run(plans)
+    rows.append(("postgres", f"{seconds * 1000:.0f}", f"{total_votes / seconds:.0f}", f"{queries / total_votes:.1f}", "-"))
+
+    settings.HOT_SCORES_ENABLED = True
+    hot_list, plans = prepare()
+    seconds, queries = run(plans)
+    with Session() as db, timed() as flush_time:
+        hot_scores.flush(db)
+    rows.append(("redis", f"{seconds * 1000:.0f}", f"{total_votes / seconds:.0f}", f"{queries / total_votes:.1f}",
+                 f"{flush_time['seconds'] * 1000:.0f}"))
+
+    print(f"{args.members} members x {args.votes} votes on {args.items} items")
+    print_table(["scores in", "ms", "votes/s", "statements/vote", "flush ms"], rows)
+    print("final scores identical:", final_scores(cold_list) == final_scores(hot_list))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark the background metadata hydrator against local stubs of
+OpenLibrary, IGDB and TMDB (see bench_media_adapters.py).
+
+Fills --items / --list-size lists of every media type with up to
+--list-size items each, drawn from --distinct ids per type (popular ones
+more often, so lists overlap), with no metadata, then hydrates them:
+  - item by item: each item read, looked up on its own and written back in
+    its own transaction, for the first --baseline-items items of each type
+    (the rest would take too long)
+  - first pass: hydration.hydrate_pending over everything, cold caches
+  - nothing due: the next pass
+  - refresh all: a pass with max_age 0, as after HYDRATION_MAX_AGE_SECONDS,
+    the adapters' caches warm
+and we report items a second, upstream requests and database statements.
+
+Usage: python benchmarks/bench_hydration.py [--items 5000] [--list-size 100] [--distinct 2000] [--baseline-items 200] [--upstream-latency-ms 50] [--database-url postgresql://...]
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from _common import QueryCounter, add_database_argument, create_users, make_engine, make_session_factory, print_table
+from app.db.base import async_database_url
+from app.db.models import MediaTypeEnum, MovieList, MovieListItem
+from app.services import hydration, media
+from bench_media_adapters import make_adapter, make_lists, seed_catalog, start_stub, upstream_requests
+
+TO_ID = {
+    MediaTypeEnum.movie: str,
+    MediaTypeEnum.book: lambda rank: f"OL{rank}M",
+    MediaTypeEnum.game: str,
+}
+
+def seed_items(engine, args):
+    rng = np.random.default_rng(7)
+    with make_session_factory(engine)() as db:
+        user_id = create_users(db, 1)[0]
+        lists_per_type = args.items // args.list_size
+        for media_type in MediaTypeEnum:
+            lists = argparse.Namespace(lists=lists_per_type, items=args.list_size, distinct=args.distinct)
+            for number, external_ids in enumerate(make_lists(rng, lists, TO_ID[media_type])):
+                movie_list = MovieList(name=f"{media_type.value} {number}", type="personal", media_type=media_type,
+                                       created_by_user_id=user_id)
+                db.add(movie_list)
+                db.flush()
+                db.execute(insert(MovieListItem), [
+                    {"movie_list_id": movie_list.id, "external_id": external_id, "title": external_id}
+                    for external_id in external_ids
+                ])
+        db.commit()
+        return db.scalar(select(func.count()).select_from(MovieListItem))
+
+def reset(engine):
+    with engine.begin() as connection:
+        connection.execute(update(MovieListItem).values(item_metadata=None, metadata_refreshed_at=None))
+        # The TMDB client caches in the database too
+        connection.exec_driver_sql("DELETE FROM external_api_cache")
+
+def use_adapters(base_url, session_factory, **limits):
+    media._adapters.clear()
+    media._adapters.update({
+        media_type: make_adapter(media_type, base_url, session_factory, **limits) for media_type in MediaTypeEnum
+    })
+
+async def hydrate_item_by_item(session_factory, limit):
+    hydrated = 0
+    for media_type in MediaTypeEnum:
+        adapter = media.get_adapter(media_type)
+        async with session_factory() as db:
+            item_ids = (await db.scalars(
+                select(MovieListItem.id).join(MovieList).where(MovieList.media_type == media_type)
+                .order_by(MovieListItem.id).limit(limit)
+            )).all()
+        for item_id in item_ids:
+            async with session_factory() as db:
+                item = await db.get(MovieListItem, item_id)
+                found = await adapter.lookup([item.external_id])
+                if item.external_id in found:
+                    item.item_metadata = hydration.merge_metadata(item.item_metadata, found[item.external_id])
+                item.metadata_refreshed_at = datetime.utcnow()
+                await db.commit()
+            hydrated += 1
+    return hydrated
+
+async def hydrate_pass(session_factory, max_age=None):
+    results = await hydration.hydrate_pending(session_factory, max_age=max_age)
+    return sum(count for counts in results.values() for count in counts.values())
+
+def measure(label, run, base_url, async_engine):
+    before = upstream_requests(base_url)
+    with QueryCounter(async_engine) as queries:
+        start = time.perf_counter()
+        items = asyncio.run(run())
+        seconds = time.perf_counter() - start
+    requests = upstream_requests(base_url) - before
+    return (label, items, f"{seconds:.2f}", f"{items / seconds:,.0f}", requests, queries.count)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000, help="List slots per media type")
+    parser.add_argument("--list-size", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=2000, help="Distinct ids per media type")
+    parser.add_argument("--baseline-items", type=int, default=200, help="Items per media type hydrated item by item")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50)
+    parser.add_argument("--missing-share", type=float, default=0.05, help="Share of ids upstream doesn't know")
+    parser.add_argument("--port", type=int, default=8768)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    stub = start_stub(args)
+    base_url = f"http://127.0.0.1:{args.port}"
+    engine = make_engine(args.database_url)
+    seed_catalog(engine, args)
+    total = seed_items(engine, args)
+    # Each mode runs in its own event loop, and pooled connections belong to the one they were made on
+    async_engine = create_async_engine(async_database_url(engine.url.render_as_string(hide_password=False)),
+                                       poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    rows = []
+    use_adapters(base_url, session_factory, batch_size=1)
+    for adapter in media._adapters.values():
+        adapter.cache_ttl = 0
+    rows.append(measure("item by item", lambda: hydrate_item_by_item(session_factory, args.baseline_items),
+                        base_url, async_engine))
+    reset(engine)
+    use_adapters(base_url, session_factory)
+    rows.append(measure("first pass", lambda: hydrate_pass(session_factory), base_url, async_engine))
+    rows.append(measure("nothing due", lambda: hydrate_pass(session_factory), base_url, async_engine))
+    rows.append(measure("refresh all", lambda: hydrate_pass(session_factory, max_age=timedelta(0)),
+                        base_url, async_engine))
+    stub.terminate()
+
+    print(f"{engine.dialect.name}; {total} items in lists of up to {args.list_size}, {args.distinct} distinct ids per "
+          f"media type; upstream {args.upstream_latency_ms:g} ms, {args.missing_share:.0%} of ids unknown")
+    print_table(["mode", "items", "s", "items/s", "upstream requests", "statements"], rows)
+
+if __name__ == "__main__":
+    main()
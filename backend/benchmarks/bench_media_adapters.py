@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmark hydrating list items through the media adapters, against local
+stubs of OpenLibrary, IGDB and TMDB.
+
+The stubs answer after --upstream-latency-ms and run in their own process,
+counting requests by API. OpenLibrary and IGDB answer for any number of ids
+per request, TMDB one movie at a time; --missing-share of the ids are
+unknown upstream. Movies are in the catalog, half of them with details
+(the rest need TMDB).
+
+For each media type, --lists lists of --items items are hydrated one after
+another, with items drawn from --distinct ids (popular ones more often, so
+lists overlap), in three ways:
+  - per item: one upstream call per item and no cache, like a client
+    enriching items one by one
+  - batched: the adapter's lookup, starting with an empty cache
+  - batched, warm: the same lists again
+and we report upstream requests and database queries per list (the
+catalog, and the TMDB client's cache), items found, and latency per list.
+Movies still go one by one to TMDB, which has no batch lookup, through its
+client's cache.
+
+Usage: python benchmarks/bench_media_adapters.py [--lists 20] [--items 100] [--distinct 1000] [--upstream-latency-ms 50] [--missing-share 0.05]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import re
+import time
+import zlib
+from collections import Counter as Tally
+
+import httpx
+import numpy as np
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from _common import QueryCounter, add_database_argument, make_engine, print_table
+from app.db.base import async_database_url
+from app.db.models import CatalogMovie, CatalogSnapshot, MediaTypeEnum
+from app.services import igdb, media, openlibrary, tmdb
+from bench_tmdb_client import StubTMDB
+
+class StubMediaApis:
+    """OpenLibrary's Books API, IGDB's games endpoint and its token endpoint, plus the TMDB stub"""
+
+    def __init__(self, latency, missing_share):
+        self.latency = latency
+        self.missing_share = missing_share
+        self.requests = Tally()
+        self.tmdb = StubTMDB(latency, limit=10**9)
+        self.app = Starlette(routes=[
+            Route("/api/books", self.books),
+            Route("/oauth2/token", self.token, methods=["POST"]),
+            Route("/v4/games", self.games, methods=["POST"]),
+            Route("/_stats", self.stats),
+            Mount("/3", self.tmdb.app),
+        ])
+
+    def known(self, key):
+        # The same ids are unknown in every run
+        return zlib.crc32(key.encode()) % 1000 >= self.missing_share * 1000
+
+    async def books(self, request):
+        self.requests["openlibrary"] += 1
+        await asyncio.sleep(self.latency)
+        return JSONResponse({
+            key: {"title": f"Book {key}", "authors": [{"name": "A. Author"}], "number_of_pages": 300,
+                  "publish_date": "1999", "cover": {"medium": f"https://covers.example/{key}.jpg"},
+                  "subjects": [{"name": "Fiction"}]}
+            for key in request.query_params["bibkeys"].split(",") if self.known(key)
+        })
+
+    async def token(self, request):
+        self.requests["igdb token"] += 1
+        return JSONResponse({"access_token": "stub", "expires_in": 3600, "token_type": "bearer"})
+
+    async def games(self, request):
+        self.requests["igdb"] += 1
+        ids = re.search(r"where id = \(([\d,]+)\)", (await request.body()).decode()).group(1).split(",")
+        await asyncio.sleep(self.latency)
+        return JSONResponse([
+            {"id": int(game_id), "name": f"Game {game_id}", "first_release_date": 946684800,
+             "genres": [{"id": 12, "name": "RPG"}], "platforms": [{"id": 6, "name": "PC"}], "cover": {"image_id": "co1"}}
+            for game_id in ids if self.known(game_id)
+        ])
+
+    async def stats(self, request):
+        return JSONResponse({**self.requests, "tmdb": self.tmdb.requests})
+
+def serve_stub(latency, missing_share, port):
+    uvicorn.run(StubMediaApis(latency, missing_share).app, port=port, log_level="warning", access_log=False)
+
+def start_stub(args):
+    stub = multiprocessing.Process(target=serve_stub, args=(args.upstream_latency_ms / 1000, args.missing_share, args.port),
+                                   daemon=True)
+    stub.start()
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{args.port}/_stats")
+            return stub
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+def upstream_requests(base_url):
+    return sum(httpx.get(f"{base_url}/_stats").json().values())
+
+def make_lists(rng, args, to_id):
+    ranks = np.minimum(rng.zipf(1.2, size=(args.lists, args.items * 2)), args.distinct)
+    # Items are unique within a list
+    return [[to_id(int(rank)) for rank in dict.fromkeys(row)][:args.items] for row in ranks]
+
+def seed_catalog(engine, args):
+    with engine.begin() as connection:
+        connection.execute(insert(CatalogSnapshot).values(id=1, source="bench"))
+        connection.execute(insert(CatalogMovie), [
+            {"id": movie_id, "title": f"Movie {movie_id}", "popularity": 1.0, "adult": False, "snapshot_id": 1,
+             "details": {"overview": "...", "poster_path": None, "release_date": "1999-10-15", "genre_ids": [18]}
+             if movie_id % 2 else None}
+            for movie_id in range(1, args.distinct + 1)
+        ])
+
+def make_adapter(media_type, base_url, session_factory, **limits):
+    """An adapter for ``media_type`` pointed at the stubs, without rate limits"""
+    if media_type == MediaTypeEnum.movie:
+        client = tmdb.TMDBClient(base_url=f"{base_url}/3", api_key="bench", session_factory=session_factory,
+                                 rate_limit=0)
+        return media.MovieAdapter(session_factory=session_factory, tmdb_client=client, **limits)
+    if media_type == MediaTypeEnum.book:
+        return media.BookAdapter(openlibrary.OpenLibraryClient(base_url=base_url), **limits)
+    return media.GameAdapter(igdb.IGDBClient(base_url=f"{base_url}/v4", token_url=f"{base_url}/oauth2/token",
+                                             client_id="bench", client_secret="bench", rate_limit=0), **limits)
+
+async def hydrate(adapter, lists):
+    latencies = []
+    found = 0
+    for items in lists:
+        start = time.perf_counter()
+        found += len(await adapter.lookup(items))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000, found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lists", type=int, default=20)
+    parser.add_argument("--items", type=int, default=100, help="Items per list")
+    parser.add_argument("--distinct", type=int, default=1000, help="Distinct ids per media type")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50)
+    parser.add_argument("--missing-share", type=float, default=0.05, help="Share of ids upstream doesn't know")
+    parser.add_argument("--port", type=int, default=8767)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    stub = start_stub(args)
+    base_url = f"http://127.0.0.1:{args.port}"
+    engine = make_engine(args.database_url)
+    seed_catalog(engine, args)
+    # Each mode runs in its own event loop, and pooled connections belong to the one they were made on
+    async_engine = create_async_engine(async_database_url(engine.url.render_as_string(hide_password=False)),
+                                       poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    rng = np.random.default_rng(5)
+    to_id = {
+        MediaTypeEnum.movie: str,
+        MediaTypeEnum.book: lambda rank: f"OL{rank}M",
+        MediaTypeEnum.game: str,
+    }
+    rows = []
+    for media_type in MediaTypeEnum:
+        lists = make_lists(rng, args, to_id[media_type])
+        per_item = make_adapter(media_type, base_url, session_factory, batch_size=1)
+        per_item.cache_ttl = 0
+        batched = make_adapter(media_type, base_url, session_factory)
+        for mode, runner in (("per item", per_item), ("batched", batched), ("batched, warm", batched)):
+            if media_type == MediaTypeEnum.movie and mode != "batched, warm":
+                # The TMDB client caches in the database too
+                with engine.begin() as connection:
+                    connection.exec_driver_sql("DELETE FROM external_api_cache")
+            before = upstream_requests(base_url)
+            with QueryCounter(async_engine) as queries:
+                ms, found = asyncio.run(hydrate(runner, lists))
+            requests = upstream_requests(base_url) - before
+            rows.append((media_type.value, mode, f"{requests / len(lists):.1f}", f"{queries.count / len(lists):.1f}",
+                         f"{found / len(lists):.1f}", f"{np.percentile(ms, 50):.0f}", f"{np.percentile(ms, 99):.0f}"))
+    stub.terminate()
+
+    print(f"{args.lists} lists of {args.items} items over {args.distinct} ids per media type; "
+          f"upstream {args.upstream_latency_ms:g} ms, {args.missing_share:.0%} of ids unknown")
+    print_table(["media", "mode", "requests/list", "queries/list", "found/list", "p50 ms", "p99 ms"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Compare fetching upcoming matchups one at a time (GET /voting/next-matchup)
+against prefetching them (GET /voting/next-matchups?count=K).
+
+Both run through the API (FastAPI TestClient). The simulated client shows
+--cards matchups and votes on each; with prefetching it asks for the next
+K whenever it runs out. We report requests, queries and time spent fetching
+(votes excluded), and how often a card shares an item with the one before.
+
+Usage: python benchmarks/bench_next_matchups.py [--items 200] [--cards 200] [--counts 5 10 25]
+"""
+
+import argparse
+
+from fastapi.testclient import TestClient
+from _common import add_database_argument, make_engine, make_session_factory, make_api_db_override, QueryCounter, timed, create_users, create_list, print_table
+from app.main import app
+from app.db.base import get_db
+from app.services import matchups as matchups_service
+
+def back_to_back(cards):
+    return sum(1 for prev, card in zip(cards, cards[1:]) if set(prev) & set(card))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--cards", type=int, default=200)
+    parser.add_argument("--counts", type=int, nargs="+", default=[5, 10, 25])
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+
+    app.dependency_overrides[get_db], api_engine = make_api_db_override(engine)
+
+    def fresh_list(db, user_id):
+        list_id, item_ids = create_list(db, args.items, user_id)
+        matchups_service.bulk_insert_matchups(db, list_id, user_id, matchups_service.missing_pairs(item_ids, set()))
+        db.commit()
+        return list_id
+
+    def vote(matchup):
+        r = client.post(f"/api/v1/voting/matchups/{matchup['id']}/vote", params={"winner_id": matchup["item_a_id"]})
+        assert r.status_code == 200, r.text
+
+    rows = []
+    with Session() as db, TestClient(app) as client:
+        user_id = create_users(db, 1)[0]
+
+        list_id = fresh_list(db, user_id)
+        cards, requests, queries, seconds = [], 0, 0, 0.0
+        while len(cards) < args.cards:
+            with QueryCounter(api_engine) as counter, timed() as t:
+                r = client.get(f"/api/v1/voting/next-matchup/{list_id}", params={"user_id": user_id})
+            requests, queries, seconds = requests + 1, queries + counter.count, seconds + t["seconds"]
+            matchup = r.json()["matchup"]
+            cards.append((matchup["item_a_id"], matchup["item_b_id"]))
+            vote(matchup)
+        rows.append(("next-matchup", requests, queries, f"{seconds * 1000:.0f}", f"{seconds / len(cards) * 1000:.2f}", back_to_back(cards)))
+
+        for count in args.counts:
+            list_id = fresh_list(db, user_id)
+            cards, requests, queries, seconds = [], 0, 0, 0.0
+            while len(cards) < args.cards:
+                with QueryCounter(api_engine) as counter, timed() as t:
+                    r = client.get(f"/api/v1/voting/next-matchups/{list_id}", params={"user_id": user_id, "count": count})
+                requests, queries, seconds = requests + 1, queries + counter.count, seconds + t["seconds"]
+                for entry in r.json()[:args.cards - len(cards)]:
+                    cards.append((entry["matchup"]["item_a_id"], entry["matchup"]["item_b_id"]))
+                    vote(entry["matchup"])
+            rows.append((f"next-matchups?count={count}", requests, queries, f"{seconds * 1000:.0f}", f"{seconds / len(cards) * 1000:.2f}", back_to_back(cards)))
+
+    print_table(["endpoint", "requests", "queries", "fetch ms", "ms/card", "back-to-back repeats"], rows)
+
+if __name__ == "__main__":
+    main()
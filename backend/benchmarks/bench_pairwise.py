@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare reading a list's head-to-head results from the pairwise_wins counts
+against aggregating them from the matchup history, for a group list where
+every member has voted on a share of all pairs.
+
+We time the full win matrix, one item's record and a cold group
+Bradley-Terry fit (which now reads the counts), each against the same
+question answered from matchups.
+
+Usage: python benchmarks/bench_pairwise.py [--items 150] [--members 50] [--share 0.5]
+"""
+
+import argparse
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import case, func, insert, or_, select
+from _common import add_database_argument, make_engine, make_session_factory, QueryCounter, timed, create_users, create_list, print_table
+from app.db.models import Matchup
+from app.services import bradley_terry, pairwise
+
+def matrix_from_matchups(db, list_id):
+    lo = func.least(Matchup.item_a_id, Matchup.item_b_id) if db.get_bind().dialect.name == "postgresql" else func.min(Matchup.item_a_id, Matchup.item_b_id)
+    hi = func.greatest(Matchup.item_a_id, Matchup.item_b_id) if db.get_bind().dialect.name == "postgresql" else func.max(Matchup.item_a_id, Matchup.item_b_id)
+    return db.execute(
+        select(lo, hi, func.sum(case((Matchup.winner_id == lo, 1), else_=0)), func.sum(case((Matchup.winner_id == hi, 1), else_=0)))
+        .where(Matchup.movie_list_id == list_id, Matchup.winner_id != None)
+        .group_by(lo, hi)
+    ).all()
+
+def record_from_matchups(db, list_id, item_id):
+    return db.execute(
+        select(Matchup.item_a_id, Matchup.item_b_id, Matchup.winner_id)
+        .where(Matchup.movie_list_id == list_id, Matchup.winner_id != None,
+               or_(Matchup.item_a_id == item_id, Matchup.item_b_id == item_id))
+    ).all()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=150)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--share", type=float, default=0.5)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+    rng = np.random.default_rng(0)
+
+    with Session() as db:
+        user_ids = create_users(db, args.members)
+        list_id, item_ids = create_list(db, args.items, user_ids[0])
+        pairs = [(a, b) for i, a in enumerate(item_ids) for b in item_ids[i + 1:]]
+        strength = dict(zip(item_ids, rng.normal(0, 1, len(item_ids)).tolist()))
+        results = []
+        now = datetime.utcnow()
+        for user_id in user_ids:
+            chosen = rng.choice(len(pairs), int(len(pairs) * args.share), replace=False)
+            rows = []
+            for index in chosen.tolist():
+                a, b = pairs[index]
+                winner = a if rng.random() < 1 / (1 + np.exp(strength[b] - strength[a])) else b
+                rows.append({"movie_list_id": list_id, "user_id": user_id, "item_a_id": a, "item_b_id": b,
+                             "winner_id": winner, "created_at": now, "voted_at": now})
+                results.append((winner, b if winner == a else a))
+            db.execute(insert(Matchup), rows)
+        pairwise.record_results(db, list_id, results)
+        db.commit()
+
+    def measure(fn):
+        with Session() as db, QueryCounter(engine) as queries, timed() as elapsed:
+            fn(db)
+        return f"{elapsed['seconds'] * 1000:.1f}", queries.count
+
+    def cold_group_fit(db):
+        bradley_terry._cache.clear()
+        bradley_terry.fit_list(db, list_id, None)
+
+    def fit_from_votes(db):
+        winners, losers = bradley_terry.load_votes(db, list_id)
+        ids = np.union1d(winners, losers)
+        bradley_terry.fit_strengths(np.searchsorted(ids, winners), np.searchsorted(ids, losers), len(ids))
+
+    rows = [
+        ("win matrix", *measure(lambda db: matrix_from_matchups(db, list_id)), *measure(lambda db: pairwise.win_matrix(db, list_id))),
+        ("one item's record", *measure(lambda db: record_from_matchups(db, list_id, item_ids[0])),
+         *measure(lambda db: pairwise.item_record(db, list_id, item_ids[0]))),
+        ("group Bradley-Terry fit", *measure(fit_from_votes), *measure(cold_group_fit)),
+    ]
+    print(f"{args.items} items, {args.members} members, {len(results)} votes")
+    print_table(["question", "matchups ms", "queries", "pairwise ms", "queries"], rows)
+
+if __name__ == "__main__":
+    main()
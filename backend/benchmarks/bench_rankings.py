@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Compare serving a user's ranking of a large list from the rankings endpoint's
+keyset pages against what the client did before: fetch every score and every
+item, then join and sort them itself.
+
+We time the full client-side ranking, the top page, a page deep in the list
+and walking the whole ranking page by page.
+
+Usage: python benchmarks/bench_rankings.py [--items 5000] [--page-size 50]
+"""
+
+import argparse
+
+import numpy as np
+from sqlalchemy import insert, select
+from _common import add_database_argument, make_engine, make_session_factory, QueryCounter, timed, create_users, create_list, print_table
+from app.db.models import EloScore, MovieListItem
+from app.services import rankings
+
+def client_side_ranking(db, list_id, user_id):
+    scores = db.query(EloScore).filter(EloScore.movie_list_id == list_id, EloScore.user_id == user_id).all()
+    items = {item.id: item for item in db.query(MovieListItem).filter(MovieListItem.movie_list_id == list_id).all()}
+    ordered = sorted(scores, key=lambda score: (-score.score, score.movie_list_item_id))
+    return [(position + 1, score.score, items[score.movie_list_item_id].title) for position, score in enumerate(ordered)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=50)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+    rng = np.random.default_rng(0)
+
+    with Session() as db:
+        user_id, = create_users(db, 1)
+        list_id, item_ids = create_list(db, args.items, user_id)
+        # Rounded scores so plenty of items tie
+        scores = np.round(rng.normal(1200, 150, len(item_ids)), 0).tolist()
+        db.execute(insert(EloScore), [
+            {"movie_list_id": list_id, "user_id": user_id, "movie_list_item_id": item_id, "score": score}
+            for item_id, score in zip(item_ids, scores)
+        ])
+        db.commit()
+        # The cursor of the page halfway down
+        middle = db.execute(
+            select(EloScore.score, EloScore.movie_list_item_id)
+            .where(EloScore.movie_list_id == list_id, EloScore.user_id == user_id)
+            .order_by(EloScore.score.desc(), EloScore.movie_list_item_id)
+            .offset(args.items // 2).limit(1)
+        ).one()
+
+    def measure(fn):
+        with Session() as db, QueryCounter(engine) as queries, timed() as elapsed:
+            fn(db)
+        return f"{elapsed['seconds'] * 1000:.1f}", queries.count
+
+    def all_pages(db):
+        after = None
+        while True:
+            _, _, after = rankings.ranking_page(db, list_id, user_id, args.page_size, after)
+            if after is None:
+                break
+
+    rows = [
+        ("client-side join and sort", *measure(lambda db: client_side_ranking(db, list_id, user_id))),
+        ("top page", *measure(lambda db: rankings.ranking_page(db, list_id, user_id, args.page_size))),
+        ("page halfway down", *measure(lambda db: rankings.ranking_page(db, list_id, user_id, args.page_size, tuple(middle)))),
+        (f"every page of {args.page_size}", *measure(all_pages)),
+    ]
+    print(f"{args.items} items, pages of {args.page_size}")
+    print_table(["ranking", "ms", "queries"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Elo replay engine (app/services/replay.py).
+
+1. In memory: replay synthetic vote histories of --votes votes spread over
+   different numbers of users, and check the vectorized result against a
+   plain per-vote replay on a sample.
+2. End to end: write --db-votes voted matchups and their vote log events to
+   the benchmark database and time load, replay and bulk write through
+   rebuild_list_scores.
+
+Usage: python benchmarks/bench_replay_scores.py [--votes 1000000] [--items 500] [--db-votes 100000]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+from _common import add_database_argument, make_engine, make_session_factory, timed, create_users, create_list, print_table
+from app.db.models import Matchup, VoteEvent
+from app.services import elo, replay, vote_log
+
+def synthetic_history(rng, votes, users, items):
+    user_ids = rng.integers(1, users + 1, size=votes)
+    item_a = rng.integers(1, items + 1, size=votes)
+    item_b = (item_a + rng.integers(1, items, size=votes) - 1) % items + 1
+    return replay.VoteHistory(user_ids=user_ids, item_a_ids=item_a, item_b_ids=item_b, a_won=rng.random(votes) < 0.5)
+
+def serial_replay(history):
+    scores = {}
+    for u, a, b, a_won in zip(history.user_ids.tolist(), history.item_a_ids.tolist(), history.item_b_ids.tolist(), history.a_won.tolist()):
+        sa, sb = scores.get((u, a), elo.DEFAULT_SCORE), scores.get((u, b), elo.DEFAULT_SCORE)
+        scores[(u, a)], scores[(u, b)] = elo.updated_scores(sa, sb, a_won)
+    return scores
+
+def max_drift(result, expected):
+    users = {u: i for i, u in enumerate(result.user_ids.tolist())}
+    items = {it: j for j, it in enumerate(result.item_ids.tolist())}
+    return max(abs(result.scores[users[u], items[it]] - score) for (u, it), score in expected.items())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--votes", type=int, default=1_000_000)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--user-counts", type=int, nargs="+", default=[1, 20, 200, 2000])
+    parser.add_argument("--db-votes", type=int, default=100_000)
+    parser.add_argument("--db-users", type=int, default=50)
+    add_database_argument(parser)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    rows = []
+    for users in args.user_counts:
+        history = synthetic_history(rng, args.votes, users, args.items)
+        with timed() as t:
+            result = replay.replay_votes(history)
+        sample = synthetic_history(rng, 20_000, users, args.items)
+        drift = max_drift(replay.replay_votes(sample), serial_replay(sample))
+        rows.append((f"{args.votes:,}", users, args.items, f"{t['seconds']:.2f}", f"{drift:.1e}"))
+    print("In-memory replay")
+    print_table(["votes", "users", "items", "seconds", "drift vs serial"], rows)
+
+    if args.db_votes:
+        engine = make_engine(args.database_url)
+        Session = make_session_factory(engine)
+        with Session() as db:
+            user_ids = create_users(db, args.db_users)
+            list_id, item_ids = create_list(db, args.items, user_ids[0])
+            history = synthetic_history(rng, args.db_votes, args.db_users, args.items)
+            start = datetime(2024, 1, 1)
+            # Replay reads the vote log; events applied inline count as covered by the stored scores
+            inline = vote_log.inline_bits(*vote_log.PROJECTIONS)
+            for chunk in range(0, args.db_votes, 10_000):
+                matchups = [
+                    {
+                        "movie_list_id": list_id,
+                        "user_id": user_ids[u - 1],
+                        "item_a_id": item_ids[a - 1],
+                        "item_b_id": item_ids[b - 1],
+                        "winner_id": item_ids[(a if won else b) - 1],
+                        "created_at": start,
+                        "voted_at": start + timedelta(microseconds=chunk + i)
+                    }
+                    for i, (u, a, b, won) in enumerate(zip(
+                        history.user_ids[chunk:chunk + 10_000].tolist(), history.item_a_ids[chunk:chunk + 10_000].tolist(),
+                        history.item_b_ids[chunk:chunk + 10_000].tolist(), history.a_won[chunk:chunk + 10_000].tolist()))
+                ]
+                matchup_ids = db.scalars(insert(Matchup).returning(Matchup.id, sort_by_parameter_order=True), matchups).all()
+                db.execute(insert(VoteEvent), [
+                    {
+                        "movie_list_id": list_id,
+                        "user_id": matchup["user_id"],
+                        "matchup_id": matchup_id,
+                        "item_a_id": matchup["item_a_id"],
+                        "item_b_id": matchup["item_b_id"],
+                        "winner_id": matchup["winner_id"],
+                        "inline_projections": inline,
+                        "created_at": matchup["voted_at"]
+                    }
+                    for matchup_id, matchup in zip(matchup_ids, matchups)
+                ])
+            db.commit()
+
+            with timed() as t_load:
+                loaded = replay.load_vote_history(db, list_id)
+            assert len(loaded) == args.db_votes, f"loaded {len(loaded):,} of {args.db_votes:,} votes"
+            with timed() as t_replay:
+                result = replay.replay_votes(loaded, item_ids=np.array(item_ids))
+            with timed() as t_write:
+                written = replay.write_scores(db, list_id, result)
+                db.commit()
+        print(f"\nEnd to end ({engine.dialect.name}): {len(loaded):,} votes, {args.db_users} users, {written:,} score rows")
+        print_table(["load", "replay", "write", "total"], [(
+            f"{t_load['seconds']:.2f}s", f"{t_replay['seconds']:.2f}s", f"{t_write['seconds']:.2f}s",
+            f"{t_load['seconds'] + t_replay['seconds'] + t_write['seconds']:.2f}s"
+        )])
+
+if __name__ == "__main__":
+    main()
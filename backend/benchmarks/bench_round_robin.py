@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare exhaustive voting with pre-generated matchups against round-robin
+mode, which derives pairs on demand and only stores the ones it serves.
+
+For a group list with --members voters we measure, through the API
+(FastAPI TestClient):
+
+* setup: generating every member's matchups (exhaustive) or serving each
+  member their first matchup (round robin), with the rows and table size
+  it leaves behind, and
+* voting: --votes rounds of next-matchup + vote for one member.
+
+Usage: python benchmarks/bench_round_robin.py [--items 300] [--members 20] [--votes 200]
+"""
+
+import argparse
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, text
+from _common import add_database_argument, make_engine, make_session_factory, make_api_db_override, QueryCounter, timed, create_users, create_list, print_table
+from app.main import app
+from app.db.base import get_db
+from app.db.models import Matchup, VotingModeEnum
+
+def table_size(engine):
+    """Bytes used by the matchups table and its indexes, where the database can tell us"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            return conn.execute(text("SELECT pg_total_relation_size('matchups')")).scalar()
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=300)
+    parser.add_argument("--members", type=int, default=20)
+    parser.add_argument("--votes", type=int, default=200)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    rows = []
+    for mode in (VotingModeEnum.exhaustive, VotingModeEnum.round_robin):
+        # A fresh database per mode so table sizes are comparable
+        engine = make_engine(args.database_url)
+        Session = make_session_factory(engine)
+
+        app.dependency_overrides[get_db], api_engine = make_api_db_override(engine)
+        with TestClient(app) as client:
+            with Session() as db:
+                user_ids = create_users(db, args.members)
+                list_id, _ = create_list(db, args.items, user_ids[0], voting_mode=mode)
+
+            with QueryCounter(api_engine) as setup_queries, timed() as setup:
+                for user_id in user_ids:
+                    r = client.post(f"/api/v1/voting/matchups/{list_id}/generate", params={"user_id": user_id})
+                    assert r.status_code == 200, r.text
+
+            with QueryCounter(api_engine) as vote_queries, timed() as voting:
+                for _ in range(args.votes):
+                    r = client.get(f"/api/v1/voting/next-matchup/{list_id}", params={"user_id": user_ids[0]})
+                    matchup = r.json()["matchup"]
+                    r = client.post(f"/api/v1/voting/matchups/{matchup['id']}/vote", params={"winner_id": matchup["item_a_id"]})
+                    assert r.status_code == 200, r.text
+
+            with Session() as db:
+                stored = db.query(func.count(Matchup.id)).scalar()
+            size = table_size(engine)
+            progress = client.get(f"/api/v1/voting/progress/{list_id}", params={"user_id": user_ids[0]}).json()
+            rows.append((
+                mode.value,
+                f"{setup['seconds']:.2f}",
+                setup_queries.count,
+                stored,
+                f"{size / 2**20:.1f}" if size is not None else "n/a",
+                f"{voting['seconds'] / args.votes * 1000:.2f}",
+                f"{vote_queries.count / args.votes:.1f}",
+                f"{progress['completed_matchups']}/{progress['total_matchups']}"
+            ))
+        engine.dispose()
+
+    print(f"{args.items} items, {args.members} members, {args.votes} votes by one member")
+    print_table(["mode", "setup s", "setup queries", "matchup rows", "table MiB", "ms/vote", "queries/vote", "progress"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark the autocomplete index over a synthetic catalog of --titles titles.
+
+Titles are made of pseudo-words drawn with a Zipf distribution (a few words
+like "the" are everywhere, most are rare) and have log-normal popularity.
+Queries replay someone typing a title, popular titles more often: each one
+is a prefix of a title cut at a random keystroke, and --typo-share of them
+have a letter dropped or swapped. We report the build time, how much the
+index grows the process, and latency percentiles per kind of query, then
+the same after a round of incremental updates, next to the linear scan the
+search endpoint used to do.
+
+Usage: python benchmarks/bench_search_index.py [--titles 500000] [--queries 20000] [--typo-share 0.1] [--updates 10000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _common import print_table
+from app.services.search_index import SearchIndex, normalize
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ber", "dan", "gor", "hel", "jin", "mar", "nos",
+             "pel", "qui", "ros", "sten", "tar", "ul", "wen", "xa", "yor", "zel", "ar", "en", "is", "on", "us"]
+
+def rss_bytes():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def make_catalog(rng, count):
+    words = sorted({"".join(rng.choice(SYLLABLES, size=rng.integers(1, 5))) for _ in range(120000)})
+    rng.shuffle(words)
+    words = ["the", "of", "and", "a", "love", "night", "man", "star"] + words
+    lengths = rng.integers(1, 6, size=count)
+    picks = np.minimum(rng.zipf(1.15, size=lengths.sum()), len(words)) - 1
+    titles, start = [], 0
+    for length in lengths:
+        titles.append(" ".join(words[i].capitalize() for i in picks[start:start + length]))
+        start += length
+    popularity = rng.lognormal(mean=1.0, sigma=1.5, size=count)
+    return [(i + 1, title, float(score)) for i, (title, score) in enumerate(zip(titles, popularity))]
+
+def make_queries(rng, catalog, count, typo_share):
+    order = np.argsort([-popularity for _, _, popularity in catalog])
+    queries = []
+    for rank in np.minimum(rng.zipf(1.1, size=count), len(catalog)) - 1:
+        title = normalize(catalog[order[rank]][1])
+        query = title[:rng.integers(1, len(title) + 1)]
+        kind = "1-2 chars" if len(query) <= 2 else ("multi-word" if " " in query.strip() else "prefix")
+        if rng.random() < typo_share:
+            last = query.split(" ")[-1]
+            if len(last) >= 5:
+                i = int(rng.integers(1, len(last) - 1))
+                typo = last[:i] + last[i + 1:] if rng.random() < 0.5 else last[:i - 1] + last[i] + last[i - 1] + last[i + 1:]
+                query, kind = query[:len(query) - len(last)] + typo, "typo"
+        queries.append((kind, query))
+    return queries
+
+def measure(index, queries):
+    latencies = {}
+    empty = 0
+    for kind, query in queries:
+        start = time.perf_counter()
+        results = index.search(query, 10)
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        empty += not results
+    rows = []
+    for kind in ("1-2 chars", "prefix", "multi-word", "typo"):
+        us = np.array(latencies.get(kind, [0.0])) * 1e6
+        rows.append((kind, len(latencies.get(kind, [])), f"{np.percentile(us, 50):.0f}", f"{np.percentile(us, 99):.0f}",
+                     f"{us.max():.0f}"))
+    return rows, empty
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=500000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--typo-share", type=float, default=0.1)
+    parser.add_argument("--updates", type=int, default=10000, help="Titles added, re-ranked or removed incrementally")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    catalog = make_catalog(rng, args.titles)
+    queries = make_queries(rng, catalog, args.queries, args.typo_share)
+
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    index = SearchIndex.build(catalog)
+    build_seconds = time.perf_counter() - start
+    gc.collect()
+    print(f"{len(index)} titles indexed in {build_seconds:.1f}s, process grew by {(rss_bytes() - before) / 2**20:.0f} MiB")
+
+    columns = ["query", "count", "p50 us", "p99 us", "max us"]
+    rows, empty = measure(index, queries)
+    print_table(columns, rows)
+    print(f"queries without results: {empty}")
+
+    # A third new titles, a third popularity changes, a third removals
+    timings = {"add": [], "re-rank": [], "remove": []}
+    extra = make_catalog(rng, args.updates // 3)
+    for doc_id, title, popularity in extra:
+        start = time.perf_counter()
+        index.upsert(args.titles + doc_id, title, popularity * 3)
+        timings["add"].append(time.perf_counter() - start)
+    for doc_id in rng.choice(args.titles, size=args.updates // 3, replace=False):
+        _, title, popularity = catalog[doc_id]
+        start = time.perf_counter()
+        index.upsert(doc_id + 1, title, popularity * float(rng.lognormal(0, 1)))
+        timings["re-rank"].append(time.perf_counter() - start)
+    for doc_id in rng.choice(args.titles, size=args.updates // 3, replace=False):
+        start = time.perf_counter()
+        index.remove(int(doc_id) + 1)
+        timings["remove"].append(time.perf_counter() - start)
+    print_table(["update", "count", "p50 us", "p99 us"],
+                [(name, len(samples), f"{np.percentile(np.array(samples) * 1e6, 50):.0f}",
+                  f"{np.percentile(np.array(samples) * 1e6, 99):.0f}") for name, samples in timings.items()])
+    rows, _ = measure(index, queries)
+    print("after the updates:")
+    print_table(columns, rows)
+
+    sample = queries[:50]
+    lowered = [title.lower() for _, title, _ in catalog]
+    start = time.perf_counter()
+    for _, query in sample:
+        [i for i, title in enumerate(lowered) if query.lower() in title]
+    print(f"linear scan, as the endpoint used to do: {(time.perf_counter() - start) / len(sample) * 1000:.1f} ms a query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmark the TMDB client against a local stub of the TMDB API.
+
+The stub answers /search/movie, /movie/popular and /movie/{id} after
+--upstream-latency-ms, like a distant API would, and enforces its own limit
+of --upstream-limit requests a second by answering 429. It runs in its own
+process and counts the requests and TCP connections it sees.
+
+Simulated users search (popular queries far more often than rare ones, as
+autocomplete does) and open movie pages. The same workload runs:
+  - direct: a new connection per request, no cache and no rate limit
+  - cold: through TMDBClient with an empty cache
+  - warm: again, with the cache filled by the cold run
+  - expired: with every entry past its TTL, served stale while refreshed
+and we report latency percentiles, upstream requests, connections opened,
+429s, the cache hit ratio and requests coalesced with one in flight.
+
+Usage: python benchmarks/bench_tmdb_client.py [--requests 3000] [--users 50] [--queries 300] [--movies 500] [--upstream-latency-ms 80] [--upstream-limit 50]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import time
+from collections import Counter as Tally, deque
+
+import httpx
+import numpy as np
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from _common import add_database_argument, make_engine, print_table
+from app.db.base import async_database_url
+from app.db.models import ExternalApiCache
+from app.services import tmdb
+
+class StubTMDB:
+    """Just enough of the TMDB API, slow and rate limited like the real one"""
+
+    def __init__(self, latency, limit):
+        self.latency = latency
+        self.limit = limit
+        self.requests = 0
+        self.rejected = 0
+        self.connections = set()
+        self.recent = deque()
+        self.app = Starlette(routes=[
+            Route("/search/movie", self.search),
+            Route("/movie/popular", self.popular),
+            Route("/movie/{movie_id:int}", self.movie),
+            Route("/_stats", self.stats),
+        ])
+
+    def movie_json(self, movie_id):
+        return {"id": movie_id, "title": f"Movie {movie_id}", "overview": "...", "poster_path": f"/{movie_id}.jpg",
+                "release_date": "1999-10-15", "genre_ids": [18, movie_id % 40]}
+
+    async def _answer(self, request, body):
+        self.requests += 1
+        self.connections.add(request.client)
+        now = time.monotonic()
+        while self.recent and self.recent[0] < now - 1:
+            self.recent.popleft()
+        if len(self.recent) >= self.limit:
+            self.rejected += 1
+            return JSONResponse({"status_message": "Request limit exceeded"}, status_code=429, headers={"Retry-After": "1"})
+        self.recent.append(now)
+        await asyncio.sleep(self.latency)
+        return JSONResponse(body)
+
+    async def search(self, request):
+        seed = sum(map(ord, request.query_params["query"]))
+        return await self._answer(request, {"page": 1, "results": [self.movie_json(seed * 7 + i) for i in range(20)]})
+
+    async def popular(self, request):
+        return await self._answer(request, {"page": 1, "results": [self.movie_json(i) for i in range(20)]})
+
+    async def movie(self, request):
+        body = self.movie_json(request.path_params["movie_id"])
+        body["genres"] = [{"id": genre_id, "name": str(genre_id)} for genre_id in body.pop("genre_ids")]
+        return await self._answer(request, body)
+
+    async def stats(self, request):
+        return JSONResponse({"requests": self.requests, "rejected": self.rejected, "connections": len(self.connections)})
+
+def serve_stub(latency, limit, port):
+    uvicorn.run(StubTMDB(latency, limit).app, port=port, log_level="warning", access_log=False)
+
+def start_stub(args):
+    stub = multiprocessing.Process(target=serve_stub, args=(args.upstream_latency_ms / 1000, args.upstream_limit, args.port),
+                                   daemon=True)
+    stub.start()
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{args.port}/_stats")
+            return stub
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+def stub_stats(base_url):
+    stats = httpx.get(f"{base_url}/_stats").json()
+    return stats["requests"], stats["rejected"], stats["connections"]
+
+def workload(args):
+    """The (kind, argument) requests each user makes, Zipf-distributed"""
+    rng = np.random.default_rng(1)
+    queries = [f"query {i}" for i in range(args.queries)]
+    per_user = args.requests // args.users
+    plans = []
+    for _ in range(args.users):
+        plan = []
+        for _ in range(per_user):
+            if rng.random() < 0.6:
+                plan.append(("search", queries[min(rng.zipf(1.3), args.queries) - 1]))
+            elif rng.random() < 0.1:
+                plan.append(("popular", None))
+            else:
+                plan.append(("movie", int(min(rng.zipf(1.3), args.movies))))
+        plans.append(plan)
+    return plans
+
+async def run(plans, call):
+    latencies = []
+    errors = Tally()
+
+    async def user(plan):
+        for kind, argument in plan:
+            start = time.perf_counter()
+            try:
+                await call(kind, argument)
+            except (tmdb.TMDBError, httpx.HTTPError) as e:
+                errors[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(plan) for plan in plans))
+    return time.perf_counter() - started, np.array(latencies) * 1000, sum(errors.values())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=300, help="Distinct search queries")
+    parser.add_argument("--movies", type=int, default=500, help="Distinct movie pages")
+    parser.add_argument("--upstream-latency-ms", type=float, default=80)
+    parser.add_argument("--upstream-limit", type=int, default=50, help="Requests a second the stub accepts")
+    parser.add_argument("--port", type=int, default=8766)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    stub = start_stub(args)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    engine = make_engine(args.database_url)
+    async_engine = create_async_engine(async_database_url(engine.url.render_as_string(hide_password=False)))
+    client = tmdb.TMDBClient(base_url=base_url, api_key="bench",
+                             session_factory=async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False),
+                             rate_limit=args.upstream_limit * 0.8, burst=max(1, int(args.upstream_limit * 0.1)))
+
+    async def direct(kind, argument):
+        path, params = {"search": ("/search/movie", {"query": argument}),
+                        "popular": ("/movie/popular", {}),
+                        "movie": (f"/movie/{argument}", {})}[kind]
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+            response = await http.get(path, params={**params, "api_key": "bench"})
+            response.raise_for_status()
+            return response.json()
+
+    async def cached(kind, argument):
+        if kind == "search":
+            return await client.search_movies(argument)
+        if kind == "popular":
+            return await client.popular_movies()
+        return await client.get_movie(argument)
+
+    async def expire_cache():
+        async with async_engine.begin() as conn:
+            await conn.execute(update(ExternalApiCache).values(fresh_until=ExternalApiCache.fetched_at))
+        # As if this were another worker, with nothing in memory yet
+        client._memory.clear()
+
+    plans = workload(args)
+    rows = []
+    for mode, call in (("direct", direct), ("cold", cached), ("warm", cached), ("expired", cached)):
+        if mode == "expired":
+            asyncio.run(expire_cache())
+        # Start with the stub's rate limit window clear of the last run's requests
+        time.sleep(1)
+        upstream_before = stub_stats(base_url)
+        lookups_before = {result: tmdb.LOOKUPS.value(result=result) for result in ("hit", "stale", "miss")}
+        coalesced_before = tmdb.COALESCED.value()
+
+        async def measured():
+            result = await run(plans, call)
+            # Let refreshes started by stale hits finish before counting them
+            await asyncio.gather(*client._in_flight.values(), return_exceptions=True)
+            return result
+
+        seconds, ms, errors = asyncio.run(measured())
+        requests, rejected, connections = (after - before for after, before in zip(stub_stats(base_url), upstream_before))
+        lookups = {result: tmdb.LOOKUPS.value(result=result) - count for result, count in lookups_before.items()}
+        total = sum(lookups.values())
+        hit_ratio = f"{(lookups['hit'] + lookups['stale']) / total:.1%}" if total else "-"
+        rows.append((mode, f"{seconds:.1f}", f"{len(ms) / seconds:.0f}", f"{np.percentile(ms, 50):.1f}",
+                     f"{np.percentile(ms, 99):.1f}", errors, requests, rejected, connections, hit_ratio,
+                     f"{tmdb.COALESCED.value() - coalesced_before:.0f}"))
+    stub.terminate()
+
+    print(f"{sum(len(plan) for plan in plans)} requests from {args.users} users over {args.queries} queries and "
+          f"{args.movies} movies; upstream {args.upstream_latency_ms:g} ms, {args.upstream_limit} requests/s")
+    print_table(["mode", "s", "req/s", "p50 ms", "p99 ms", "errors", "upstream", "429s", "connections",
+                 "hit ratio", "coalesced"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Compare the vote path with every projection applied inline against the
+same votes with scores, progress counters and head-to-head counts left to
+the background projector, for a group voting night: every member votes on
+their own matchups from their own thread, one vote per request.
+
+Both modes replay exactly the same votes on identical lists. We time the
+votes and count the statements sent to the database per vote, then time the
+projector catching the async list up, time rebuilding every projection of a
+list from the log, and check both lists end up with identical views (up to
+the replay's rounding, for rebuilt scores).
+
+Usage: python benchmarks/bench_vote_log.py [--items 40] [--members 12] [--votes 200]
+"""
+
+import argparse
+import random
+import threading
+
+from _common import add_database_argument, make_engine, make_session_factory, QueryCounter, timed, create_users, create_list, print_table
+from app.core.config import settings
+from sqlalchemy import func
+from app.db.models import EloScore, Matchup, MovieListItem, PairwiseWin, VotingSession
+from app.services import elo, projections, votes, matchups as matchups_service
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--members", type=int, default=12, help="Voting threads; keep within the engine's connection pool")
+    parser.add_argument("--votes", type=int, default=200, help="Votes per member")
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+
+    def prepare():
+        """An identical list for each run; returns (list_id, planned votes per member in id order)"""
+        with Session() as db:
+            list_id, item_ids = create_list(db, args.items, user_ids[0])
+            pairs = matchups_service.missing_pairs(item_ids, set())
+            for user_id in user_ids:
+                matchups_service.bulk_insert_matchups(db, list_id, user_id, pairs)
+            db.commit()
+            plans = []
+            for user_id in user_ids:
+                ids = [m_id for (m_id,) in db.query(Matchup.id).filter(
+                    Matchup.movie_list_id == list_id, Matchup.user_id == user_id).order_by(Matchup.id)]
+                rows = {m.id: m for m in db.query(Matchup).filter(Matchup.id.in_(ids))}
+                rng = random.Random(user_id)
+                chosen = rng.sample(range(len(ids)), min(args.votes, len(ids)))
+                plans.append([(ids[i], rng.choice((rows[ids[i]].item_a_id, rows[ids[i]].item_b_id))) for i in chosen])
+        return list_id, plans
+
+    def run(plans):
+        def member(plan):
+            for matchup_id, winner_id in plan:
+                with Session() as db:
+                    votes.cast_vote(db, matchup_id, winner_id)
+                    db.commit()
+        threads = [threading.Thread(target=member, args=(plan,)) for plan in plans]
+        with QueryCounter(engine) as queries, timed() as elapsed:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return elapsed["seconds"], queries.count
+
+    def views(list_id):
+        """Each projection of the list, keyed by position so identical lists compare equal"""
+        with Session() as db:
+            first_item = db.query(func.min(MovieListItem.id)).filter(MovieListItem.movie_list_id == list_id).scalar()
+            # A rebuild writes a row for every item, untouched ones at the default score
+            scores = db.query(EloScore.user_id, EloScore.movie_list_item_id - first_item, EloScore.score).filter(
+                EloScore.movie_list_id == list_id, EloScore.score != elo.DEFAULT_SCORE
+            ).order_by(EloScore.user_id, EloScore.movie_list_item_id).all()
+            progress = db.query(VotingSession.user_id, VotingSession.completed_matchups).filter(
+                VotingSession.movie_list_id == list_id).order_by(VotingSession.user_id).all()
+            wins = db.query(PairwiseWin.a_wins, PairwiseWin.b_wins).filter(
+                PairwiseWin.movie_list_id == list_id).order_by(PairwiseWin.item_a_id, PairwiseWin.item_b_id).all()
+        return [tuple(row) for row in scores], [tuple(row) for row in progress], [tuple(row) for row in wins]
+
+    with Session() as db:
+        user_ids = create_users(db, args.members)
+
+    rows = []
+    settings.ASYNC_PROJECTIONS = []
+    inline_list, plans = prepare()
+    total_votes = sum(len(plan) for plan in plans)
+    seconds, queries = run(plans)
+    rows.append(("inline", f"{seconds * 1000:.0f}", f"{total_votes / seconds:.0f}", f"{queries / total_votes:.1f}", "-"))
+
+    settings.ASYNC_PROJECTIONS = list(projections.APPLY)
+    async_list, plans = prepare()
+    seconds, queries = run(plans)
+    with Session() as db, timed() as catch_up:
+        projections.run_async_projections(db)
+    rows.append(("async", f"{seconds * 1000:.0f}", f"{total_votes / seconds:.0f}", f"{queries / total_votes:.1f}",
+                 f"{catch_up['seconds'] * 1000:.0f}"))
+
+    print(f"{args.members} members x {args.votes} votes on {args.items} items")
+    print_table(["projections", "ms", "votes/s", "statements/vote", "catch-up ms"], rows)
+    print("views identical:", views(inline_list) == views(async_list))
+
+    settings.ASYNC_PROJECTIONS = []
+    rebuilds = []
+    for name in projections.REBUILD:
+        with Session() as db, timed() as rebuild:
+            projections.rebuild_list(db, async_list, [name])
+        rebuilds.append((name, f"{rebuild['seconds'] * 1000:.0f}"))
+    print_table(["rebuild", "ms"], rebuilds)
+    # The rebuilt scores come from the vectorized replay, which can differ from serial updates in the last bits
+    (inline_scores, *inline_counts), (rebuilt_scores, *rebuilt_counts) = views(inline_list), views(async_list)
+    same_rows = [row[:2] for row in inline_scores] == [row[:2] for row in rebuilt_scores]
+    drift = max((abs(a[2] - b[2]) for a, b in zip(inline_scores, rebuilt_scores)), default=0.0)
+    print(f"views identical after rebuild: {same_rows and inline_counts == rebuilt_counts} (max score drift {drift:.1e})")
+
+if __name__ == "__main__":
+    main()
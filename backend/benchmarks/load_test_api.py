@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Load test the API over HTTP: a uvicorn worker serving a group voting night
+while a few members browse the results, with latency percentiles per
+endpoint.
+
+The server is started from --app-dir (default: this backend), so the same
+run can be pointed at a checkout of an older revision to compare. Voters
+loop over GET /voting/next-matchup and POST /voting/matchups/{id}/vote on
+their own matchups; readers loop over the members' progress, a rankings
+page and a member's full matchup list, the slow request of the mix. One
+worker means every request shares one event loop, so anything blocking it
+shows up in every other request's latency.
+
+With --db-latency-ms the server reaches the database through a proxy that
+holds back every reply for that long, standing in for a database on another
+host; on a single machine the round trips are otherwise too quick to matter.
+The server's DB_* settings come from the environment, and its /metrics are
+read at the end to show how long requests waited for a pooled connection.
+
+Usage: python benchmarks/load_test_api.py [--voters 32] [--readers 4] [--seconds 20] [--items 80] [--db-latency-ms 0] [--app-dir PATH]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+from _common import add_database_argument, make_engine, make_session_factory, create_users, create_list, print_table
+from app.services import matchups as matchups_service
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class LatencyProxy:
+    """A TCP proxy in front of the database that delays its replies by ``delay`` seconds"""
+
+    def __init__(self, url, delay):
+        self.url = url
+        self.delay = delay
+        self.port = None
+        self.ready = threading.Event()
+
+    def proxied_url(self):
+        """``url`` pointed at the proxy"""
+        return self.url.set(host="127.0.0.1", port=self.port, query={})
+
+    async def _open_upstream(self):
+        socket_dir = self.url.query.get("host")
+        if socket_dir:
+            return await asyncio.open_unix_connection(f"{socket_dir}/.s.PGSQL.{self.url.port or 5432}")
+        return await asyncio.open_connection(self.url.host or "localhost", self.url.port or 5432)
+
+    async def _pipe(self, reader, writer, delay):
+        loop = asyncio.get_running_loop()
+        # Chunks are all delayed by the same amount, so they go out in order
+        while data := await reader.read(65536):
+            if delay:
+                loop.call_later(delay, writer.write, data)
+            else:
+                writer.write(data)
+        loop.call_later(delay, writer.close)
+
+    async def _handle(self, client_reader, client_writer):
+        upstream_reader, upstream_writer = await self._open_upstream()
+        await asyncio.gather(
+            self._pipe(client_reader, upstream_writer, 0),
+            self._pipe(upstream_reader, client_writer, self.delay),
+            return_exceptions=True
+        )
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True).start()
+        self.ready.wait()
+
+def pool_waits(base_url):
+    """(checkouts, mean wait in ms, timeouts) of the server's API pool, from /metrics"""
+    values = {}
+    for line in httpx.get(f"{base_url}/metrics").text.splitlines():
+        if not line.startswith("#") and '{pool="api"}' in line:
+            name, value = line.split()
+            values[name.split("{")[0]] = float(value)
+    count = values.get("rnkd_db_pool_checkout_seconds_count", 0)
+    mean = values.get("rnkd_db_pool_checkout_seconds_sum", 0) / count * 1000 if count else 0
+    return int(count), mean, int(values.get("rnkd_db_pool_checkout_timeouts_total", 0))
+
+def start_server(app_dir, database_url, port):
+    env = {**os.environ, "DATABASE_URL": database_url, "DEBUG": "false"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("the server didn't come up")
+
+async def run_load(base_url, list_id, user_ids, args):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    deadline = time.monotonic() + args.seconds
+
+    async def request(client, name, method, url, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        latencies[name].append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors[name] += 1
+        return response
+
+    async def voter(client, user_id, rng):
+        while time.monotonic() < deadline:
+            r = await request(client, "GET next-matchup", "GET", f"/api/v1/voting/next-matchup/{list_id}", params={"user_id": user_id})
+            matchup = r.json().get("matchup")
+            if matchup is None:
+                return
+            winner_id = rng.choice((matchup["item_a_id"], matchup["item_b_id"]))
+            await request(client, "POST vote", "POST", f"/api/v1/voting/matchups/{matchup['id']}/vote", params={"winner_id": winner_id})
+
+    async def reader(client, rng):
+        while time.monotonic() < deadline:
+            await request(client, "GET progress/members", "GET", f"/api/v1/voting/progress/{list_id}/members")
+            await request(client, "GET rankings", "GET", f"/api/v1/voting/rankings/{list_id}", params={"user_id": rng.choice(user_ids)})
+            await request(client, "GET matchups (all)", "GET", f"/api/v1/voting/matchups/{list_id}", params={"user_id": rng.choice(user_ids)})
+
+    limits = httpx.Limits(max_connections=args.voters + args.readers)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        tasks = [voter(client, user_id, random.Random(user_id)) for user_id in user_ids[:args.voters]]
+        tasks += [reader(client, random.Random(-i)) for i in range(args.readers)]
+        started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voters", type=int, default=32)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--items", type=int, default=80)
+    parser.add_argument("--db-latency-ms", type=float, default=0, help="Delay added to every database reply (Postgres only)")
+    parser.add_argument("--app-dir", default=BACKEND_DIR, help="Backend directory to serve the API from")
+    parser.add_argument("--port", type=int, default=8765)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+    with Session() as db:
+        user_ids = create_users(db, args.voters)
+        list_id, item_ids = create_list(db, args.items, user_ids[0])
+        pairs = matchups_service.missing_pairs(item_ids, set())
+        for user_id in user_ids:
+            matchups_service.bulk_insert_matchups(db, list_id, user_id, pairs)
+        db.commit()
+
+    server_url = engine.url
+    if args.db_latency_ms:
+        proxy = LatencyProxy(engine.url, args.db_latency_ms / 1000)
+        proxy.start()
+        server_url = proxy.proxied_url()
+    server = start_server(args.app_dir, server_url.render_as_string(hide_password=False), args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        latencies, errors, elapsed = asyncio.run(run_load(base_url, list_id, user_ids, args))
+        # Older revisions have no /metrics
+        waits = pool_waits(base_url) if httpx.get(f"{base_url}/metrics").status_code == 200 else None
+    finally:
+        server.terminate()
+        server.wait()
+
+    rows = []
+    for name, samples in sorted(latencies.items()):
+        ms = np.array(samples) * 1000
+        rows.append((name, len(ms), errors[name], f"{np.percentile(ms, 50):.1f}", f"{np.percentile(ms, 95):.1f}",
+                     f"{np.percentile(ms, 99):.1f}", f"{ms.max():.1f}"))
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"{args.voters} voters + {args.readers} readers for {elapsed:.1f}s on {args.items} items, "
+          f"{args.db_latency_ms:g} ms database latency, served from {args.app_dir}")
+    print_table(["request", "count", "errors", "p50 ms", "p95 ms", "p99 ms", "max ms"], rows)
+    print(f"{total / elapsed:.0f} requests/s")
+    if waits:
+        print("pool checkouts: {}, mean wait {:.2f} ms, timeouts {}".format(*waits))
+
+if __name__ == "__main__":
+    main()
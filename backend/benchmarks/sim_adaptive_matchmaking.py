@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Simulate a user ranking a list in exhaustive and adaptive voting modes.
+
+Each item gets a hidden "true" strength and the simulated user picks the
+stronger item with a logistic probability, so close calls are sometimes
+voted the "wrong" way. For each mode we report the votes needed before the
+Elo ranking reaches the target Spearman correlation with the true ranking
+(and stays there), the final correlation, and the matchup rows written.
+
+Usage: python benchmarks/sim_adaptive_matchmaking.py [--sizes 20 50 100] [--trials 5]
+"""
+
+import argparse
+import math
+import random
+import statistics
+from itertools import combinations
+
+from _common import print_table
+from app.services import elo
+from app.services.matchmaking import adaptive_vote_budget, select_adaptive_pair
+from app.services.matchups import normalize_pair
+
+def spearman(scores, true_strength):
+    """Spearman rank correlation between the Elo ranking and the true ranking"""
+    items = list(scores)
+    n = len(items)
+    by_score = {item: rank for rank, item in enumerate(sorted(items, key=lambda i: -scores[i]))}
+    by_truth = {item: rank for rank, item in enumerate(sorted(items, key=lambda i: -true_strength[i]))}
+    d2 = sum((by_score[i] - by_truth[i]) ** 2 for i in items)
+    return 1 - 6 * d2 / (n * (n * n - 1))
+
+def simulate(mode, n, rng, target, noise):
+    true_strength = {item: rng.gauss(0, 1) for item in range(n)}
+    scores = {item: elo.DEFAULT_SCORE for item in range(n)}
+    games = {item: 0 for item in range(n)}
+    compared = set()
+
+    if mode == "exhaustive":
+        # Generated pairs are served in insertion (lexicographic) order
+        schedule = iter(list(combinations(range(n), 2)))
+        rows_written = n * (n - 1) // 2
+    else:
+        schedule = None
+        rows_written = 0
+
+    votes = 0
+    reached_at = None
+    while True:
+        if mode == "exhaustive":
+            pair = next(schedule, None)
+        else:
+            pair = None
+            if votes < adaptive_vote_budget(n):
+                pair = select_adaptive_pair(scores, games, compared)
+            if pair is not None:
+                rows_written += 1
+        if pair is None:
+            break
+
+        a, b = pair
+        p_a = 1 / (1 + math.exp(-(true_strength[a] - true_strength[b]) / noise))
+        a_won = rng.random() < p_a
+        scores[a], scores[b] = elo.updated_scores(scores[a], scores[b], a_won)
+        games[a] += 1
+        games[b] += 1
+        compared.add(normalize_pair(a, b))
+        votes += 1
+
+        if spearman(scores, true_strength) >= target:
+            if reached_at is None:
+                reached_at = votes
+        else:
+            reached_at = None
+
+    return votes, reached_at, spearman(scores, true_strength), rows_written
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--target", type=float, default=0.9, help="Spearman correlation counted as a stable ranking")
+    parser.add_argument("--noise", type=float, default=0.3, help="Logistic noise scale of simulated votes")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = []
+    for n in args.sizes:
+        for mode in ("exhaustive", "adaptive"):
+            results = [simulate(mode, n, rng, args.target, args.noise) for _ in range(args.trials)]
+            reached = [r[1] for r in results if r[1] is not None]
+            rows.append((
+                n,
+                mode,
+                round(statistics.mean(r[0] for r in results)),
+                round(statistics.mean(reached)) if reached else "never",
+                f"{len(reached)}/{args.trials}",
+                f"{statistics.mean(r[2] for r in results):.3f}",
+                round(statistics.mean(r[3] for r in results))
+            ))
+
+    print_table(["items", "mode", "votes cast", f"votes to rho>={args.target}", "reached", "final rho", "matchup rows"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Simulate early voting completion with Glicko-2 ratings.
+
+A simulated user votes (with logistic noise around hidden "true" strengths)
+until their top-k is settled by the confidence check, or they run out of
+pairs. For each pairing strategy we report the votes cast against the
+number of pairs in the list, the share of the true top-k found in the
+settled top-k (next to the share after voting on every pair, without early
+completion), and the time spent in the per-vote confidence check.
+
+Usage: python benchmarks/sim_glicko2_completion.py [--sizes 20 50 100 200] [--trials 5]
+"""
+
+import argparse
+import math
+import random
+import statistics
+import time
+from itertools import combinations
+
+import numpy as np
+
+from _common import print_table
+from app.services import elo, glicko2
+from app.services.matchmaking import select_adaptive_pair
+from app.services.matchups import normalize_pair
+
+def simulate(strategy, n, k, rng, noise, early=True):
+    true_strength = [rng.gauss(0, 1) for _ in range(n)]
+    ratings = [(elo.DEFAULT_SCORE, glicko2.DEFAULT_DEVIATION, glicko2.DEFAULT_VOLATILITY)] * n
+    games = {item: 0 for item in range(n)}
+    compared = set()
+    total_pairs = n * (n - 1) // 2
+
+    if strategy == "exhaustive":
+        # Generated pairs are served in insertion (lexicographic) order
+        schedule = iter(list(combinations(range(n), 2)))
+
+    votes = 0
+    check_seconds = 0.0
+    while True:
+        if strategy == "exhaustive":
+            pair = next(schedule, None)
+        else:
+            pair = select_adaptive_pair({i: r[0] for i, r in enumerate(ratings)}, games, compared, window=3)
+        if pair is None:
+            break
+
+        a, b = pair
+        p_a = 1 / (1 + math.exp(-(true_strength[a] - true_strength[b]) / noise))
+        ratings[a], ratings[b] = glicko2.updated_ratings(ratings[a], ratings[b], rng.random() < p_a)
+        games[a] += 1
+        games[b] += 1
+        compared.add(normalize_pair(a, b))
+        votes += 1
+
+        start = time.perf_counter()
+        values = np.array(ratings)
+        confidence = glicko2.top_k_confidence(values[:, 0], values[:, 1], k)
+        check_seconds += time.perf_counter() - start
+        if early and confidence >= 1:
+            break
+
+    top = sorted(range(n), key=lambda i: -ratings[i][0])[:k]
+    true_top = sorted(range(n), key=lambda i: -true_strength[i])[:k]
+    return votes, total_pairs, len(set(top) & set(true_top)) / k, check_seconds / max(votes, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 50, 100, 200])
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=glicko2.TOP_K)
+    parser.add_argument("--noise", type=float, default=0.3, help="Logistic noise scale of simulated votes")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.sizes:
+        for strategy in ("exhaustive", "adaptive"):
+            # Same hidden strengths and votes with and without early completion
+            results = [simulate(strategy, n, args.top_k, random.Random(args.seed + t), args.noise) for t in range(args.trials)]
+            full = [simulate(strategy, n, args.top_k, random.Random(args.seed + t), args.noise, early=False) for t in range(args.trials)]
+            votes = statistics.mean(r[0] for r in results)
+            rows.append((
+                n,
+                strategy,
+                results[0][1],
+                round(votes),
+                f"{votes / results[0][1]:.1%}",
+                f"{statistics.mean(r[2] for r in results):.0%}",
+                f"{statistics.mean(r[2] for r in full):.0%}",
+                f"{statistics.mean(r[3] for r in results) * 1e6:.0f}"
+            ))
+
+    print_table(["items", "pairing", "pairs", "votes to settle", "of pairs", "top-k found", "without early stop", "check us/vote"], rows)
+
+if __name__ == "__main__":
+    main()
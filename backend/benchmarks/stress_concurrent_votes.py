@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the vote path.
+
+Many threads vote on the same user's list at once, deliberately colliding:
+every matchup is voted on by several threads (double taps, retries), and
+single votes are mixed with batches. Afterwards we check that
+
+* every matchup was claimed at most once and every recorded vote was applied,
+* the vote log has exactly one event per voted matchup,
+* there is exactly one score row per item,
+* the user's progress counters and the list's head-to-head counts match
+  the matchups, and
+* the final scores equal a serial replay of the recorded votes in log order.
+
+With --async-projections the derived views are applied by a projector
+thread running alongside the voters (and once more at the end) instead.
+
+Run it against Postgres for row-lock coverage (SQLite serializes writers):
+
+    python benchmarks/stress_concurrent_votes.py --database-url postgresql://.../rnkd_scratch
+
+Exits non-zero if any check fails.
+"""
+
+import argparse
+import random
+import sys
+import threading
+from collections import Counter
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from _common import add_database_argument, make_engine, make_session_factory, timed, create_users, create_list
+from app.core.config import settings
+from app.db.models import EloScore, Matchup, VoteEvent
+from app.services import elo, pairwise, projections, votes, voting_sessions, matchups as matchups_service
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=25)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts-per-matchup", type=int, default=3, help="How many threads try to vote on each matchup")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--async-projections", action="store_true", help="Apply scores, progress and pairwise counts in the background")
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    Session = make_session_factory(engine)
+    if args.async_projections:
+        settings.ASYNC_PROJECTIONS = ["scores", "progress", "pairwise"]
+
+    with Session() as db:
+        user_id = create_users(db, 1)[0]
+        list_id, item_ids = create_list(db, args.items, user_id)
+        matchups_service.bulk_insert_matchups(db, list_id, user_id, matchups_service.missing_pairs(item_ids, set()))
+        db.commit()
+        planned = [(m_id, random.Random(m_id).choice((a, b))) for m_id, a, b in db.query(
+            Matchup.id, Matchup.item_a_id, Matchup.item_b_id).filter(Matchup.movie_list_id == list_id)]
+
+    rng = random.Random(args.seed)
+    work = planned * args.attempts_per_matchup
+    attempts = len(work)
+    rng.shuffle(work)
+    queue_lock = threading.Lock()
+    stats = Counter()
+
+    def worker(thread_rng):
+        while True:
+            with queue_lock:
+                if not work:
+                    return
+                size = thread_rng.choice((1, 1, 1, 5, 20))
+                chunk = [work.pop() for _ in range(min(size, len(work)))]
+            while True:
+                db = Session()
+                try:
+                    if len(chunk) == 1:
+                        try:
+                            votes.cast_vote(db, *chunk[0])
+                            outcome = Counter(recorded=1)
+                        except votes.VoteError:
+                            db.rollback()
+                            outcome = Counter(rejected=1)
+                    else:
+                        errors = votes.cast_votes(db, chunk)
+                        outcome = Counter(recorded=errors.count(None), rejected=len(errors) - errors.count(None))
+                    db.commit()
+                except OperationalError:
+                    # Lock timeouts / SQLITE_BUSY: retry the whole transaction
+                    db.rollback()
+                    with queue_lock:
+                        stats["retries"] += 1
+                    continue
+                finally:
+                    db.close()
+                with queue_lock:
+                    stats.update(outcome)
+                break
+
+    voting_done = threading.Event()
+
+    def projector():
+        while not voting_done.is_set():
+            with Session() as db:
+                try:
+                    projections.run_async_projections(db)
+                except OperationalError:
+                    db.rollback()
+
+    threads = [threading.Thread(target=worker, args=(random.Random(args.seed + i),)) for i in range(args.threads)]
+    projector_thread = threading.Thread(target=projector)
+    with timed() as t:
+        if args.async_projections:
+            projector_thread.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    voting_done.set()
+    if args.async_projections:
+        projector_thread.join()
+        with Session() as db:
+            projections.run_async_projections(db)
+
+    failures = []
+    with Session() as db:
+        voted = db.query(Matchup).filter(
+            Matchup.movie_list_id == list_id, Matchup.winner_id != None
+        ).order_by(Matchup.voted_at, Matchup.id).all()
+        if stats["recorded"] != len(planned) or len(voted) != len(planned):
+            failures.append(f"expected {len(planned)} recorded votes, got {stats['recorded']} recorded and {len(voted)} voted matchups")
+
+        events = db.query(VoteEvent).filter(VoteEvent.movie_list_id == list_id).order_by(VoteEvent.id).all()
+        if sorted((e.matchup_id, e.winner_id) for e in events) != sorted((m.id, m.winner_id) for m in voted):
+            failures.append(f"the vote log has {len(events)} events that don't match the {len(voted)} voted matchups")
+
+        duplicates = db.query(EloScore.movie_list_item_id).filter(EloScore.movie_list_id == list_id).group_by(
+            EloScore.movie_list_item_id).having(func.count() > 1).all()
+        if duplicates:
+            failures.append(f"duplicate score rows for items {[d[0] for d in duplicates]}")
+
+        counted = voting_sessions.matchup_counts(db, list_id, user_id)
+        actual = voting_sessions.count_matchups(db, list_id, user_id)
+        if counted != actual:
+            failures.append(f"progress counters say {counted} (total, completed), matchups say {actual}")
+
+        head_to_head = Counter()
+        for m in voted:
+            head_to_head[(min(m.item_a_id, m.item_b_id), max(m.item_a_id, m.item_b_id), m.winner_id)] += 1
+        item_a_ids, item_b_ids, a_wins, b_wins = pairwise.pair_counts(db, list_id)
+        stored_wins = Counter()
+        for a, b, wins_a, wins_b in zip(item_a_ids.tolist(), item_b_ids.tolist(), a_wins.tolist(), b_wins.tolist()):
+            stored_wins.update({(a, b, a): wins_a, (a, b, b): wins_b})
+        if +stored_wins != head_to_head:
+            failures.append("head-to-head counts don't match the voted matchups")
+
+        replay = {item_id: elo.DEFAULT_SCORE for item_id in item_ids}
+        for e in events:
+            replay[e.item_a_id], replay[e.item_b_id] = elo.updated_scores(
+                replay[e.item_a_id], replay[e.item_b_id], a_won=e.winner_id == e.item_a_id
+            )
+        stored = dict(db.query(EloScore.movie_list_item_id, EloScore.score).filter(EloScore.movie_list_id == list_id))
+        drift = max(abs(stored.get(item_id, elo.DEFAULT_SCORE) - score) for item_id, score in replay.items())
+        if drift > 1e-6:
+            failures.append(f"scores differ from serial replay by up to {drift:.6f}")
+
+    print(f"{attempts} vote attempts on {len(planned)} matchups "
+          f"from {args.threads} threads in {t['seconds']:.2f}s")
+    print(f"recorded={stats['recorded']} rejected={stats['rejected']} retries={stats['retries']} max score drift={drift:.2e}")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: final scores match a serial replay")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Fill in list items' metadata now, e.g. to backfill existing lists or after
+upstream was down, rather than waiting for the background hydrator. Items
+looked up less than --max-age-seconds ago are left alone; 0 looks every
+item up again. Interrupting it is safe: run it again to carry on.
+
+Usage: python hydrate_items.py [--media-type book ...] [--max-age-seconds 604800] [--chunk-size 500]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+sys.path.append(os.path.dirname(__file__))
+
+from app.core.config import settings
+from app.db.models import MediaTypeEnum
+from app.services import hydration, media
+
+async def hydrate(args):
+    try:
+        return await hydration.hydrate_pending(
+            media_types=args.media_type, max_age=timedelta(seconds=args.max_age_seconds), chunk_size=args.chunk_size
+        )
+    finally:
+        await media.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill in list items' metadata")
+    parser.add_argument("--media-type", choices=[media_type.value for media_type in MediaTypeEnum], action="append",
+                        help="Only items of this media type (repeatable)")
+    parser.add_argument("--max-age-seconds", type=int, default=settings.HYDRATION_MAX_AGE_SECONDS)
+    parser.add_argument("--chunk-size", type=int, default=hydration.CHUNK_SIZE, help="Items written back per transaction")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = asyncio.run(hydrate(args))
+    if not results:
+        print("No items due")
+    for media_type, counts in results.items():
+        print(f"{media_type}: {counts['found']} items hydrated, {counts['unknown']} unknown upstream"
+              + (f", {counts['failed']} failed (retried in {hydration.RETRY_SECONDS}s)" if counts["failed"] else ""))
+    print(f"in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Load a TMDB daily ID export (movie_ids_MM_DD_YYYY.json.gz) into the movie
+catalog that search and the movie endpoints serve. Run it again with each
+day's export: only movies that changed are written, and running API workers
+pick the changes up within CATALOG_REFRESH_INTERVAL seconds.
+
+Usage: python ingest_catalog.py EXPORT_FILE [--batch-size 50000] [--allow-shrink] [--dry-run]
+"""
+
+import sys
+import os
+import argparse
+import time
+sys.path.append(os.path.dirname(__file__))
+
+from app.db.base import SessionLocal
+from app.services import catalog_ingest
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a TMDB ID export into the movie catalog")
+    parser.add_argument("export_file", help="Gzipped JSON lines, one movie per line")
+    parser.add_argument("--batch-size", type=int, default=catalog_ingest.BATCH_SIZE, help="Lines staged per COPY")
+    parser.add_argument("--allow-shrink", action="store_true",
+                        help="Remove the movies a much smaller export is missing instead of stopping")
+    parser.add_argument("--dry-run", action="store_true", help="Compare with the catalog without saving anything")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        try:
+            snapshot = catalog_ingest.ingest_export(db, args.export_file, args.batch_size, args.allow_shrink)
+        except catalog_ingest.CatalogIngestError as e:
+            db.rollback()
+            sys.exit(f"Not applied: {e} (use --allow-shrink to apply it anyway)")
+        print(f"{args.export_file}: read {snapshot.rows_read} lines ({snapshot.rows_skipped} skipped), "
+              f"{snapshot.inserted} movies added, {snapshot.updated} updated, {snapshot.removed} removed "
+              f"in {time.perf_counter() - start:.1f}s"
+              + (" (dry run, nothing saved)" if args.dry_run else ""))
+        if args.dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Rebuild Elo scores for one or more movie lists from their vote history.
+Run this after changing the K-factor, deleting items or repairing matchups.
+
+Usage: python replay_scores.py LIST_ID [LIST_ID ...] [--k-factor 32] [--dry-run]
+"""
+
+import sys
+import os
+import argparse
+import time
+sys.path.append(os.path.dirname(__file__))
+
+from app.db.base import SessionLocal
+from app.db.models import MovieList, RatingModelEnum
+from app.services import elo, hot_scores, replay
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild Elo scores from vote history")
+    parser.add_argument("list_ids", type=int, nargs="+", help="Movie list ids to rebuild")
+    parser.add_argument("--k-factor", type=float, default=elo.K_FACTOR)
+    parser.add_argument("--dry-run", action="store_true", help="Replay without saving the new scores")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for list_id in args.list_ids:
+            movie_list = db.query(MovieList).filter(MovieList.id == list_id).first()
+            if not movie_list:
+                print(f"List {list_id}: not found, skipping")
+                continue
+            if movie_list.rating_model == RatingModelEnum.glicko2:
+                print(f"List {list_id}: uses glicko2, which replay doesn't support, skipping")
+                continue
+            start = time.perf_counter()
+            if hot_scores.enabled_for(movie_list) and not args.dry_run:
+                # Reload Redis too, or its next flush would overwrite the replayed scores
+                summary = hot_scores.reload_list(db, list_id, replay_votes=True, k=args.k_factor)
+            else:
+                summary = replay.rebuild_list_scores(db, list_id, k=args.k_factor)
+                if args.dry_run:
+                    db.rollback()
+                else:
+                    db.commit()
+            print(f"List {list_id}: replayed {summary['votes_replayed']} votes for {summary['users']} users "
+                  f"x {summary['items']} items in {time.perf_counter() - start:.2f}s"
+                  + (" (dry run, nothing saved)" if args.dry_run else ""))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,12 @@ Run this to populate the database with initial test data
 
 import sys
 import os
+from datetime import datetime
 sys.path.append(os.path.dirname(__file__))
 
 from sqlalchemy.orm import Session
 from app.db.base import SessionLocal
-from app.db.models import User, Group, GroupUser, MovieList, MovieListItem
+from app.db.models import User, Group, GroupUser, MovieList, MovieListItem, CatalogMovie, CatalogSnapshot
 from app.db.schemas import ListTypeEnum, MediaTypeEnum, ListStatusEnum
 
 def seed_database():
@@ -219,6 +220,26 @@ def seed_database():
         
         print(f"Created {len(movie_items)} movie list items")
         
+        # A catalog of the movies above for search, until a TMDB export is ingested
+        snapshot = CatalogSnapshot(source="seed_data.py", finished_at=datetime.utcnow())
+        db.add(snapshot)
+        db.flush()
+        catalog_items = {}
+        for item in movie_items:
+            catalog_items.setdefault(int(item.external_id), item)
+        for position, (tmdb_id, item) in enumerate(catalog_items.items()):
+            db.add(CatalogMovie(
+                id=tmdb_id,
+                title=item.title,
+                popularity=float(len(catalog_items) - position),
+                details=item.item_metadata,
+                snapshot_id=snapshot.id
+            ))
+        snapshot.rows_read = snapshot.inserted = len(catalog_items)
+        db.commit()
+        
+        print(f"Created {len(catalog_items)} catalog movies")
+        
         print("✅ Database seeded successfully!")
         print("\nTest data created:")
         print(f"- {len(users)} users")
@@ -226,6 +247,7 @@ def seed_database():
         print(f"- {len(group_memberships)} group memberships")
         print(f"- {len(movie_lists)} movie lists")
         print(f"- {len(movie_items)} movie list items")
+        print(f"- {len(catalog_items)} catalog movies")
         
     except Exception as e:
         print(f"Error seeding database: {e}")